@@ -0,0 +1,4 @@
+"""# Benchmarks
+
+Performance benchmarks for Transdoc.
+"""
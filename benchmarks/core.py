@@ -0,0 +1,262 @@
+"""# Benchmarks / Core
+
+Microbenchmarks for the core of the transformer.
+
+Run using `python -m benchmarks.core`. Results are printed as JSON, or
+written to the file given by `--output`.
+"""
+
+import argparse
+import random
+from collections.abc import Callable
+from contextlib import suppress
+from functools import partial
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+from benchmarks.harness import run_benchmarks, write_results
+from transdoc import TransdocRule, TransdocTransformer, get_all_handlers
+from transdoc.handlers import find_matching_handler
+from transdoc.handlers.api import TransdocHandler
+from transdoc.source_pos import SourcePos, SourceRange
+from transdoc.util import indent_by
+
+SEED = 42
+"""Seed used to generate inputs, so that they are the same in every run"""
+
+SIZES = {"small": 1_000, "medium": 100_000, "large": 1_000_000}
+"""Approximate sizes of generated documents, in characters"""
+
+DENSITIES = {"sparse": 0.001, "dense": 0.05}
+"""Probability that each word of a generated document is a rule call"""
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "elit"]
+
+RULE_CALLS = {
+    "name": "{{simple}}",
+    "bracket": "{{echo[some text]}}",
+    "call_literal": "{{echo('some text')}}",
+    "call_expression": "{{echo(str(len('some text')))}}",
+    "expression": "{{echo('some') + echo(' text')}}",
+}
+"""Rule calls using each of the supported forms"""
+
+
+def simple() -> str:
+    """A rule with no arguments"""
+    return "Simple rule"
+
+
+def echo(value: str) -> str:
+    """A rule which returns its argument"""
+    return value
+
+
+def multiline(lines: int = 5) -> str:
+    """A rule whose output spans multiple lines"""
+    return "\n".join(f"Line {i}   " for i in range(lines))
+
+
+RULES: dict[str, TransdocRule] = {
+    "simple": simple,
+    "echo": echo,
+    "multiline": multiline,
+}
+
+
+def make_document(size: int, density: float, seed: int = SEED) -> str:
+    """Generate a document with the given size and density of rule calls."""
+    rng = random.Random(seed)
+    calls = list(RULE_CALLS.values()) + ["{{multiline}}"]
+    parts = []
+    length = 0
+    while length < size:
+        if rng.random() < density:
+            part = rng.choice(calls)
+        else:
+            part = rng.choice(WORDS)
+        # Start new lines regularly, so that documents have realistic shapes
+        part += "\n" if rng.random() < 0.1 else " "
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+def make_module(size: int, density: float, seed: int = SEED) -> str:
+    """Generate a Python module whose docstrings contain rule calls."""
+    parts = []
+    length = 0
+    i = 0
+    while length < size:
+        docstring = make_document(200, density, seed + i)
+        part = (
+            f'def function_{i}():\n    """{docstring}"""\n    return {i}\n\n\n'
+        )
+        parts.append(part)
+        length += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def make_unclosed_document(size: int) -> str:
+    """Generate a document with many opening braces which are never closed.
+
+    This is the worst case for scanning for rule calls.
+    """
+    return "{{ " * (size // 3)
+
+
+def transform_benchmarks(
+    transformer: TransdocTransformer,
+) -> dict[str, Callable[[], Any]]:
+    """Benchmarks of `TransdocTransformer.transform`."""
+    benchmarks: dict[str, Callable[[], Any]] = {}
+    for size_name, size in SIZES.items():
+        for density_name, density in DENSITIES.items():
+            document = make_document(size, density)
+            for indent_name, indent in [("flat", ""), ("indented", " " * 8)]:
+                benchmarks[
+                    f"transform/{size_name}/{density_name}/{indent_name}"
+                ] = partial(
+                    transformer.transform,
+                    document,
+                    "<bench>",
+                    indentation=indent,
+                )
+
+        document = make_unclosed_document(size)
+
+        def transform_unclosed(d: str = document) -> None:
+            with suppress(ExceptionGroup):
+                transformer.transform(d, "<bench>")
+
+        benchmarks[f"transform/{size_name}/unclosed"] = transform_unclosed
+    return benchmarks
+
+
+def handler_benchmarks(
+    transformer: TransdocTransformer,
+) -> dict[str, Callable[[], Any]]:
+    """Benchmarks of `transform_file` for each built-in handler."""
+    documents = {
+        "plaintext": ("<bench>.md", make_document(SIZES["medium"], 0.01)),
+        "python": ("<bench>.py", make_module(SIZES["medium"], 0.01)),
+    }
+    benchmarks: dict[str, Callable[[], Any]] = {}
+    for name, (path, document) in documents.items():
+        handler = find_matching_handler(get_all_handlers(), path)
+        assert handler is not None
+
+        def transform_file(
+            handler: TransdocHandler = handler,
+            path: str = path,
+            document: str = document,
+        ) -> None:
+            handler.transform_file(
+                transformer,
+                path,
+                StringIO(document),
+                StringIO(),
+            )
+
+        benchmarks[f"handler/{name}"] = transform_file
+    return benchmarks
+
+
+def eval_rule_benchmarks(
+    transformer: TransdocTransformer,
+) -> dict[str, Callable[[], Any]]:
+    """Benchmarks of `TransdocTransformer._eval_rule` for each call form."""
+    position = SourceRange.zero()
+    return {
+        f"eval_rule/{form}": partial(
+            transformer._eval_rule,
+            call.removeprefix("{{").removesuffix("}}"),
+            "<bench>",
+            position,
+            "",
+        )
+        for form, call in RULE_CALLS.items()
+    }
+
+
+def indent_by_benchmarks() -> dict[str, Callable[[], Any]]:
+    """Benchmarks of `indent_by`."""
+    single = "A single line of output"
+    lines = "\n".join(f"Line {i} of output  " for i in range(1000))
+    return {
+        "indent_by/single_line": lambda: indent_by("    ", single),
+        "indent_by/many_lines/flat": lambda: indent_by("", lines),
+        "indent_by/many_lines/indented": lambda: indent_by("    ", lines),
+    }
+
+
+def offset_by_str_benchmarks() -> dict[str, Callable[[], Any]]:
+    """Benchmarks of `SourcePos.offset_by_str`."""
+    pos = SourcePos(1, 1)
+    single = "x" * 1000
+    lines = "x" * 80 + "\n" * 1000
+    return {
+        "offset_by_str/single_line": lambda: pos.offset_by_str(single),
+        "offset_by_str/many_lines": lambda: pos.offset_by_str(lines),
+    }
+
+
+def find_matching_handler_benchmarks() -> dict[str, Callable[[], Any]]:
+    """Benchmarks of `find_matching_handler`."""
+    handlers = get_all_handlers()
+    paths = [f"docs/dir_{i}/file_{i}.md" for i in range(100)]
+    paths += [f"src/pkg_{i}/module_{i}.py" for i in range(100)]
+    paths += [f"assets/image_{i}.png" for i in range(100)]
+    return {
+        "find_matching_handler": lambda: [
+            find_matching_handler(handlers, path) for path in paths
+        ],
+    }
+
+
+def all_benchmarks() -> dict[str, Callable[[], Any]]:
+    """Return every microbenchmark, by name."""
+    transformer = TransdocTransformer(RULES)
+    return {
+        **transform_benchmarks(transformer),
+        **handler_benchmarks(transformer),
+        **eval_rule_benchmarks(transformer),
+        **indent_by_benchmarks(),
+        **offset_by_str_benchmarks(),
+        **find_matching_handler_benchmarks(),
+    }
+
+
+def main() -> None:
+    """Run the microbenchmarks, printing or saving their results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="File to write JSON results to",
+    )
+    parser.add_argument(
+        "-k",
+        "--pattern",
+        default="",
+        help="Only run benchmarks whose name contains this string",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Take fewer, shorter timings",
+    )
+    args = parser.parse_args()
+    results = run_benchmarks(
+        all_benchmarks(),
+        pattern=args.pattern,
+        quick=args.quick,
+    )
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""# Benchmarks / Corpus
+
+Generator for synthetic source trees, used to benchmark transforming large
+projects.
+
+Run using `python -m benchmarks.corpus OUTPUT_DIR`, with `--help` to see the
+available options.
+"""
+
+import argparse
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from benchmarks.core import RULE_CALLS, WORDS
+
+RULE_FILE = '''"""Rules used by the synthetic corpus"""
+
+
+def simple():
+    return "Simple rule"
+
+
+def echo(value):
+    return value
+
+
+def multiline(lines=5):
+    return "\\n".join(f"Line {i}" for i in range(lines))
+'''
+"""Contents of a rule file which defines every rule used in the corpus"""
+
+
+@dataclass(frozen=True)
+class CorpusOptions:
+    """Options for generating a synthetic source tree."""
+
+    files: int = 1000
+    """Number of files to generate"""
+    mix: dict[str, float] = field(
+        default_factory=lambda: {
+            ".md": 0.4,
+            ".txt": 0.2,
+            ".py": 0.3,
+            ".bin": 0.1,
+        },
+    )
+    """
+    Relative proportion of each file extension. `.bin` files contain random
+    bytes, and are not matched by any handler.
+    """
+    depth: int = 3
+    """Maximum depth of directories within the tree"""
+    breadth: int = 5
+    """Number of subdirectories within each directory"""
+    density: float = 0.02
+    """Probability that each word of a text file is a rule call"""
+    median_size: int = 2000
+    """Median size of files, in bytes"""
+    size_sigma: float = 1.0
+    """
+    Standard deviation of the logarithm of file sizes, such that file sizes
+    follow a log-normal distribution, as they tend to in real projects
+    """
+    seed: int = 42
+    """Seed for the random number generator, so that trees are reproducible"""
+
+
+def make_text(rng: random.Random, size: int, density: float) -> str:
+    """Generate text of about the given size, containing rule calls."""
+    calls = list(RULE_CALLS.values())
+    parts = []
+    length = 0
+    while length < size:
+        part = (
+            rng.choice(calls) if rng.random() < density else rng.choice(WORDS)
+        )
+        part += "\n" if rng.random() < 0.1 else " "
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+def make_python(rng: random.Random, size: int, density: float) -> str:
+    """Generate a Python module of about the given size.
+
+    The docstring of each function in the module contains rule calls.
+    """
+    parts = []
+    length = 0
+    i = 0
+    while length < size:
+        docstring = make_text(rng, rng.randint(50, 300), density)
+        # Avoid accidentally closing the docstring
+        docstring = docstring.replace("'", '"').replace('"""', "")
+        part = (
+            f'def function_{i}():\n    """{docstring}"""\n    return {i}\n\n\n'
+        )
+        parts.append(part)
+        length += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def directories(options: CorpusOptions) -> list[Path]:
+    """Return every directory within the tree, relative to its root."""
+    result = [Path()]
+    level = [Path()]
+    for _ in range(options.depth):
+        level = [
+            parent / f"dir_{i}"
+            for parent in level
+            for i in range(options.breadth)
+        ]
+        result.extend(level)
+    return result
+
+
+def generate_corpus(root: Path, options: CorpusOptions) -> list[Path]:
+    """Generate a synthetic source tree in the given directory.
+
+    The same options always produce the same tree.
+
+    Parameters
+    ----------
+    root : Path
+        Directory to generate the tree in. It is created if it doesn't exist.
+    options : CorpusOptions
+        Options for the tree.
+
+    Returns
+    -------
+    list[Path]
+        Paths of the generated files.
+    """
+    rng = random.Random(options.seed)
+    dirs = directories(options)
+    extensions = list(options.mix)
+    weights = list(options.mix.values())
+    paths = []
+
+    for i in range(options.files):
+        ext = rng.choices(extensions, weights)[0]
+        path = root / rng.choice(dirs) / f"file_{i}{ext}"
+        scale = rng.lognormvariate(0, options.size_sigma)
+        size = max(1, round(scale * options.median_size))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if ext == ".bin":
+            path.write_bytes(rng.randbytes(size))
+        elif ext == ".py":
+            path.write_text(make_python(rng, size, options.density))
+        else:
+            path.write_text(make_text(rng, size, options.density))
+        paths.append(path)
+
+    return paths
+
+
+def main() -> None:
+    """Generate a synthetic source tree from command-line options."""
+    defaults = CorpusOptions()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output", type=Path, help="Directory to generate in")
+    parser.add_argument("--files", type=int, default=defaults.files)
+    parser.add_argument("--depth", type=int, default=defaults.depth)
+    parser.add_argument("--breadth", type=int, default=defaults.breadth)
+    parser.add_argument("--density", type=float, default=defaults.density)
+    parser.add_argument(
+        "--median-size",
+        type=int,
+        default=defaults.median_size,
+    )
+    parser.add_argument(
+        "--size-sigma",
+        type=float,
+        default=defaults.size_sigma,
+    )
+    parser.add_argument(
+        "--mix",
+        help="Proportions of each file type, eg '.md=4,.py=3,.bin=1'",
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    mix = defaults.mix
+    if args.mix is not None:
+        mix = {
+            ext: float(weight)
+            for ext, weight in (
+                item.split("=", 1) for item in args.mix.split(",")
+            )
+        }
+
+    options = CorpusOptions(
+        files=args.files,
+        mix=mix,
+        depth=args.depth,
+        breadth=args.breadth,
+        density=args.density,
+        median_size=args.median_size,
+        size_sigma=args.size_sigma,
+        seed=args.seed,
+    )
+    generate_corpus(args.output, options)
+    (args.output / "rules.py").write_text(RULE_FILE)
+
+
+if __name__ == "__main__":
+    main()
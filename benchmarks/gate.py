@@ -0,0 +1,477 @@
+"""# Benchmarks / Gate
+
+Performance regression gate, which runs the benchmarks and compares their
+results against a committed baseline.
+
+Run using `python -m benchmarks.gate`. It exits with a non-zero status if any
+benchmark is slower or uses more memory than its baseline allows, printing a
+table of the differences. Use `--update` to record a new baseline.
+"""
+
+import argparse
+import json
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from statistics import median, median_low
+from typing import Any
+
+from benchmarks.core import all_benchmarks
+from benchmarks.corpus import CorpusOptions
+from benchmarks.harness import (
+    BenchmarkResult,
+    measure,
+    results_to_json,
+    run_benchmarks,
+)
+from benchmarks.tree import run_tree_benchmarks
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+"""Path of the committed baseline"""
+
+GATE_CORPUS = CorpusOptions(files=100, median_size=1000)
+"""Corpus used for tree benchmarks, which is kept small so the gate is fast"""
+
+CALIBRATION = "calibration"
+"""
+Name of the benchmark used to estimate the speed of the machine, so that
+timings can be compared between machines
+"""
+
+
+METRICS = ["seconds", "peak_memory"]
+"""Metrics which are compared against the baseline"""
+
+
+@dataclass(frozen=True)
+class Tolerances:
+    """Amount by which results may exceed their baseline without failing."""
+
+    seconds: float = 0.5
+    """
+    Allowed slowdown, as a fraction of the baseline time. Timings on shared
+    machines such as CI runners are noisy, so this is much larger than the
+    tolerance for memory usage, which is mostly deterministic.
+    """
+    peak_memory: float = 0.1
+    """Allowed increase in peak memory, as a fraction of the baseline"""
+    min_seconds: float = 1e-5
+    """Slowdowns smaller than this many seconds are always allowed"""
+    min_memory: int = 16 * 1024
+    """Increases in peak memory smaller than this many bytes are allowed"""
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "Tolerances":
+        """Load tolerances from JSON, using defaults for missing values."""
+        return cls(**data)
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """Comparison of one metric of a benchmark against its baseline."""
+
+    name: str
+    """Name of the benchmark"""
+    metric: str
+    """Metric being compared, either "seconds" or "peak_memory\""""
+    baseline: float
+    """Baseline value, scaled to the speed of the current machine"""
+    current: float
+    """Current value"""
+    limit: float
+    """Largest value which is not considered a regression"""
+
+    @property
+    def change(self) -> float:
+        """Relative change from the baseline, eg `0.1` for 10% larger."""
+        if self.baseline == 0:
+            return 0.0 if self.current == 0 else float("inf")
+        return self.current / self.baseline - 1
+
+    @property
+    def regressed(self) -> bool:
+        """Whether the current value exceeds the limit."""
+        return self.current > self.limit
+
+
+def calibration_workload() -> int:
+    """A fixed, pure-Python workload used to estimate the machine's speed."""
+    total = 0
+    for i in range(100_000):
+        total += len(str(i)) * (i % 7)
+    return total
+
+
+def compare(
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+    tolerances: Tolerances,
+    *,
+    normalise: bool = True,
+) -> list[Comparison]:
+    """Compare benchmark results against a baseline.
+
+    Only benchmarks present in both sets of results are compared.
+
+    Parameters
+    ----------
+    baseline : dict[str, Any]
+        Baseline results, in the format produced by `results_to_json`.
+    current : dict[str, Any]
+        Current results, in the same format.
+    tolerances : Tolerances
+        Tolerances used to determine whether each metric has regressed.
+    normalise : bool, optional = True
+        Whether to scale baseline timings by the relative speed of the
+        machines, as measured by the calibration benchmark, if both sets of
+        results include it.
+
+    Returns
+    -------
+    list[Comparison]
+        Comparisons of each metric of each benchmark, sorted by name.
+    """
+    base_results = baseline["results"]
+    curr_results = current["results"]
+    scale = 1.0
+    if (
+        normalise
+        and CALIBRATION in base_results
+        and CALIBRATION in curr_results
+    ):
+        scale = (
+            curr_results[CALIBRATION]["seconds"]
+            / base_results[CALIBRATION]["seconds"]
+        )
+
+    comparisons = []
+    for name in sorted(base_results.keys() & curr_results.keys()):
+        if name == CALIBRATION:
+            continue
+        base_time = base_results[name]["seconds"] * scale
+        comparisons.append(
+            Comparison(
+                name,
+                "seconds",
+                base_time,
+                curr_results[name]["seconds"],
+                base_time
+                + max(base_time * tolerances.seconds, tolerances.min_seconds),
+            ),
+        )
+        base_memory = base_results[name]["peak_memory"]
+        comparisons.append(
+            Comparison(
+                name,
+                "peak_memory",
+                base_memory,
+                curr_results[name]["peak_memory"],
+                base_memory
+                + max(
+                    base_memory * tolerances.peak_memory,
+                    tolerances.min_memory,
+                ),
+            ),
+        )
+    return comparisons
+
+
+def format_value(metric: str, value: float) -> str:
+    """Format a value of the given metric for display."""
+    if metric == "seconds":
+        for unit, scale in [("s", 1), ("ms", 1e-3), ("us", 1e-6)]:
+            if value >= scale:
+                return f"{value / scale:.2f} {unit}"
+        return f"{value / 1e-9:.0f} ns"
+    for unit, size in [("MiB", 1024**2), ("KiB", 1024)]:
+        if value >= size:
+            return f"{value / size:.1f} {unit}"
+    return f"{value:.0f} B"
+
+
+def format_report(
+    comparisons: list[Comparison],
+    baseline: dict[str, Any],
+    current: dict[str, Any],
+) -> str:
+    """Format a table describing the differences from the baseline.
+
+    Every metric which regressed is included, along with notes about any
+    benchmarks which are missing from either set of results.
+    """
+    lines = []
+    regressions = [c for c in comparisons if c.regressed]
+    if regressions:
+        rows = [("benchmark", "metric", "baseline", "current", "change")]
+        rows += [
+            (
+                c.name,
+                c.metric,
+                format_value(c.metric, c.baseline),
+                format_value(c.metric, c.current),
+                f"{c.change:+.1%}",
+            )
+            for c in regressions
+        ]
+        widths = [max(len(row[i]) for row in rows) for i in range(5)]
+        for row in rows:
+            lines.append(
+                "  ".join(
+                    cell.ljust(width)
+                    for cell, width in zip(row, widths, strict=True)
+                ).rstrip(),
+            )
+        lines.append("")
+        lines.append(
+            f"{len(regressions)} regression(s) in "
+            f"{len({c.name for c in regressions})} benchmark(s)",
+        )
+    else:
+        lines.append(
+            f"No regressions in {len({c.name for c in comparisons})} "
+            f"benchmarks",
+        )
+
+    base_names = set(baseline["results"]) - {CALIBRATION}
+    curr_names = set(current["results"]) - {CALIBRATION}
+    for name in sorted(base_names - curr_names):
+        lines.append(f"note: {name} is in the baseline, but was not run")
+    for name in sorted(curr_names - base_names):
+        lines.append(f"note: {name} has no baseline")
+    if baseline.get("python") != current.get("python"):
+        lines.append(
+            f"note: baseline was recorded using Python "
+            f"{baseline.get('python')}, but results are from Python "
+            f"{current.get('python')}, so memory usage may differ",
+        )
+    return "\n".join(lines)
+
+
+def median_results(
+    runs: list[dict[str, BenchmarkResult]],
+) -> dict[str, BenchmarkResult]:
+    """Combine several runs of the benchmarks, using the median of each.
+
+    This is used to record baselines, so that a run which was unusually fast
+    or slow doesn't become the baseline.
+    """
+    return {
+        name: BenchmarkResult(
+            median(run[name].seconds for run in runs),
+            median_low(run[name].peak_memory for run in runs),
+            sum(run[name].runs for run in runs),
+        )
+        for name in runs[0]
+    }
+
+
+def confirm_regressions(
+    comparisons: list[Comparison],
+    retried: list[Comparison],
+) -> list[Comparison]:
+    """Replace regressions which did not reproduce when they were retried.
+
+    Timings are noisy, so a metric only counts as a regression if it
+    regressed in every attempt.
+    """
+    retried_by_key = {(c.name, c.metric): c for c in retried}
+    confirmed = []
+    for c in comparisons:
+        retry = retried_by_key.get((c.name, c.metric))
+        if c.regressed and retry is not None and not retry.regressed:
+            confirmed.append(retry)
+        else:
+            confirmed.append(c)
+    return confirmed
+
+
+def run_gate_benchmarks(
+    *,
+    pattern: str = "",
+    names: set[str] | None = None,
+) -> dict[str, BenchmarkResult]:
+    """Run the benchmarks used by the gate, including calibration.
+
+    Parameters
+    ----------
+    pattern : str, optional
+        Only run benchmarks whose name contains this string.
+    names : set[str], optional
+        Only run benchmarks with these names, as well as calibration.
+    """
+    results = {CALIBRATION: measure(calibration_workload)}
+    core = {
+        name: func
+        for name, func in all_benchmarks().items()
+        if names is None or name in names
+    }
+    results.update(run_benchmarks(core, pattern=pattern))
+    if names is None or any(name.startswith("tree/") for name in names):
+        tree = run_tree_benchmarks(GATE_CORPUS, pattern=pattern, cli=False)
+        results.update(
+            (name, result)
+            for name, result in tree.items()
+            if names is None or name in names
+        )
+    return results
+
+
+def main() -> None:
+    """Run the benchmarks, and compare them against the baseline."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=DEFAULT_BASELINE,
+        help="Baseline JSON file to compare against",
+    )
+    parser.add_argument(
+        "--results",
+        type=Path,
+        help="Compare the given results file, rather than running benchmarks",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="File to write JSON results to",
+    )
+    parser.add_argument(
+        "-k",
+        "--pattern",
+        default="",
+        help="Only run benchmarks whose name contains this string",
+    )
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Write the results to the baseline, rather than comparing them",
+    )
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        help="Allowed slowdown, as a fraction of the baseline time",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        help="Allowed increase in peak memory, as a fraction of the baseline",
+    )
+    parser.add_argument(
+        "--update-runs",
+        type=int,
+        default=3,
+        help="Number of runs to take the median of when updating the baseline",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help=(
+            "Number of times to re-run regressed benchmarks, to confirm that "
+            "the regression is not noise"
+        ),
+    )
+    parser.add_argument(
+        "--metric",
+        action="append",
+        choices=METRICS,
+        help=(
+            "Only compare the given metric. Can be given multiple times. "
+            "Defaults to every metric."
+        ),
+    )
+    parser.add_argument(
+        "--no-normalise",
+        action="store_true",
+        help="Don't scale baseline timings by the speed of this machine",
+    )
+    args = parser.parse_args()
+
+    baseline: dict[str, Any] | None = None
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+
+    if args.results is not None:
+        current = json.loads(args.results.read_text())
+    elif args.update:
+        current = results_to_json(
+            median_results(
+                [
+                    run_gate_benchmarks(pattern=args.pattern)
+                    for _ in range(args.update_runs)
+                ],
+            ),
+        )
+    else:
+        current = results_to_json(run_gate_benchmarks(pattern=args.pattern))
+    if args.output is not None:
+        args.output.write_text(json.dumps(current, indent=2) + "\n")
+
+    # Tolerances are stored in the baseline, so that they are the same
+    # locally and in CI
+    tolerances = Tolerances.from_json(
+        baseline.get("tolerances", {}) if baseline is not None else {},
+    )
+    if args.update:
+        current["tolerances"] = asdict(tolerances)
+        args.baseline.write_text(
+            json.dumps(current, indent=2, sort_keys=True) + "\n",
+        )
+        print(f"Updated baseline {args.baseline}")
+        return
+    if baseline is None:
+        print(
+            f"Baseline {args.baseline} does not exist, use --update to "
+            f"create it",
+            file=sys.stderr,
+        )
+        sys.exit(2)
+
+    overrides = {}
+    if args.time_tolerance is not None:
+        overrides["seconds"] = args.time_tolerance
+    if args.memory_tolerance is not None:
+        overrides["peak_memory"] = args.memory_tolerance
+    tolerances = Tolerances(**{**asdict(tolerances), **overrides})
+
+    metrics = set(args.metric or METRICS)
+    comparisons = [
+        c
+        for c in compare(
+            baseline,
+            current,
+            tolerances,
+            normalise=not args.no_normalise,
+        )
+        if c.metric in metrics
+    ]
+    # Results from a file can't be re-run
+    retries = args.retries if args.results is None else 0
+    for _ in range(retries):
+        regressed = {c.name for c in comparisons if c.regressed}
+        if not regressed:
+            break
+        print(
+            f"Re-running {len(regressed)} regressed benchmark(s)",
+            file=sys.stderr,
+        )
+        retry = results_to_json(
+            run_gate_benchmarks(pattern=args.pattern, names=regressed),
+        )
+        comparisons = confirm_regressions(
+            comparisons,
+            compare(
+                baseline,
+                retry,
+                tolerances,
+                normalise=not args.no_normalise,
+            ),
+        )
+    print(format_report(comparisons, baseline, current))
+    if any(c.regressed for c in comparisons):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
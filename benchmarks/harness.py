@@ -0,0 +1,137 @@
+"""# Benchmarks / Harness
+
+Utilities for timing benchmarks and reporting their results as JSON.
+"""
+
+import json
+import math
+import platform
+import sys
+import timeit
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from transdoc import __version__
+
+RESULTS_FORMAT_VERSION = 1
+"""Version of the JSON format produced by `results_to_json`"""
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    """Measurements of a single benchmark."""
+
+    seconds: float
+    """Best time for one run of the benchmark, in seconds"""
+    peak_memory: int
+    """Peak memory allocated during one run of the benchmark, in bytes"""
+    runs: int
+    """Total number of timed runs"""
+
+
+def measure(
+    func: Callable[[], Any],
+    *,
+    repeat: int = 5,
+    min_time: float = 0.05,
+) -> BenchmarkResult:
+    """Measure the time and peak memory usage of the given function.
+
+    The function is run enough times that each of the `repeat` timings takes
+    at least `min_time` seconds, and the best timing is used, as it is the
+    least affected by other activity on the system. Peak memory usage is
+    measured separately using `tracemalloc`, as tracing slows down execution.
+
+    Parameters
+    ----------
+    func : Callable[[], Any]
+        Function to benchmark.
+    repeat : int, optional = 5
+        Number of timings to take.
+    min_time : float, optional = 0.05
+        Minimum duration of each timing, in seconds.
+
+    Returns
+    -------
+    BenchmarkResult
+        Measurements of the function.
+    """
+    timer = timeit.Timer(func)
+    # Calibrate the number of runs per timing using a single run
+    number = max(1, math.ceil(min_time / max(timer.timeit(1), 1e-9)))
+    best = min(timer.repeat(repeat, number)) / number
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(best, peak, repeat * number)
+
+
+def results_to_json(results: dict[str, BenchmarkResult]) -> dict[str, Any]:
+    """Convert benchmark results to a JSON-compatible dictionary.
+
+    The format is stable between versions of Transdoc, so that results can be
+    compared over time. Benchmarks are sorted by name.
+    """
+    return {
+        "format": RESULTS_FORMAT_VERSION,
+        "transdoc": __version__,
+        "python": platform.python_version(),
+        "platform": sys.platform,
+        "results": {name: asdict(results[name]) for name in sorted(results)},
+    }
+
+
+def write_results(
+    results: dict[str, BenchmarkResult],
+    output: Path | None,
+) -> None:
+    """Write benchmark results as JSON to the given file, or to stdout."""
+    text = json.dumps(results_to_json(results), indent=2, sort_keys=True)
+    if output is None:
+        print(text)
+    else:
+        output.write_text(text + "\n")
+
+
+def run_benchmarks(
+    benchmarks: dict[str, Callable[[], Any]],
+    *,
+    pattern: str = "",
+    quick: bool = False,
+) -> dict[str, BenchmarkResult]:
+    """Run each benchmark whose name contains the given pattern.
+
+    Progress is reported on stderr, so that stdout only contains results.
+
+    Parameters
+    ----------
+    benchmarks : dict[str, Callable[[], Any]]
+        Mapping from benchmark names to functions to benchmark.
+    pattern : str, optional
+        Only run benchmarks whose name contains this string.
+    quick : bool, optional = False
+        Take fewer, shorter timings, for a fast but noisy result.
+
+    Returns
+    -------
+    dict[str, BenchmarkResult]
+        Results of each benchmark that was run.
+    """
+    results = {}
+    for name, func in benchmarks.items():
+        if pattern not in name:
+            continue
+        print(f"Running {name}", file=sys.stderr)
+        if quick:
+            results[name] = measure(func, repeat=1, min_time=0.01)
+        else:
+            results[name] = measure(func)
+    return results
@@ -0,0 +1,70 @@
+"""# Benchmarks / Scanner
+
+Compare the rule call scanner against the regular expressions it replaced.
+
+Run using `python -m benchmarks.scanner`.
+"""
+
+import re
+import timeit
+from collections.abc import Callable
+
+from transdoc.scanner import Token, TokenKind, scan
+
+RULE_CALL_REGEX = re.compile(r"\{\{.+?\}\}", re.DOTALL)
+UNCLOSED_REGEX = re.compile(r"\{\{((?!\}\}).)*$", re.DOTALL)
+
+
+def regex_scan(input: str) -> list[Token]:
+    """Tokenize the input using the previous regex-based implementation."""
+    tokens = []
+    pos = 0
+    for match in RULE_CALL_REGEX.finditer(input):
+        start, end = match.span()
+        if start > pos:
+            tokens.append(Token(TokenKind.LITERAL, pos, start))
+        tokens.append(Token(TokenKind.CALL, start, end))
+        pos = end
+    if unclosed := UNCLOSED_REGEX.search(input):
+        start = unclosed.start()
+        if start > pos:
+            tokens.append(Token(TokenKind.LITERAL, pos, start))
+        tokens.append(Token(TokenKind.UNCLOSED, start, start + 2))
+        pos = start + 2
+    if pos < len(input):
+        tokens.append(Token(TokenKind.LITERAL, pos, len(input)))
+    return tokens
+
+
+INPUTS: dict[str, Callable[[int], str]] = {
+    "prose": lambda n: "Some text without any rule calls.\n" * n,
+    "dense": lambda n: "Text {{docs('page', 'link')}} and {{simple}}.\n" * n,
+    "unclosed": lambda n: "{{ unclosed call " * n,
+    "braces": lambda n: "{{" * n,
+}
+"""Generators for benchmark inputs, given a size"""
+
+
+def main() -> None:
+    """Run the benchmarks, printing results as a table."""
+    print(f"{'input':<10} {'size':>8} {'regex (s)':>12} {'scanner (s)':>12}")
+    for name, gen in INPUTS.items():
+        for size in [100, 1_000, 10_000]:
+            input = gen(size)
+            number = 5
+            regex_time = timeit.timeit(
+                lambda: regex_scan(input),  # noqa: B023
+                number=number,
+            )
+            scan_time = timeit.timeit(
+                lambda: scan(input),  # noqa: B023
+                number=number,
+            )
+            print(
+                f"{name:<10} {len(input):>8} "
+                f"{regex_time / number:>12.6f} {scan_time / number:>12.6f}",
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""# Benchmarks / Tree
+
+End-to-end benchmarks of transforming a synthetic source tree, using both
+`transform_tree` and the `transdoc` CLI.
+
+Run using `python -m benchmarks.tree`. Results are printed as JSON, or
+written to the file given by `--output`.
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+from shutil import rmtree
+from typing import Any
+
+from benchmarks.corpus import RULE_FILE, CorpusOptions, generate_corpus
+from benchmarks.harness import BenchmarkResult, measure, write_results
+from transdoc import TransdocTransformer, get_all_handlers, transform_tree
+from transdoc.__transform_tree import expand_tree
+
+
+def tree_benchmarks(
+    input: Path,
+    output: Path,
+    rule_file: Path,
+) -> dict[str, Callable[[], Any]]:
+    """Benchmarks of transforming the tree at `input`.
+
+    Parameters
+    ----------
+    input : Path
+        Root of the source tree.
+    output : Path
+        Path to write outputs to. This is replaced by each benchmark.
+    rule_file : Path
+        Rule file for the source tree.
+    """
+    handlers = get_all_handlers()
+    transformer = TransdocTransformer.from_file(rule_file)
+    incremental_output = output.with_name(f"{output.name}-incremental")
+
+    def tree_expand() -> None:
+        expand_tree(input, output)
+
+    def tree_fresh() -> None:
+        rmtree(output, ignore_errors=True)
+        transform_tree(handlers, transformer, input, output)
+
+    def tree_force() -> None:
+        # The output from the previous run is removed using `rmtree`
+        if not output.exists():
+            transform_tree(handlers, transformer, input, output)
+        transform_tree(handlers, transformer, input, output, force=True)
+
+    def tree_incremental() -> None:
+        # Nothing has changed since the first run, so every file is skipped
+        transform_tree(
+            handlers,
+            transformer,
+            input,
+            incremental_output,
+            incremental=True,
+        )
+
+    def tree_dryrun() -> None:
+        transform_tree(handlers, transformer, input, None)
+
+    def tree_copy_only() -> None:
+        rmtree(output, ignore_errors=True)
+        # Binary files aren't matched by any handler, so are copied
+        transform_tree(
+            handlers,
+            transformer,
+            input,
+            output,
+            skip_if=lambda p: p.suffix != ".bin",
+        )
+
+    def cli(*args: str) -> Callable[[], None]:
+        def run() -> None:
+            rmtree(output, ignore_errors=True)
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "transdoc",
+                    str(input),
+                    "-r",
+                    str(rule_file),
+                    *args,
+                ],
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+
+        return run
+
+    return {
+        "tree/expand_tree": tree_expand,
+        "tree/transform_tree": tree_fresh,
+        "tree/transform_tree/force": tree_force,
+        "tree/transform_tree/incremental": tree_incremental,
+        "tree/transform_tree/dryrun": tree_dryrun,
+        "tree/transform_tree/copy_only": tree_copy_only,
+        "tree/cli": cli("-o", str(output)),
+        "tree/cli/dryrun": cli("--dryrun"),
+    }
+
+
+def run_tree_benchmarks(
+    options: CorpusOptions,
+    *,
+    pattern: str = "",
+    repeat: int = 3,
+    cli: bool = True,
+) -> dict[str, BenchmarkResult]:
+    """Generate a corpus in a temporary directory, then benchmark it.
+
+    Parameters
+    ----------
+    options : CorpusOptions
+        Options for generating the corpus.
+    pattern : str, optional
+        Only run benchmarks whose name contains this string.
+    repeat : int, optional = 3
+        Number of timings to take of each benchmark.
+    cli : bool, optional = True
+        Whether to benchmark the `transdoc` CLI, which runs in a subprocess,
+        so its memory usage can't be measured.
+
+    Returns
+    -------
+    dict[str, BenchmarkResult]
+        Results of each benchmark that was run.
+    """
+    results: dict[str, BenchmarkResult] = {}
+    with tempfile.TemporaryDirectory(prefix="transdoc-bench-") as temp:
+        root = Path(temp)
+        print(f"Generating {options.files} files", file=sys.stderr)
+        generate_corpus(root / "input", options)
+        rule_file = root / "rules.py"
+        rule_file.write_text(RULE_FILE)
+
+        benchmarks = tree_benchmarks(
+            root / "input",
+            root / "output",
+            rule_file,
+        )
+        for name, func in benchmarks.items():
+            if pattern not in name:
+                continue
+            if not cli and name.startswith("tree/cli"):
+                continue
+            print(f"Running {name}", file=sys.stderr)
+            # Each run is slow, so don't repeat runs within a timing
+            results[name] = measure(func, repeat=repeat, min_time=0)
+    return results
+
+
+def main() -> None:
+    """Generate a corpus, then benchmark transforming it."""
+    defaults = CorpusOptions()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="File to write JSON results to",
+    )
+    parser.add_argument("--files", type=int, default=defaults.files)
+    parser.add_argument("--density", type=float, default=defaults.density)
+    parser.add_argument(
+        "-k",
+        "--pattern",
+        default="",
+        help="Only run benchmarks whose name contains this string",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timings to take of each benchmark",
+    )
+    args = parser.parse_args()
+
+    options = CorpusOptions(files=args.files, density=args.density)
+    results = run_tree_benchmarks(
+        options,
+        pattern=args.pattern,
+        repeat=args.repeat,
+    )
+    # Also report the time taken per file, which is comparable between
+    # corpus sizes
+    for name, result in list(results.items()):
+        results[f"{name}/per_file"] = BenchmarkResult(
+            result.seconds / options.files,
+            result.peak_memory,
+            result.runs,
+        )
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""# Tests / Async test
+
+Test cases for asynchronous rules.
+"""
+
+import asyncio
+
+import pytest
+
+from transdoc import TransdocTransformer, pure_rule
+from transdoc.errors import TransdocEvaluationError, TransdocSyntaxError
+from transdoc.source_pos import SourcePos, SourceRange
+
+
+async def sleepy(text: str) -> str:
+    await asyncio.sleep(0)
+    return text
+
+
+async def failing(text: str) -> str:
+    await asyncio.sleep(0)
+    raise ValueError(text)
+
+
+def make_waiting_rules() -> dict:
+    """Rules which only complete if they are evaluated concurrently."""
+    event = asyncio.Event()
+
+    async def wait() -> str:
+        await event.wait()
+        return "waited"
+
+    async def notify() -> str:
+        event.set()
+        return "notified"
+
+    return {"wait": wait, "notify": notify}
+
+
+def test_async_rules_are_evaluated_concurrently():
+    transformer = TransdocTransformer(make_waiting_rules())
+    assert (
+        asyncio.run(
+            asyncio.wait_for(
+                transformer.transform_async("{{wait}} {{notify}}", "<string>"),
+                timeout=5,
+            ),
+        )
+        == "waited notified"
+    )
+
+
+def test_async_and_sync_rules_are_combined():
+    transformer = TransdocTransformer(
+        {"sleepy": sleepy, "upper": str.upper},
+    )
+    assert (
+        asyncio.run(
+            transformer.transform_async(
+                "{{sleepy[a]}} {{upper[b]}} {{sleepy('c')}}",
+                "<string>",
+            ),
+        )
+        == "a B c"
+    )
+
+
+def test_async_errors_are_aggregated():
+    transformer = TransdocTransformer({"failing": failing})
+    with pytest.raises(ExceptionGroup) as excinfo:
+        asyncio.run(
+            transformer.transform_async(
+                "{{failing[a]}}\n{{failing[b]}} {{unclosed",
+                "<string>",
+            ),
+        )
+    first, second, unclosed = excinfo.value.exceptions
+    assert isinstance(first, TransdocEvaluationError)
+    assert isinstance(first.__cause__, ValueError)
+    assert first.pos == SourceRange(SourcePos(1, 1), SourcePos(1, 15))
+    assert isinstance(second, TransdocEvaluationError)
+    assert second.pos == SourceRange(SourcePos(2, 1), SourcePos(2, 15))
+    assert isinstance(unclosed, TransdocSyntaxError)
+
+
+def test_sync_transform_runs_async_rules():
+    transformer = TransdocTransformer({"sleepy": sleepy})
+    assert transformer.transform("{{sleepy[a]}}", "<string>") == "a"
+
+
+def test_async_pure_rule_results_are_cached():
+    calls = []
+
+    @pure_rule
+    async def rule(text: str) -> str:
+        calls.append(text)
+        return text
+
+    transformer = TransdocTransformer({"rule": rule})
+    transformer.transform("{{rule[a]}}", "<string>")
+    asyncio.run(transformer.transform_async("{{rule[a]}}", "<string>"))
+    assert calls == ["a"]
@@ -0,0 +1,159 @@
+"""# Tests / Batch rule test
+
+Test cases for rules which evaluate many calls at once.
+"""
+
+from collections.abc import Sequence
+from io import StringIO
+
+import pytest
+from pytest_mock import MockerFixture
+
+from transdoc import (
+    TransdocHooks,
+    TransdocTransformer,
+    batch_rule,
+    pure_rule,
+)
+from transdoc.__rule import RuleArguments
+from transdoc.errors import TransdocEvaluationError
+
+
+def upper_all(calls: Sequence[RuleArguments]) -> list[str]:
+    return [args[0].upper() for args, _ in calls]
+
+
+def test_calls_are_evaluated_in_one_batch(mocker: MockerFixture):
+    batch = mocker.Mock(side_effect=upper_all)
+    rule = mocker.Mock(side_effect=str.upper)
+    transformer = TransdocTransformer({"upper": batch_rule(batch)(rule)})
+    assert (
+        transformer.transform("{{upper[a]}} {{upper('b')}}", "<string>")
+        == "A B"
+    )
+    batch.assert_called_with([(("a",), {}), (("b",), {})])
+    rule.assert_not_called()
+
+
+def test_batch_outputs_are_indented():
+    transformer = TransdocTransformer(
+        {"upper": batch_rule(upper_all)(str.upper)},
+    )
+    assert (
+        transformer.transform(
+            "{{upper[a\nb]}} {{upper[c]}}",
+            "<string>",
+            indentation="  ",
+        )
+        == "A\n  B C"
+    )
+
+
+def test_failing_batch_falls_back_to_individual_calls(
+    mocker: MockerFixture,
+):
+    batch = mocker.Mock(side_effect=ValueError)
+    transformer = TransdocTransformer(
+        {"upper": batch_rule(batch)(str.upper)},
+    )
+    assert (
+        transformer.transform("{{upper[a]}} {{upper[b]}}", "<string>") == "A B"
+    )
+
+
+def test_wrong_output_count_falls_back_to_individual_calls():
+    transformer = TransdocTransformer(
+        {"upper": batch_rule(lambda calls: [])(str.upper)},
+    )
+    assert (
+        transformer.transform("{{upper[a]}} {{upper[b]}}", "<string>") == "A B"
+    )
+
+
+def test_errors_in_individual_calls_are_reported():
+    def error(text: str) -> str:
+        raise ValueError(text)
+
+    def error_all(calls: Sequence[RuleArguments]) -> list[str]:
+        raise ValueError()
+
+    transformer = TransdocTransformer({"error": batch_rule(error_all)(error)})
+    with pytest.raises(ExceptionGroup) as excinfo:
+        transformer.transform("{{error[a]}} {{error[b]}}", "<string>")
+    assert len(excinfo.value.exceptions) == 2
+    assert excinfo.group_contains(TransdocEvaluationError)
+
+
+def test_cached_results_are_not_batched(mocker: MockerFixture):
+    batch = mocker.Mock(side_effect=upper_all)
+    transformer = TransdocTransformer(
+        {"upper": pure_rule(batch_rule(batch)(str.upper))},
+    )
+    transformer.transform("{{upper[a]}}", "<string>")
+    assert (
+        transformer.transform("{{upper[a]}} {{upper[b]}}", "<string>") == "A B"
+    )
+    batch.assert_called_with([(("b",), {})])
+
+
+def test_failing_batch_evaluates_arguments_once(mocker: MockerFixture):
+    count = mocker.Mock(return_value="a")
+    transformer = TransdocTransformer(
+        {
+            "upper": batch_rule(mocker.Mock(side_effect=ValueError))(
+                str.upper,
+            ),
+            "count": count,
+        },
+    )
+    assert (
+        transformer.transform(
+            "{{upper(count())}} {{upper(count())}}",
+            "<string>",
+        )
+        == "A A"
+    )
+    assert count.call_count == 2
+
+
+def test_failing_batch_looks_up_results_once():
+    transformer = TransdocTransformer(
+        {"upper": pure_rule(batch_rule(lambda calls: [])(str.upper))},
+    )
+    assert transformer.transform("{{upper[a]}}", "<string>") == "A"
+    assert transformer.result_cache_info().misses == 1
+
+
+def test_failing_batch_is_reported_to_hooks(mocker: MockerFixture):
+    hooks = mocker.Mock(spec=TransdocHooks)
+    transformer = TransdocTransformer(
+        {"upper": batch_rule(mocker.Mock(side_effect=ValueError))(str.upper)},
+        hooks=hooks,
+    )
+    transformer.transform("{{upper[a]}} {{upper[b]}}", "<string>")
+    # The failed batch, then each individual call
+    assert hooks.rule_started.call_count == 3
+    assert [c.args[2:] for c in hooks.rule_evaluated.call_args_list] == [
+        (None, True),
+        ("A", False),
+        ("B", False),
+    ]
+
+
+def test_streamed_calls_are_batched_per_chunk(mocker: MockerFixture):
+    batch = mocker.Mock(side_effect=upper_all)
+    transformer = TransdocTransformer(
+        {"upper": batch_rule(batch)(str.upper)},
+    )
+    output = StringIO()
+    transformer.transform_stream(
+        StringIO("{{upper[a]}} {{upper[b]}}"),
+        output,
+        "<string>",
+        chunk_size=12,
+    )
+    assert output.getvalue() == "A B"
+    assert batch.call_args_list == [
+        mocker.call([(("a",), {})]),
+        mocker.call([(("b",), {})]),
+    ]
@@ -0,0 +1,149 @@
+"""# Tests / Benchmarks test
+
+Test cases for the benchmark suite, ensuring that it keeps working.
+"""
+
+from pathlib import Path
+
+from benchmarks.core import all_benchmarks, make_document
+from benchmarks.corpus import RULE_FILE, CorpusOptions, generate_corpus
+from benchmarks.gate import (
+    CALIBRATION,
+    Tolerances,
+    compare,
+    confirm_regressions,
+    format_report,
+    median_results,
+)
+from benchmarks.harness import (
+    BenchmarkResult,
+    measure,
+    results_to_json,
+    run_benchmarks,
+)
+from transdoc import TransdocTransformer, get_all_handlers, transform_tree
+
+
+def test_documents_are_reproducible():
+    assert make_document(1000, 0.05) == make_document(1000, 0.05)
+
+
+def test_measure():
+    result = measure(lambda: sum(range(100)), repeat=2, min_time=0.001)
+    assert result.seconds > 0
+    assert result.runs >= 2
+
+
+def test_benchmarks_run():
+    results = run_benchmarks(all_benchmarks(), pattern="small", quick=True)
+    assert "transform/small/dense/flat" in results
+    data = results_to_json(results)
+    assert data["format"] == 1
+    assert list(data["results"]) == sorted(results)
+
+
+def test_corpus_is_reproducible(tmp_path: Path):
+    options = CorpusOptions(files=20, depth=2, median_size=200)
+    first = generate_corpus(tmp_path / "a", options)
+    second = generate_corpus(tmp_path / "b", options)
+    assert len(first) == 20
+    for a, b in zip(first, second, strict=True):
+        assert a.relative_to(tmp_path / "a") == b.relative_to(tmp_path / "b")
+        assert a.read_bytes() == b.read_bytes()
+
+
+def test_corpus_can_be_transformed(tmp_path: Path):
+    generate_corpus(
+        tmp_path / "input",
+        CorpusOptions(files=20, median_size=200, density=0.2),
+    )
+    (tmp_path / "rules.py").write_text(RULE_FILE)
+    transform_tree(
+        get_all_handlers(),
+        TransdocTransformer.from_file(tmp_path / "rules.py"),
+        tmp_path / "input",
+        tmp_path / "output",
+    )
+    assert len(list((tmp_path / "output").rglob("file_*"))) == 20
+
+
+def results(**seconds: float) -> dict:
+    return results_to_json(
+        {
+            name: BenchmarkResult(value, 1000, 1)
+            for name, value in seconds.items()
+        },
+    )
+
+
+def test_gate_passes_within_tolerance():
+    comparisons = compare(
+        results(a=1.0, b=2.0),
+        results(a=1.1, b=1.5),
+        Tolerances(seconds=0.2),
+    )
+    assert not any(c.regressed for c in comparisons)
+    assert "No regressions in 2 benchmarks" in format_report(
+        comparisons,
+        results(a=1.0, b=2.0),
+        results(a=1.1, b=1.5),
+    )
+
+
+def test_gate_detects_regression():
+    baseline = results(a=1.0, b=2.0)
+    current = results(a=1.5, b=2.0)
+    comparisons = compare(baseline, current, Tolerances(seconds=0.2))
+    assert [c.name for c in comparisons if c.regressed] == ["a"]
+    report = format_report(comparisons, baseline, current)
+    assert "+50.0%" in report
+    assert "1 regression(s) in 1 benchmark(s)" in report
+
+
+def test_gate_detects_memory_regression():
+    baseline = results(a=1.0)
+    current = results(a=1.0)
+    current["results"]["a"]["peak_memory"] = 1_000_000
+    comparisons = compare(baseline, current, Tolerances())
+    assert [c.metric for c in comparisons if c.regressed] == ["peak_memory"]
+
+
+def test_gate_normalises_by_calibration():
+    # The current machine is twice as slow, so a doubled time is expected
+    baseline = results(a=1.0, calibration=1.0)
+    current = results(a=2.0, calibration=2.0)
+    assert CALIBRATION in baseline["results"]
+    assert not any(
+        c.regressed for c in compare(baseline, current, Tolerances())
+    )
+    assert any(
+        c.regressed
+        for c in compare(baseline, current, Tolerances(), normalise=False)
+    )
+
+
+def test_gate_notes_missing_benchmarks():
+    baseline = results(a=1.0, b=1.0)
+    current = results(a=1.0, c=1.0)
+    report = format_report(
+        compare(baseline, current, Tolerances()),
+        baseline,
+        current,
+    )
+    assert "b is in the baseline, but was not run" in report
+    assert "c has no baseline" in report
+
+
+def test_gate_ignores_regressions_which_do_not_reproduce():
+    baseline = results(a=1.0, b=1.0)
+    first = compare(baseline, results(a=2.0, b=2.0), Tolerances())
+    retried = compare(baseline, results(a=1.0, b=2.0), Tolerances())
+    confirmed = confirm_regressions(first, retried)
+    assert [c.name for c in confirmed if c.regressed] == ["b"]
+
+
+def test_baseline_uses_median_of_runs():
+    runs = [
+        {"a": BenchmarkResult(seconds, 100, 1)} for seconds in [1.0, 5.0, 2.0]
+    ]
+    assert median_results(runs) == {"a": BenchmarkResult(2.0, 100, 3)}
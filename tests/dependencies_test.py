@@ -0,0 +1,140 @@
+"""# Tests / Dependencies test
+
+Test cases for recording the dependencies of rules.
+"""
+
+import os
+from collections.abc import Sequence
+from pathlib import Path
+
+import pytest
+
+from transdoc import (
+    DiskCache,
+    TransdocTransformer,
+    batch_rule,
+    depends_on_env,
+    depends_on_file,
+    depends_on_module,
+    pure_rule,
+    recording_dependencies,
+)
+from transdoc.__rule import RuleArguments
+
+
+def test_declarations_outside_recording_are_ignored():
+    depends_on_file("file.txt")
+    with recording_dependencies() as dependencies:
+        pass
+    assert not dependencies
+
+
+def test_records_each_kind_of_dependency():
+    with recording_dependencies() as dependencies:
+        depends_on_file("file.txt")
+        depends_on_module("json")
+        depends_on_env("HOME")
+    assert dependencies.files == {os.path.abspath("file.txt")}
+    assert dependencies.modules == {"json"}
+    assert dependencies.env == {"HOME"}
+
+
+def test_nested_recordings_are_added_to_outer_recording():
+    with recording_dependencies() as outer:
+        depends_on_env("OUTER")
+        with recording_dependencies() as inner:
+            depends_on_env("INNER")
+    assert inner.env == {"INNER"}
+    assert outer.env == {"OUTER", "INNER"}
+
+
+def uses_env(name: str) -> str:
+    depends_on_env(name)
+    return name
+
+
+def test_records_dependencies_of_rules():
+    transformer = TransdocTransformer({"rule": uses_env})
+    with recording_dependencies() as dependencies:
+        transformer.transform("{{rule[A]}} {{rule[B]}}", "<string>")
+    assert dependencies.env == {"A", "B"}
+
+
+def test_cached_results_record_dependencies_again():
+    @pure_rule
+    def rule(name: str) -> str:
+        return uses_env(name)
+
+    transformer = TransdocTransformer({"rule": rule})
+    transformer.transform("{{rule[A]}}", "<string>")
+    with recording_dependencies() as dependencies:
+        transformer.transform("{{rule[A]}}", "<string>")
+    assert transformer.result_cache_info().hits == 1
+    assert dependencies.env == {"A"}
+
+
+def test_batch_dependencies_are_recorded_for_every_call():
+    def batch(calls: Sequence[RuleArguments]) -> list[str]:
+        depends_on_env("BATCH")
+        return ["output" for _ in calls]
+
+    @pure_rule
+    @batch_rule(batch)
+    def rule(name: str) -> str:
+        return "output"
+
+    transformer = TransdocTransformer({"rule": rule})
+    transformer.transform("{{rule[A]}} {{rule[B]}}", "<string>")
+    with recording_dependencies() as dependencies:
+        transformer.transform("{{rule[B]}}", "<string>")
+    assert dependencies.env == {"BATCH"}
+
+
+def test_records_dependencies_of_rules_on_other_threads():
+    transformer = TransdocTransformer({"rule": uses_env}, max_workers=4)
+    with recording_dependencies() as dependencies:
+        transformer.transform(
+            " ".join(f"{{{{rule[ENV_{i}]}}}}" for i in range(10)),
+            "<string>",
+        )
+    transformer.close()
+    assert dependencies.env == {f"ENV_{i}" for i in range(10)}
+
+
+def test_records_dependencies_of_async_rules():
+    async def rule(name: str) -> str:
+        depends_on_env(name)
+        return name
+
+    transformer = TransdocTransformer({"rule": pure_rule(rule)})
+    with recording_dependencies() as dependencies:
+        transformer.transform("{{rule[A]}}", "<string>")
+    with recording_dependencies() as cached:
+        transformer.transform("{{rule[A]}}", "<string>")
+    assert dependencies.env == {"A"}
+    assert cached.env == {"A"}
+
+
+def test_results_with_dependencies_are_stored_on_disk(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    def make_transformer():
+        return TransdocTransformer(
+            {"rule": pure_rule(lambda name: uses_env(name))},
+            disk_cache=DiskCache(tmp_path, "rules"),
+        )
+
+    monkeypatch.setenv("TRANSDOC_TEST_VALUE", "old")
+    make_transformer().transform("{{rule[TRANSDOC_TEST_VALUE]}}", "<string>")
+    transformer = make_transformer()
+    with recording_dependencies() as dependencies:
+        transformer.transform("{{rule[TRANSDOC_TEST_VALUE]}}", "<string>")
+    # Dependencies of results from the disk cache are recorded again
+    assert dependencies.env == {"TRANSDOC_TEST_VALUE"}
+    assert transformer.result_cache_info().misses == 1
+    cache = DiskCache(tmp_path, "rules")
+    assert cache.get("rule", ("TRANSDOC_TEST_VALUE",), {}) is not None
+    monkeypatch.setenv("TRANSDOC_TEST_VALUE", "new")
+    cache.reset_fingerprints()
+    assert cache.get("rule", ("TRANSDOC_TEST_VALUE",), {}) is None
@@ -0,0 +1,111 @@
+"""# Tests / Disk cache test
+
+Test cases for the persistent rule result cache.
+"""
+
+import os
+from pathlib import Path
+
+from pytest_mock import MockerFixture
+
+from transdoc import Dependencies, DiskCache, TransdocTransformer, pure_rule
+
+
+def test_results_are_reused_between_transformers(
+    mocker: MockerFixture,
+    tmp_path: Path,
+):
+    rule = mocker.Mock(return_value="output")
+    for _ in range(2):
+        transformer = TransdocTransformer(
+            {"rule": pure_rule(rule)},
+            disk_cache=DiskCache(tmp_path, "rules"),
+        )
+        assert transformer.transform("{{rule[a]}}", "<string>") == "output"
+    rule.assert_called_once_with("a")
+
+
+def test_impure_results_are_not_stored(
+    mocker: MockerFixture,
+    tmp_path: Path,
+):
+    rule = mocker.Mock(return_value="output")
+    for _ in range(2):
+        transformer = TransdocTransformer(
+            {"rule": rule},
+            disk_cache=DiskCache(tmp_path, "rules"),
+        )
+        transformer.transform("{{rule[a]}}", "<string>")
+    assert rule.call_count == 2
+
+
+def test_namespaces_are_separate(tmp_path: Path):
+    cache = DiskCache(tmp_path, "a")
+    cache.put("rule", ("x",), {}, "output")
+    assert cache.get("rule", ("x",), {}) == ("output", Dependencies())
+    assert DiskCache(tmp_path, "b").get("rule", ("x",), {}) is None
+
+
+def test_rule_file_hash_is_namespace(tmp_path: Path):
+    rule_file = tmp_path / "rules.py"
+    rule_file.write_text("a = 1")
+    DiskCache.for_rule_file(tmp_path / "cache", rule_file).put(
+        "rule",
+        (),
+        {},
+        "output",
+    )
+    rule_file.write_text("a = 2")
+    cache = DiskCache.for_rule_file(tmp_path / "cache", rule_file)
+    assert cache.get("rule", (), {}) is None
+
+
+def test_entries_are_separate_between_versions(
+    mocker: MockerFixture,
+    tmp_path: Path,
+):
+    DiskCache(tmp_path, "rules").put("rule", (), {}, "output")
+    mocker.patch("transdoc.__disk_cache.VERSION", "0.0.0")
+    assert DiskCache(tmp_path, "rules").get("rule", (), {}) is None
+
+
+def test_unstable_arguments_are_not_stored(tmp_path: Path):
+    cache = DiskCache(tmp_path, "rules")
+    cache.put("rule", (frozenset("ab"),), {}, "output")
+    assert cache.get("rule", (frozenset("ab"),), {}) is None
+
+
+def test_prune_evicts_least_recently_used(tmp_path: Path):
+    cache = DiskCache(tmp_path, "rules", max_size=60)
+    cache.put("rule", ("old",), {}, "a" * 6)
+    cache.put("rule", ("new",), {}, "b" * 6)
+    # Make the first entry older than the second
+    for entry in tmp_path.glob("*/*"):
+        if "a" * 6 in entry.read_text():
+            os.utime(entry, (0, 0))
+    cache.prune()
+    assert cache.get("rule", ("old",), {}) is None
+    assert cache.get("rule", ("new",), {}) == ("b" * 6, Dependencies())
+
+
+def test_entries_with_changed_dependencies_are_ignored(tmp_path: Path):
+    snippet = tmp_path / "snippet.txt"
+    snippet.write_text("old")
+    DiskCache(tmp_path / "cache", "rules").put(
+        "rule",
+        (),
+        {},
+        "output",
+        Dependencies(files={str(snippet)}),
+    )
+    cache = DiskCache(tmp_path / "cache", "rules")
+    assert cache.get("rule", (), {}) == (
+        "output",
+        Dependencies(files={str(snippet)}),
+    )
+    snippet.write_text("new")
+    assert DiskCache(tmp_path / "cache", "rules").get("rule", (), {}) is None
+    # Fingerprints are remembered until they are reset
+    assert cache.get("rule", (), {}) is not None
+    cache.reset_fingerprints()
+    assert cache.get("rule", (), {}) is None
@@ -0,0 +1,125 @@
+"""# Tests / Hooks test
+
+Test cases for reporting events to hooks.
+"""
+
+from io import StringIO
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from tests.conftest import echo_rule, error_rule
+from transdoc import (
+    TransdocHooks,
+    TransdocProfile,
+    TransdocTransformer,
+    transform_file,
+    transform_tree,
+)
+from transdoc.handlers import TransdocHandler
+from transdoc.handlers.plaintext import PlaintextHandler
+
+
+class RecordingHooks(TransdocHooks):
+    """Hooks which record the names and main arguments of events"""
+
+    def __init__(self) -> None:
+        self.events: list[tuple] = []
+
+    def file_started(self, path: str) -> None:
+        self.events.append(("file_started", path))
+
+    def handler_selected(self, path: str, handler: TransdocHandler) -> None:
+        self.events.append(("handler_selected", path))
+
+    def bytes_read(self, path: str, size: int) -> None:
+        self.events.append(("bytes_read", path, size))
+
+    def bytes_written(self, path: str, size: int) -> None:
+        self.events.append(("bytes_written", path, size))
+
+    def file_finished(
+        self,
+        path: str,
+        duration: float,
+        error: BaseException | None,
+    ) -> None:
+        self.events.append(("file_finished", path, error is not None))
+
+    def rule_evaluated(
+        self,
+        name: str,
+        duration: float,
+        output: Any,
+        error: bool,
+    ) -> None:
+        assert duration >= 0
+        self.events.append(("rule_evaluated", name, output, error))
+
+
+@pytest.fixture
+def hooks() -> RecordingHooks:
+    return RecordingHooks()
+
+
+def test_rule_events(hooks: RecordingHooks):
+    transformer = TransdocTransformer(
+        {"echo": echo_rule, "error": error_rule},
+        hooks=hooks,
+    )
+    with pytest.raises(ExceptionGroup):
+        transformer.transform("{{echo[a]}} {{error}}", "<string>")
+    assert hooks.events == [
+        ("rule_evaluated", "echo", "a", False),
+        ("rule_evaluated", "error", None, True),
+    ]
+
+
+def test_transform_file_events(hooks: RecordingHooks):
+    transformer = TransdocTransformer({"echo": echo_rule}, hooks=hooks)
+    transform_file(
+        [PlaintextHandler()],
+        transformer,
+        "<string>",
+        StringIO("{{echo[a]}}"),
+        StringIO(),
+    )
+    assert hooks.events == [
+        ("file_started", "<string>"),
+        ("handler_selected", "<string>"),
+        ("rule_evaluated", "echo", "a", False),
+        ("file_finished", "<string>", False),
+    ]
+
+
+def test_transform_tree_events(hooks: RecordingHooks, tmp_path: Path):
+    input = tmp_path / "input.txt"
+    input.write_text("{{echo[abc]}}")
+    output = tmp_path / "output.txt"
+    transformer = TransdocTransformer({"echo": echo_rule}, hooks=hooks)
+    transform_tree([PlaintextHandler()], transformer, input, output)
+    assert hooks.events == [
+        ("file_started", str(input)),
+        ("handler_selected", str(input)),
+        ("rule_evaluated", "echo", "abc", False),
+        ("bytes_read", str(input), 13),
+        ("bytes_written", str(input), 3),
+        ("file_finished", str(input), False),
+    ]
+
+
+def test_hooks_and_profile(hooks: RecordingHooks):
+    profile = TransdocProfile()
+    transformer = TransdocTransformer(
+        {"echo": echo_rule},
+        profile=profile,
+        hooks=hooks,
+    )
+    transformer.transform("{{echo[a]}}", "<string>")
+    assert profile.rules["echo"].calls == 1
+    assert len(hooks.events) == 1
+
+
+def test_no_hooks_by_default():
+    assert TransdocTransformer({}).hooks is None
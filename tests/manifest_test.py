@@ -0,0 +1,313 @@
+"""# Tests / Manifest test
+
+Test cases for incremental builds using a build manifest.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from transdoc import TransdocTransformer, get_all_handlers, transform_tree
+from transdoc.__manifest import MANIFEST_NAME, BuildManifest, FileStamp
+from transdoc.errors import TransdocTransformExceptionGroup
+from transdoc.handlers.plaintext import PlaintextHandler
+
+RULE_FILE = """
+import os
+
+from transdoc import depends_on_env
+from transdoc.rules import file_contents
+
+
+def echo(value):
+    return value
+
+
+def env(name):
+    depends_on_env(name)
+    return os.environ.get(name, "")
+"""
+
+
+@pytest.fixture
+def rule_file(tmp_path: Path) -> Path:
+    path = tmp_path / "rules.py"
+    path.write_text(RULE_FILE)
+    return path
+
+
+@pytest.fixture
+def input(tmp_path: Path) -> Path:
+    input = tmp_path / "input"
+    (input / "nested").mkdir(parents=True)
+    (input / "a.txt").write_text("{{echo[a]}}")
+    (input / "nested" / "b.md").write_text("{{echo[b]}}")
+    (input / "c.bin").write_bytes(b"\x00\x01")
+    return input
+
+
+def build(rule_file: Path, input: Path, output: Path) -> None:
+    transform_tree(
+        get_all_handlers(),
+        TransdocTransformer.from_file(rule_file),
+        input,
+        output,
+        incremental=True,
+    )
+
+
+def spy_transform(mocker: MockerFixture):
+    return mocker.spy(PlaintextHandler, "transform_file")
+
+
+def transformed_files(spy) -> list[str]:
+    return sorted(Path(call.args[2]).name for call in spy.call_args_list)
+
+
+def test_first_build_writes_manifest(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    assert (output / "a.txt").read_text() == "a"
+    assert (output / "nested" / "b.md").read_text() == "b"
+    manifest = json.loads((output / MANIFEST_NAME).read_text())
+    assert set(manifest["files"]) == {"a.txt", "nested/b.md", "c.bin"}
+
+
+def test_unchanged_files_are_skipped(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    spy = spy_transform(mocker)
+    build(rule_file, input, output)
+    assert transformed_files(spy) == []
+
+
+def test_changed_files_are_rebuilt(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    (input / "a.txt").write_text("{{echo[changed]}}")
+    spy = spy_transform(mocker)
+    build(rule_file, input, output)
+    assert transformed_files(spy) == ["a.txt"]
+    assert (output / "a.txt").read_text() == "changed"
+
+
+def test_touched_files_with_same_contents_are_skipped(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    stat = (input / "a.txt").stat()
+    os.utime(input / "a.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    spy = spy_transform(mocker)
+    build(rule_file, input, output)
+    assert transformed_files(spy) == []
+
+
+def test_rule_file_change_rebuilds_everything(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    rule_file.write_text(RULE_FILE + "\n\ndef other():\n    return ''\n")
+    spy = spy_transform(mocker)
+    build(rule_file, input, output)
+    assert transformed_files(spy) == ["a.txt", "b.md"]
+
+
+def test_modified_outputs_are_rebuilt(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    (output / "a.txt").write_text("edited by hand")
+    (output / "nested" / "b.md").unlink()
+    build(rule_file, input, output)
+    assert (output / "a.txt").read_text() == "a"
+    assert (output / "nested" / "b.md").read_text() == "b"
+
+
+def test_outputs_of_removed_inputs_are_deleted(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    (input / "nested" / "b.md").unlink()
+    build(rule_file, input, output)
+    assert not (output / "nested").exists()
+    assert (output / "a.txt").exists()
+    manifest = json.loads((output / MANIFEST_NAME).read_text())
+    assert set(manifest["files"]) == {"a.txt", "c.bin"}
+
+
+def test_outputs_of_skipped_inputs_are_kept(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    transform_tree(
+        get_all_handlers(),
+        TransdocTransformer.from_file(rule_file),
+        input,
+        output,
+        skip_if=lambda path: path.name == "a.txt",
+        incremental=True,
+    )
+    assert (output / "a.txt").read_text() == "a"
+
+
+def test_removal_outside_output_is_ignored(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    outside = tmp_path / "outside.txt"
+    outside.write_text("keep me")
+    manifest = json.loads((output / MANIFEST_NAME).read_text())
+    manifest["files"]["../outside.txt"] = manifest["files"]["a.txt"]
+    manifest["files"][str(outside)] = manifest["files"]["a.txt"]
+    (output / MANIFEST_NAME).write_text(json.dumps(manifest))
+    build(rule_file, input, output)
+    assert outside.read_text() == "keep me"
+
+
+def test_removal_with_old_manifest_outside_output_is_ignored(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    outside = tmp_path / "outside.txt"
+    outside.write_text("keep me")
+    # Names are still read from manifests of other versions
+    (output / MANIFEST_NAME).write_text(
+        json.dumps({"version": 0, "files": {"../outside.txt": {}}}),
+    )
+    build(rule_file, input, output)
+    assert outside.read_text() == "keep me"
+
+
+def test_files_with_errors_are_rebuilt(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+):
+    output = tmp_path / "output"
+    (input / "a.txt").write_text("{{undefined}}")
+    with pytest.raises(TransdocTransformExceptionGroup):
+        build(rule_file, input, output)
+    spy = spy_transform(mocker)
+    with pytest.raises(TransdocTransformExceptionGroup):
+        build(rule_file, input, output)
+    assert transformed_files(spy) == ["a.txt"]
+
+
+def test_non_empty_output_without_manifest_is_rejected(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+):
+    output = tmp_path / "output"
+    output.mkdir()
+    (output / "unrelated.txt").write_text("")
+    with pytest.raises(FileExistsError):
+        build(rule_file, input, output)
+
+
+def test_corrupt_manifest_rebuilds_everything(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+):
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    (output / MANIFEST_NAME).write_text("not json")
+    spy = spy_transform(mocker)
+    build(rule_file, input, output)
+    assert transformed_files(spy) == ["a.txt", "b.md"]
+
+
+def test_file_stamp_matches_only_same_contents(tmp_path: Path):
+    path = tmp_path / "file.txt"
+    path.write_text("contents")
+    stamp = FileStamp.of(path)
+    assert stamp.matches(path)
+    path.write_text("CONTENTS")
+    assert not stamp.matches(path)
+    path.unlink()
+    assert not stamp.matches(path)
+
+
+def test_load_returns_none_without_manifest(tmp_path: Path):
+    assert BuildManifest.load(tmp_path, "rules") is None
+
+
+def test_editing_a_dependency_rebuilds_only_dependent_files(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+):
+    snippet = tmp_path / "snippet.txt"
+    snippet.write_text("old")
+    (input / "a.txt").write_text(f"{{{{file_contents[{snippet}]}}}}")
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    snippet.write_text("new")
+    spy = spy_transform(mocker)
+    build(rule_file, input, output)
+    assert transformed_files(spy) == ["a.txt"]
+    assert (output / "a.txt").read_text() == "new"
+
+
+def test_changing_an_env_var_rebuilds_dependent_files(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+    mocker: MockerFixture,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setenv("TRANSDOC_TEST_VALUE", "old")
+    (input / "nested" / "b.md").write_text("{{env[TRANSDOC_TEST_VALUE]}}")
+    output = tmp_path / "output"
+    build(rule_file, input, output)
+    spy = spy_transform(mocker)
+    build(rule_file, input, output)
+    assert transformed_files(spy) == []
+    monkeypatch.setenv("TRANSDOC_TEST_VALUE", "new")
+    build(rule_file, input, output)
+    assert transformed_files(spy) == ["b.md"]
+    assert (output / "nested" / "b.md").read_text() == "new"
@@ -0,0 +1,101 @@
+"""# Tests / Memory test
+
+Test cases for the memory accounting report.
+"""
+
+import json
+import tracemalloc
+from collections.abc import Sequence
+from pathlib import Path
+
+import pytest
+
+from transdoc import (
+    TransdocMemoryReport,
+    TransdocTransformer,
+    batch_rule,
+    transform_tree,
+)
+from transdoc.__rule import RuleArguments
+from transdoc.handlers.plaintext import PlaintextHandler
+
+
+def big_rule(size: str) -> str:
+    """Rule which produces a large output"""
+    return "x" * int(size)
+
+
+def echo_batch(calls: Sequence[RuleArguments]) -> list[str]:
+    return [args[0] for args, _ in calls]
+
+
+@batch_rule(echo_batch)
+def batch_echo(value: str) -> str:
+    """Rule which is evaluated in batches"""
+    return value
+
+
+@pytest.fixture
+def report() -> TransdocMemoryReport:
+    return TransdocMemoryReport()
+
+
+def test_records_rules(report: TransdocMemoryReport):
+    transformer = TransdocTransformer({"big": big_rule}, hooks=report)
+    with report:
+        transformer.transform("{{big[100000]}} {{big[10]}}", "<string>")
+    stats = report.rules["big"]
+    assert stats.count == 2
+    assert stats.peak >= 100_000
+    assert stats.retained >= 100_000
+
+
+def test_only_first_call_of_batch_is_measured(
+    report: TransdocMemoryReport,
+):
+    transformer = TransdocTransformer({"echo": batch_echo}, hooks=report)
+    with report:
+        transformer.transform("{{echo[a]}} {{echo[b]}}", "<string>")
+    assert report.rules["echo"].count == 1
+
+
+def test_records_files(report: TransdocMemoryReport, tmp_path: Path):
+    (tmp_path / "big.txt").write_text("{{big[100000]}}")
+    (tmp_path / "small.txt").write_text("{{big[10]}}")
+    transformer = TransdocTransformer({"big": big_rule}, hooks=report)
+    with report:
+        transform_tree([PlaintextHandler()], transformer, tmp_path, None)
+    big = report.files[str(tmp_path / "big.txt")]
+    small = report.files[str(tmp_path / "small.txt")]
+    assert big.count == 1
+    assert big.peak >= 100_000 > small.peak
+
+
+def test_nothing_recorded_without_tracing(report: TransdocMemoryReport):
+    transformer = TransdocTransformer({"big": big_rule}, hooks=report)
+    transformer.transform("{{big[10]}}", "<string>")
+    assert report.rules == {}
+
+
+def test_stops_only_its_own_tracing(report: TransdocMemoryReport):
+    tracemalloc.start()
+    try:
+        with report:
+            pass
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    with report:
+        pass
+    assert not tracemalloc.is_tracing()
+
+
+def test_report_and_json(report: TransdocMemoryReport):
+    transformer = TransdocTransformer({"big": big_rule}, hooks=report)
+    with report:
+        output = transformer.transform("{{big[100000]}}", "<string>")
+    assert report.top_allocators
+    assert "big" in report.report()
+    data = json.loads(json.dumps(report.to_json()))
+    assert data["rules"]["big"]["count"] == 1
+    del output
@@ -0,0 +1,93 @@
+"""# Tests / Profile test
+
+Test cases for recording profiling statistics.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from tests.conftest import echo_rule, error_rule
+from transdoc import (
+    TransdocProfile,
+    TransdocTransformer,
+    pure_rule,
+    transform_tree,
+)
+from transdoc.handlers.plaintext import PlaintextHandler
+
+
+@pytest.fixture
+def profile() -> TransdocProfile:
+    return TransdocProfile()
+
+
+def test_records_rule_calls(profile: TransdocProfile):
+    transformer = TransdocTransformer({"echo": echo_rule}, profile=profile)
+    transformer.transform("{{echo[a]}} {{echo('bc')}}", "<string>")
+    stats = profile.rules["echo"]
+    assert stats.calls == 2
+    assert stats.output_size == 3
+    assert stats.errors == 0
+    assert stats.total_time >= stats.max_time > 0
+
+
+def test_output_size_is_in_bytes(profile: TransdocProfile):
+    transformer = TransdocTransformer({"echo": echo_rule}, profile=profile)
+    transformer.transform("{{echo('é🏳️')}}", "<string>")
+    assert profile.rules["echo"].output_size == len("é🏳️".encode())
+
+
+def test_records_streamed_output_size(profile: TransdocProfile):
+    def chunks():
+        yield "ab"
+        yield "é"
+
+    transformer = TransdocTransformer({"chunks": chunks}, profile=profile)
+    assert transformer.transform("{{chunks}}", "<string>") == "abé"
+    assert profile.rules["chunks"].output_size == 4
+
+
+def test_records_errors(profile: TransdocProfile):
+    transformer = TransdocTransformer({"error": error_rule}, profile=profile)
+    with pytest.raises(ExceptionGroup):
+        transformer.transform("{{error[ValueError]}}", "<string>")
+    assert profile.rules["error"].errors == 1
+
+
+def test_records_cache_hits(profile: TransdocProfile):
+    transformer = TransdocTransformer(
+        {"echo": pure_rule(echo_rule)},
+        profile=profile,
+    )
+    transformer.transform("{{echo[a]}} {{echo[a]}}", "<string>")
+    assert profile.rules["echo"].calls == 2
+    assert profile.rules["echo"].cache_hits == 1
+
+
+def test_records_files(profile: TransdocProfile):
+    transformer = TransdocTransformer({"echo": echo_rule}, profile=profile)
+    transform_tree(
+        [PlaintextHandler()],
+        transformer,
+        Path("tests/data/example.txt"),
+        None,
+    )
+    assert list(profile.files) == ["tests/data/example.txt"]
+
+
+def test_report(profile: TransdocProfile):
+    profile.record_rule("slow", 2.0)
+    profile.record_rule("fast", 1.0)
+    profile.record_file("file.txt", 3.0)
+    report = profile.report()
+    assert report.index("slow") < report.index("fast")
+    assert "file.txt" in report
+
+
+def test_json(profile: TransdocProfile):
+    profile.record_rule("rule", 1.0, "output")
+    data = json.loads(json.dumps(profile.to_json()))
+    assert data["rules"]["rule"]["output_size"] == 6
+    assert data["files"] == {}
@@ -0,0 +1,82 @@
+"""# Tests / Pure rule test
+
+Test cases for caching the results of pure rules.
+"""
+
+from pytest_mock import MockerFixture
+
+from transdoc import TransdocTransformer, pure_rule
+from transdoc.rules import markdown_docs_link_rule_gen
+
+
+def test_pure_rule_results_are_cached(mocker: MockerFixture):
+    rule = mocker.Mock(return_value="output")
+    transformer = TransdocTransformer({"rule": pure_rule(rule)})
+    assert (
+        transformer.transform("{{rule[a]}} {{rule('a')}}", "<string>")
+        == "output output"
+    )
+    rule.assert_called_once_with("a")
+    assert transformer.result_cache_info().hits == 1
+    assert transformer.result_cache_info().misses == 1
+
+
+def test_impure_rule_results_are_not_cached(mocker: MockerFixture):
+    rule = mocker.Mock(return_value="output")
+    transformer = TransdocTransformer({"rule": rule})
+    transformer.transform("{{rule[a]}} {{rule[a]}}", "<string>")
+    assert rule.call_count == 2
+
+
+def test_different_arguments_are_cached_separately(mocker: MockerFixture):
+    rule = mocker.Mock(side_effect=lambda text: text)
+    transformer = TransdocTransformer({"rule": pure_rule(rule)})
+    assert (
+        transformer.transform("{{rule[a]}} {{rule[b]}}", "<string>") == "a b"
+    )
+
+
+def test_equal_arguments_of_different_types_are_cached_separately():
+    def show(value):
+        return repr(value)
+
+    transformer = TransdocTransformer({"show": pure_rule(show)})
+    assert (
+        transformer.transform(
+            "{{show(1)}} {{show(True)}} {{show(1.0)}} "
+            "{{show(value=1)}} {{show(value=True)}}",
+            "<string>",
+        )
+        == "1 True 1.0 1 True"
+    )
+
+
+def test_unhashable_arguments_are_not_cached(mocker: MockerFixture):
+    rule = mocker.Mock(return_value="output")
+    transformer = TransdocTransformer({"rule": pure_rule(rule)})
+    transformer.transform("{{rule([1])}} {{rule([1])}}", "<string>")
+    assert rule.call_count == 2
+
+
+def test_cache_is_bounded(mocker: MockerFixture):
+    rule = mocker.Mock(side_effect=lambda text: text)
+    transformer = TransdocTransformer(
+        {"rule": pure_rule(rule)},
+        result_cache_size=1,
+    )
+    transformer.transform("{{rule[a]}} {{rule[b]}} {{rule[a]}}", "<string>")
+    assert rule.call_count == 3
+    assert transformer.result_cache_info().currsize == 1
+
+
+def test_pure_builtin_function():
+    transformer = TransdocTransformer({"upper": pure_rule(str.upper)})
+    assert transformer.transform("{{upper[a]}}", "<string>") == "A"
+
+
+def test_docs_link_rule_is_pure():
+    transformer = TransdocTransformer(
+        {"docs": markdown_docs_link_rule_gen("https://example.com")},
+    )
+    transformer.transform("{{docs('a')}} {{docs('a')}}", "<string>")
+    assert transformer.result_cache_info().hits == 1
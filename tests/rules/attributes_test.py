@@ -6,7 +6,7 @@ Test cases for Transdoc's built-in `attributes` rule.
 from textwrap import dedent
 from typing import Any
 
-from transdoc import TransdocTransformer
+from transdoc import TransdocTransformer, recording_dependencies
 from transdoc.rules import (
     python_object_attributes,
     python_object_attributes_rule_gen,
@@ -14,8 +14,7 @@ from transdoc.rules import (
 
 
 class Example:
-    """{{attributes("tests.rules.attributes_test", "Example")}}
-    """
+    """{{attributes("tests.rules.attributes_test", "Example")}}"""
 
     some_attribute = "value"
 
@@ -86,7 +85,9 @@ def test_custom_filter():
 
 def test_custom_formatter():
     def format_attrs(
-        module: str, object: str | None, attribute: str,
+        module: str,
+        object: str | None,
+        attribute: str,
     ) -> str:
         return f"{module}.{object}.{attribute}"
 
@@ -112,3 +113,13 @@ def test_custom_formatter():
         )
         == expected
     )
+
+
+def test_attributes_records_module_dependency():
+    transformer = TransdocTransformer({"attributes": python_object_attributes})
+    with recording_dependencies() as dependencies:
+        transformer.transform(
+            '{{attributes("tests.rules.attributes_test", "Example")}}',
+            "<string>",
+        )
+    assert dependencies.modules == {"tests.rules.attributes_test"}
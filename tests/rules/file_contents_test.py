@@ -3,7 +3,9 @@
 Test cases for the `file_contents` rule.
 """
 
-from transdoc import TransdocTransformer
+import os
+
+from transdoc import TransdocTransformer, recording_dependencies
 from transdoc.rules import file_contents
 
 
@@ -11,7 +13,21 @@ def test_file_contents():
     transformer = TransdocTransformer({"file_contents": file_contents})
     assert (
         transformer.transform(
-            "{{file_contents[tests/data/example.txt]}}", "<string>",
+            "{{file_contents[tests/data/example.txt]}}",
+            "<string>",
         )
         == "Contents of example file"
     )
+
+
+def test_file_contents_records_dependency():
+    transformer = TransdocTransformer({"file_contents": file_contents})
+    for _ in range(2):
+        with recording_dependencies() as dependencies:
+            transformer.transform(
+                "{{file_contents[tests/data/example.txt]}}",
+                "<string>",
+            )
+        assert dependencies.files == {
+            os.path.abspath("tests/data/example.txt"),
+        }
@@ -0,0 +1,101 @@
+"""# Tests / Scanner test
+
+Test cases for the rule call scanner.
+"""
+
+import random
+import re
+
+import pytest
+
+from transdoc.scanner import (
+    Token,
+    TokenKind,
+    complete_prefix_length,
+    rule_call_contents,
+    scan,
+)
+
+
+def test_empty_input():
+    assert scan("") == []
+
+
+def test_literal_only():
+    assert scan("Some text") == [Token(TokenKind.LITERAL, 0, 9)]
+
+
+def test_rule_call():
+    assert scan("A {{call}} B") == [
+        Token(TokenKind.LITERAL, 0, 2),
+        Token(TokenKind.CALL, 2, 10),
+        Token(TokenKind.LITERAL, 10, 12),
+    ]
+
+
+def test_rule_call_contents():
+    input = "A {{call[x]}}"
+    assert rule_call_contents(input, scan(input)[1]) == "call[x]"
+
+
+def test_unclosed_call():
+    assert scan("{{a}} {{b") == [
+        Token(TokenKind.CALL, 0, 5),
+        Token(TokenKind.LITERAL, 5, 6),
+        Token(TokenKind.UNCLOSED, 6, 8),
+        Token(TokenKind.LITERAL, 8, 9),
+    ]
+
+
+def test_empty_braces_are_literal():
+    assert scan("{{}}") == [Token(TokenKind.LITERAL, 0, 4)]
+
+
+def test_many_unclosed_is_reported_once():
+    tokens = scan("{{" * 1000)
+    assert [t.kind for t in tokens] == [TokenKind.UNCLOSED, TokenKind.LITERAL]
+
+
+def regex_scan(input: str) -> list[Token]:
+    """Reference implementation, using the regular expressions which the
+    scanner replaced.
+    """
+    tokens = []
+    pos = 0
+    for match in re.finditer(r"\{\{.+?\}\}", input, re.DOTALL):
+        if match.start() > pos:
+            tokens.append(Token(TokenKind.LITERAL, pos, match.start()))
+        tokens.append(Token(TokenKind.CALL, match.start(), match.end()))
+        pos = match.end()
+    if unclosed := re.search(r"\{\{((?!\}\}).)*$", input, re.DOTALL):
+        if unclosed.start() > pos:
+            tokens.append(Token(TokenKind.LITERAL, pos, unclosed.start()))
+        tokens.append(
+            Token(TokenKind.UNCLOSED, unclosed.start(), unclosed.start() + 2),
+        )
+        pos = unclosed.start() + 2
+    if pos < len(input):
+        tokens.append(Token(TokenKind.LITERAL, pos, len(input)))
+    return tokens
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_regex_implementation(seed: int):
+    rng = random.Random(seed)
+    for _ in range(200):
+        input = "".join(rng.choices("{}a\n", k=rng.randint(0, 20)))
+        assert scan(input) == regex_scan(input), repr(input)
+
+
+@pytest.mark.parametrize(
+    ("input", "length"),
+    [
+        ("text", 4),
+        ("text {", 5),
+        ("a {{call}} b", 12),
+        ("a {{call}} {{pending", 11),
+        ("a {{}}", 2),
+    ],
+)
+def test_complete_prefix_length(input: str, length: int):
+    assert complete_prefix_length(input) == length
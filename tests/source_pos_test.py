@@ -3,7 +3,12 @@
 Test cases for SourcePos and SourceRange classes.
 """
 
-from transdoc.source_pos import SourcePos, SourceRange
+from transdoc.source_pos import (
+    SourceIndex,
+    SourcePos,
+    SourceRange,
+    resolve_range,
+)
 
 
 def test_zero_pos():
@@ -34,3 +39,37 @@ def test_offset_pos_str():
 
 def test_offset_pos_str_newline():
     assert SourcePos(2, 2).offset_by_str("a\nb\n123") == SourcePos(4, 4)
+
+
+def test_index_pos_first_line():
+    assert SourceIndex("12345", SourcePos(2, 2)).pos(5) == SourcePos(2, 7)
+
+
+def test_index_pos_newline():
+    assert SourceIndex("a\nb\n123", SourcePos(2, 2)).pos(7) == SourcePos(4, 4)
+
+
+def test_index_matches_offset_by_str():
+    string = "ab\n\ncd\ne"
+    index = SourceIndex(string, SourcePos(3, 5))
+    for offset in range(len(string) + 1):
+        assert index.pos(offset) == SourcePos(3, 5).offset_by_str(
+            string[:offset],
+        )
+
+
+def test_index_range():
+    assert SourceIndex("a\nbcd").range(2, 4) == SourceRange(
+        SourcePos(2, 1),
+        SourcePos(2, 3),
+    )
+
+
+def test_lazy_range():
+    pos = SourceIndex("a\nbcd").lazy_range(2, 4)
+    assert resolve_range(pos) == SourceRange(SourcePos(2, 1), SourcePos(2, 3))
+
+
+def test_resolve_range_is_identity_for_ranges():
+    pos = SourceRange(SourcePos(1, 1), SourcePos(1, 2))
+    assert resolve_range(pos) is pos
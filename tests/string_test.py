@@ -15,7 +15,8 @@ def test_transforms_strings(transformer: TransdocTransformer):
 
 
 def test_transforms_using_given_handler(
-    mocker: MockerFixture, transformer: TransdocTransformer,
+    mocker: MockerFixture,
+    transformer: TransdocTransformer,
 ):
     handler = SimpleHandler()
     matches_file = mocker.spy(handler, "matches_file")
@@ -32,3 +33,10 @@ def test_unsupported_handler_warning(transformer: TransdocTransformer):
     transdoc.transform(transformer, "Input", path="<test>", handler=handler)
     # Not testing for logging issues, because that's sorta annoying. This is
     # just here for coverage
+
+
+def test_transforms_large_strings(transformer: TransdocTransformer):
+    input = "Call: {{simple}}\n" * 10_000
+    assert transdoc.transform(transformer, input) == (
+        "Call: Simple rule\n" * 10_000
+    )
@@ -0,0 +1,84 @@
+"""# Tests / Template test
+
+Test cases for compiling inputs into templates.
+"""
+
+import gc
+
+import pytest
+from pytest_mock import MockerFixture
+
+from transdoc import TransdocTransformer
+from transdoc.errors import TransdocNameError, TransdocSyntaxError
+from transdoc.source_pos import SourcePos, SourceRange, resolve_range
+
+
+def test_render_matches_transform(transformer: TransdocTransformer):
+    input = "A {{simple}} B {{multiline[x\ny]}}\n  {{echo('z')}}"
+    template = transformer.compile(input, "<string>")
+    assert template.render(transformer, "  ") == transformer.transform(
+        input,
+        "<string>",
+        indentation="  ",
+    )
+
+
+def test_template_contents(transformer: TransdocTransformer):
+    template = transformer.compile("A {{simple}}\n{{echo[x]}}", "<string>")
+    assert template.literals == ("A ", "\n", "")
+    assert template.calls == ("simple", "echo[x]")
+    assert tuple(resolve_range(pos) for pos in template.positions) == (
+        SourceRange(SourcePos(1, 3), SourcePos(1, 13)),
+        SourceRange(SourcePos(2, 1), SourcePos(2, 12)),
+    )
+    assert template.end == SourcePos(2, 12)
+
+
+def test_template_does_not_keep_input(transformer: TransdocTransformer):
+    input = "A {{simple}}\n{{echo[x]}} {{"
+    template = transformer.compile(input, "<string>")
+    assert all(isinstance(pos, SourceRange) for pos in template.positions)
+    assert isinstance(template.unclosed, SourceRange)
+    # Search everything reachable from the template, other than classes
+    seen = set()
+    pending: list[object] = [template]
+    while pending:
+        obj = pending.pop()
+        assert obj is not input
+        if id(obj) not in seen and not isinstance(obj, type):
+            seen.add(id(obj))
+            pending.extend(gc.get_referents(obj))
+
+
+def test_render_with_other_transformer(transformer: TransdocTransformer):
+    template = transformer.compile("Hello, {{name}}!", "<string>")
+    assert (
+        template.render(TransdocTransformer({"name": lambda: "world"}))
+        == "Hello, world!"
+    )
+    assert (
+        template.render(TransdocTransformer({"name": lambda: "there"}))
+        == "Hello, there!"
+    )
+
+
+def test_render_does_not_scan_again(
+    transformer: TransdocTransformer,
+    mocker: MockerFixture,
+):
+    template = transformer.compile("{{simple}}", "<string>")
+    scan = mocker.patch("transdoc.__template.scan")
+    template.render(transformer)
+    template.render(transformer)
+    scan.assert_not_called()
+
+
+def test_render_errors(transformer: TransdocTransformer):
+    template = transformer.compile("{{missing}} {{simple}} {{", "<string>")
+    with pytest.raises(ExceptionGroup) as excinfo:
+        template.render(transformer)
+    errors = excinfo.value.exceptions
+    assert len(errors) == 2
+    assert isinstance(errors[0], TransdocNameError)
+    assert isinstance(errors[1], TransdocSyntaxError)
+    assert errors[1].pos == SourceRange(SourcePos(1, 24), SourcePos(1, 26))
@@ -0,0 +1,73 @@
+"""# Tests / Thread pool test
+
+Test cases for evaluating rule calls using a thread pool.
+"""
+
+import threading
+
+import pytest
+
+from transdoc import TransdocTransformer, thread_unsafe_rule
+from transdoc.errors import TransdocEvaluationError, TransdocNameError
+
+
+def test_rules_are_evaluated_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait(text: str) -> str:
+        # Only passes if both calls are evaluated at the same time
+        barrier.wait()
+        return text
+
+    transformer = TransdocTransformer({"wait": wait}, max_workers=2)
+    try:
+        assert (
+            transformer.transform("{{wait[a]}} {{wait[b]}}", "<string>")
+            == "a b"
+        )
+    finally:
+        transformer.close()
+
+
+def test_results_are_in_order():
+    transformer = TransdocTransformer({"upper": str.upper}, max_workers=4)
+    input = " ".join(f"{{{{upper[{i}x]}}}}" for i in range(50))
+    expected = " ".join(f"{i}X" for i in range(50))
+    try:
+        assert transformer.transform(input, "<string>") == expected
+    finally:
+        transformer.close()
+
+
+def test_thread_unsafe_rules_run_on_calling_thread():
+    threads = []
+
+    @thread_unsafe_rule
+    def unsafe() -> str:
+        threads.append(threading.current_thread())
+        return "unsafe"
+
+    transformer = TransdocTransformer(
+        {"unsafe": unsafe, "upper": str.upper},
+        max_workers=2,
+    )
+    try:
+        transformer.transform("{{unsafe}} {{upper[a]}} {{unsafe}}", "<string>")
+    finally:
+        transformer.close()
+    assert threads == [threading.current_thread()] * 2
+
+
+def test_errors_are_in_order():
+    def error() -> str:
+        raise ValueError()
+
+    transformer = TransdocTransformer({"error": error}, max_workers=2)
+    try:
+        with pytest.raises(ExceptionGroup) as excinfo:
+            transformer.transform("{{error}} {{undefined}}", "<string>")
+    finally:
+        transformer.close()
+    first, second = excinfo.value.exceptions
+    assert isinstance(first, TransdocEvaluationError)
+    assert isinstance(second, TransdocNameError)
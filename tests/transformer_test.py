@@ -3,14 +3,21 @@
 Test cases for TransdocTransformer
 """
 
+import importlib
+from io import StringIO
+
 import pytest
+from pytest_mock import MockerFixture
 
-from transdoc import TransdocTransformer
+from tests.conftest import echo_rule
+from transdoc import TransdocRule, TransdocTransformer
 from transdoc.errors import (
     TransdocEvaluationError,
     TransdocNameError,
     TransdocSyntaxError,
+    TransdocTransformationError,
 )
+from transdoc.source_pos import SourcePos, SourceRange
 
 ###############################################################################
 
@@ -60,7 +67,9 @@ def test_multiline_python_fn_input_rule(transformer: TransdocTransformer):
 def test_rules_respect_indentation(transformer: TransdocTransformer):
     assert (
         transformer.transform(
-            "Call: {{multiline}}", "<string>", indentation="    ",
+            "Call: {{multiline}}",
+            "<string>",
+            indentation="    ",
         )
         == "Call: Multiple\n    Lines"
     )
@@ -126,7 +135,9 @@ def test_name_error(transformer: TransdocTransformer, input: str):
     ],
 )
 def test_eval_error(
-    transformer: TransdocTransformer, input: str, err_type: type[Exception],
+    transformer: TransdocTransformer,
+    input: str,
+    err_type: type[Exception],
 ):
     with pytest.raises(ExceptionGroup) as excinfo:
         transformer.transform(input, "<string>")
@@ -136,13 +147,218 @@ def test_eval_error(
 
 
 def test_all_errors_reported(transformer: TransdocTransformer):
-    """When multiple errors occur when evaluating rules, are they all reported?
-    """
+    """When evaluating rules causes multiple errors, are they all reported?"""
     with pytest.raises(ExceptionGroup) as excinfo:
         transformer.transform(
-            "{{undefined}} {{error[TypeError]}} {{unclosed", "<string>",
+            "{{undefined}} {{error[TypeError]}} {{unclosed",
+            "<string>",
         )
     assert excinfo.group_contains(TransdocNameError)
     assert excinfo.group_contains(TransdocEvaluationError)
     assert excinfo.group_contains(TransdocSyntaxError)
     assert len(excinfo.value.exceptions) == 3
+
+
+def test_error_positions(transformer: TransdocTransformer):
+    with pytest.raises(ExceptionGroup) as excinfo:
+        transformer.transform(
+            "Line\nCall {{undefined}}\n  {{unclosed",
+            "<string>",
+        )
+    name_error, syntax_error = excinfo.value.exceptions
+    assert isinstance(name_error, TransdocNameError)
+    assert isinstance(syntax_error, TransdocSyntaxError)
+    assert name_error.pos == SourceRange(SourcePos(2, 6), SourcePos(2, 19))
+    assert syntax_error.pos == SourceRange(SourcePos(3, 3), SourcePos(3, 5))
+
+
+def test_rule_calls_are_parsed_once(mocker: MockerFixture):
+    parse = mocker.spy(
+        importlib.import_module("transdoc.__transformer"),
+        "parse_rule_call",
+    )
+    transformer = TransdocTransformer({"echo": echo_rule})
+    assert (
+        transformer.transform("{{echo('a')}} {{echo('a')}}", "<string>")
+        == "a a"
+    )
+    parse.assert_called_once_with("echo('a')")
+
+
+def test_rule_calls_do_not_modify_rules():
+    rules: dict[str, TransdocRule] = {"echo": echo_rule}
+    TransdocTransformer(rules).transform("{{echo('a')}}", "<string>")
+    assert rules == {"echo": echo_rule}
+
+
+def test_rules_are_not_affected_by_later_changes():
+    rules: dict[str, TransdocRule] = {"echo": echo_rule}
+    transformer = TransdocTransformer(rules)
+    rules["echo"] = lambda value: "changed"
+    rules["added"] = echo_rule
+    assert (
+        transformer.transform("{{echo[a]}} {{echo('b')}}", "<string>") == "a b"
+    )
+    for input in ["{{added[a]}}", "{{added('a')}}"]:
+        with pytest.raises(ExceptionGroup) as excinfo:
+            transformer.transform(input, "<string>")
+        assert excinfo.group_contains(TransdocNameError)
+
+
+def test_non_literal_arguments(transformer: TransdocTransformer):
+    assert (
+        transformer.transform("{{reprs(simple(), [1, 2], *'ab')}}", "<string>")
+        == "'Simple rule'\n[1, 2]\n'a'\n'b'"
+    )
+
+
+def test_python_expression(transformer: TransdocTransformer):
+    assert (
+        transformer.transform("{{echo('a') + echo('b')}}", "<string>") == "ab"
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1024])
+@pytest.mark.parametrize(
+    "input",
+    [
+        "Text without a rule call",
+        "Call: {{simple}} {{multiline}}\n{{echo[a\nb]}} end",
+        "a {{}} b {",
+        "{{echo[x}]}}}",
+        "{{echo[" + "long " * 20 + "]}} then {{echo[b]}}",
+        "{{echo[" + "x}" * 20 + "]}} {" + "}" * 20,
+    ],
+)
+def test_stream_matches_transform(
+    transformer: TransdocTransformer,
+    input: str,
+    chunk_size: int,
+):
+    output = StringIO()
+    transformer.transform_stream(
+        StringIO(input),
+        output,
+        "<string>",
+        chunk_size=chunk_size,
+    )
+    assert output.getvalue() == transformer.transform(input, "<string>")
+
+
+def test_stream_does_not_rescan_unclosed_calls(
+    transformer: TransdocTransformer,
+    mocker: MockerFixture,
+):
+    complete_prefix_length = mocker.spy(
+        importlib.import_module("transdoc.__transformer"),
+        "complete_prefix_length",
+    )
+    input = "start {{" + "unclosed text\n" * 10_000
+    output = StringIO()
+    with pytest.raises(ExceptionGroup):
+        transformer.transform_stream(
+            StringIO(input),
+            output,
+            "<string>",
+            chunk_size=100,
+        )
+    assert output.getvalue() == input
+    # The unclosed call is only scanned until it is known to be unclosed,
+    # rather than once per chunk
+    assert complete_prefix_length.call_count <= 2
+
+
+def pos_of(e: Exception) -> SourceRange:
+    assert isinstance(e, TransdocTransformationError)
+    return e.pos
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1024])
+def test_stream_error_positions(
+    transformer: TransdocTransformer,
+    chunk_size: int,
+):
+    input = "Line\nCall {{undefined}}\n  {{unclosed"
+    with pytest.raises(ExceptionGroup) as expected:
+        transformer.transform(input, "<string>")
+    with pytest.raises(ExceptionGroup) as excinfo:
+        transformer.transform_stream(
+            StringIO(input),
+            None,
+            "<string>",
+            chunk_size=chunk_size,
+        )
+    assert [pos_of(e) for e in excinfo.value.exceptions] == [
+        pos_of(e) for e in expected.value.exceptions
+    ]
+
+
+def test_transform_into_matches_transform(transformer: TransdocTransformer):
+    input = "Call: {{simple}} {{multiline}}\n{{echo[a\nb]}} end"
+    output = StringIO()
+    transformer.transform_into(input, output, "<string>", indentation="  ")
+    assert output.getvalue() == transformer.transform(
+        input,
+        "<string>",
+        indentation="  ",
+    )
+
+
+def test_transform_into_writes_output_before_errors(
+    transformer: TransdocTransformer,
+):
+    output = StringIO()
+    with pytest.raises(ExceptionGroup):
+        transformer.transform_into("a {{undefined}} b", output, "<string>")
+    assert output.getvalue() == "a  b"
+
+
+def test_error_position_is_resolved_lazily(mocker: MockerFixture):
+    error = TransdocEvaluationError(
+        "<string>",
+        resolve := mocker.Mock(return_value=SourceRange.zero()),
+    )
+    resolve.assert_not_called()
+    assert error.pos == SourceRange.zero()
+    assert error.pos == SourceRange.zero()
+    resolve.assert_called_once_with()
+
+
+def test_iterable_rule_output():
+    def lines():
+        yield "first\n"
+        yield "second  \nthi"
+        yield "rd"
+
+    transformer = TransdocTransformer({"lines": lines})
+    assert (
+        transformer.transform("- {{lines}}", "<string>", indentation="  ")
+        == "- first\n  second\n  third"
+    )
+
+
+def test_iterable_rule_output_is_written_incrementally():
+    written: list[str] = []
+
+    def lines():
+        yield "a\n"
+        # Output so far has been written before the rule continues
+        assert "a" in written
+        yield "b"
+
+    transformer = TransdocTransformer({"lines": lines})
+    output = StringIO()
+    output.write = written.append  # type: ignore[method-assign,assignment]
+    transformer.transform_into("{{lines}}", output, "<string>")
+    assert "".join(written) == "a\nb"
+
+
+def test_iterable_rule_output_error():
+    def lines():
+        yield "a"
+        raise ValueError()
+
+    transformer = TransdocTransformer({"lines": lines})
+    with pytest.raises(ExceptionGroup) as excinfo:
+        transformer.transform("{{lines}}", "<string>")
+    assert excinfo.group_contains(TransdocEvaluationError)
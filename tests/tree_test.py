@@ -9,11 +9,29 @@ from shutil import rmtree
 
 import pytest
 from PIL import Image
+from pytest_mock import MockerFixture
 
-from transdoc import TransdocTransformer, transform_tree
-from transdoc.errors import TransdocNameError
+import transdoc.__transform_tree as transform_tree_module
+from transdoc import TransdocTransformer, get_all_handlers, transform_tree
+from transdoc.__transform_tree import expand_tree
+from transdoc.errors import (
+    TransdocNameError,
+    TransdocTransformationError,
+    TransdocTransformExceptionGroup,
+)
 from transdoc.handlers.plaintext import PlaintextHandler
 
+DIRECTORY = Path("tests/data/directory")
+
+
+def error_filenames(group: ExceptionGroup) -> list[str]:
+    """Return the filename of each error within the group."""
+    return [
+        e.filename
+        for e in group.exceptions
+        if isinstance(e, TransdocTransformationError)
+    ]
+
 
 def test_transforms_directory(transformer: TransdocTransformer):
     """Creates an output directory if one does not exist, then transforms files
@@ -191,3 +209,243 @@ def test_passes_on_errors_during_transformation(
         )
 
     assert exc.group_contains(TransdocNameError)
+
+
+def test_files_without_rule_calls_are_not_transformed(
+    mocker: MockerFixture,
+    transformer: TransdocTransformer,
+):
+    temp = Path("temp")
+    rmtree(temp, ignore_errors=True)
+    handler = PlaintextHandler()
+    transform_file = mocker.spy(handler, "transform_file")
+    transform_tree(
+        [handler],
+        transformer,
+        Path("tests/data/directory"),
+        temp,
+    )
+    # skip.txt contains no rule calls, so is copied as-is
+    assert (temp / "skip.txt").read_text() == Path(
+        "tests/data/directory/skip.txt",
+    ).read_text()
+    transformed = {call.args[1] for call in transform_file.call_args_list}
+    assert transformed == {
+        str(Path("tests/data/directory/README.md")),
+        str(Path("tests/data/directory/LICENSE.txt")),
+    }
+
+
+def test_files_without_rule_calls_have_newlines_translated(
+    transformer: TransdocTransformer,
+    tmp_path: Path,
+):
+    input = tmp_path / "input"
+    input.mkdir()
+    (input / "copied.txt").write_bytes(b"a\r\nb\r\n")
+    (input / "transformed.txt").write_bytes(b"{{echo[a]}}\r\nb\r\n")
+    transform_tree(
+        [PlaintextHandler()],
+        transformer,
+        input,
+        tmp_path / "output",
+    )
+    # Files are written in the same way, whether or not they are transformed
+    assert (tmp_path / "output" / "copied.txt").read_bytes() == (
+        tmp_path / "output" / "transformed.txt"
+    ).read_bytes()
+
+
+def test_collects_errors_from_every_file(
+    transformer: TransdocTransformer,
+    tmp_path: Path,
+):
+    for name in ["a.txt", "b.txt", "c.txt"]:
+        (tmp_path / name).write_text("{{undefined}} {{also_undefined}}")
+    with pytest.raises(TransdocTransformExceptionGroup) as exc:
+        transform_tree([PlaintextHandler()], transformer, tmp_path, None)
+    # Errors are in the same order as the files
+    assert error_filenames(exc.value) == [
+        str(m.input) for m in expand_tree(tmp_path, None) for _ in range(2)
+    ]
+
+
+RULE_FILE = """
+from transdoc.rules import file_contents
+
+
+def echo(value):
+    return value
+"""
+
+
+@pytest.fixture
+def rule_file(tmp_path: Path) -> Path:
+    path = tmp_path / "rules.py"
+    path.write_text(RULE_FILE)
+    return path
+
+
+def test_multiple_processes_match_single_process(
+    rule_file: Path,
+    tmp_path: Path,
+):
+    transformer = TransdocTransformer.from_file(rule_file)
+    output_1 = tmp_path / "output_1"
+    output_2 = tmp_path / "output_2"
+    transform_tree(get_all_handlers(), transformer, DIRECTORY, output_1)
+    transform_tree(
+        get_all_handlers(),
+        transformer,
+        DIRECTORY,
+        output_2,
+        jobs=2,
+    )
+    for file in output_1.iterdir():
+        assert (output_2 / file.name).read_bytes() == file.read_bytes()
+    assert len(list(output_2.iterdir())) == len(list(output_1.iterdir()))
+
+
+def test_multiple_processes_collect_errors_in_order(
+    rule_file: Path,
+    tmp_path: Path,
+):
+    input = tmp_path / "input"
+    input.mkdir()
+    names = [f"{i}.txt" for i in range(10)]
+    for name in names:
+        (input / name).write_text("{{echo[ok]}} {{undefined}}")
+    transformer = TransdocTransformer.from_file(rule_file)
+    with pytest.raises(TransdocTransformExceptionGroup) as exc:
+        transform_tree(
+            get_all_handlers(),
+            transformer,
+            input,
+            None,
+            jobs=3,
+        )
+    assert all(isinstance(e, TransdocNameError) for e in exc.value.exceptions)
+    mappings = [str(m.input) for m in expand_tree(input, None)]
+    assert error_filenames(exc.value) == mappings
+
+
+def test_multiple_processes_require_rule_file(
+    transformer: TransdocTransformer,
+    tmp_path: Path,
+    caplog: pytest.LogCaptureFixture,
+):
+    transform_tree(
+        [PlaintextHandler()],
+        transformer,
+        DIRECTORY,
+        tmp_path / "output",
+        jobs=2,
+    )
+    assert "single process" in caplog.text
+    assert (tmp_path / "output" / "README.md").exists()
+
+
+@pytest.mark.parametrize("io_threads", [0, 1, 4])
+def test_io_threads_produce_same_output(
+    transformer: TransdocTransformer,
+    tmp_path: Path,
+    io_threads: int,
+):
+    output = tmp_path / "output"
+    transform_tree(
+        [PlaintextHandler()],
+        transformer,
+        DIRECTORY,
+        output,
+        io_threads=io_threads,
+    )
+    for file in DIRECTORY.iterdir():
+        assert (output / file.name).exists()
+    assert (output / "skip.txt").read_text() == (
+        DIRECTORY / "skip.txt"
+    ).read_text()
+    assert "{{" not in (output / "README.md").read_text()
+
+
+def test_stdout_is_in_input_order(
+    transformer: TransdocTransformer,
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+):
+    for i in range(50):
+        # Alternate between files which are transformed and copied
+        text = f"{{{{echo[file {i}]}}}}" if i % 2 else f"file {i}"
+        (tmp_path / f"{i}.txt").write_text(text + "\n")
+    transform_tree(
+        [PlaintextHandler()],
+        transformer,
+        tmp_path,
+        Path("-"),
+        io_threads=8,
+    )
+    mappings = expand_tree(tmp_path, Path("-"))
+    assert capsys.readouterr().out.split() == [
+        word for m in mappings for word in ["file", m.input.stem]
+    ]
+
+
+@pytest.mark.parametrize("io_threads", [0, 4])
+def test_large_files_are_streamed(
+    transformer: TransdocTransformer,
+    tmp_path: Path,
+    mocker: MockerFixture,
+    io_threads: int,
+):
+    mocker.patch("transdoc.__transform_tree.READ_AHEAD_MAX_SIZE", 100)
+    write_output = mocker.spy(transform_tree_module, "write_output")
+    input = tmp_path / "input"
+    input.mkdir()
+    (input / "small.txt").write_text("{{echo[small]}}")
+    (input / "large.txt").write_text("{{echo[large]}}\n" * 100)
+    transform_tree(
+        [PlaintextHandler()],
+        transformer,
+        input,
+        tmp_path / "output",
+        io_threads=io_threads,
+    )
+    assert (tmp_path / "output" / "small.txt").read_text() == "small"
+    assert (tmp_path / "output" / "large.txt").read_text() == "large\n" * 100
+    # Only the small file is buffered, and only if it is read ahead
+    written = [call.args[0].name for call in write_output.call_args_list]
+    assert written == (["small.txt"] if io_threads else [])
+
+
+def test_read_ahead_is_bounded_by_size(
+    transformer: TransdocTransformer,
+    tmp_path: Path,
+    mocker: MockerFixture,
+):
+    mocker.patch("transdoc.__transform_tree.READ_AHEAD_BYTES", 50)
+    prepare = mocker.spy(transform_tree_module, "prepare_mapping")
+    transform_prepared = transform_tree_module.transform_prepared
+    # Number of files which had been read ahead each time one was transformed
+    read_ahead: list[int] = []
+
+    def record_read_ahead(*args):
+        read_ahead.append(prepare.call_count - len(read_ahead))
+        return transform_prepared(*args)
+
+    mocker.patch(
+        "transdoc.__transform_tree.transform_prepared",
+        record_read_ahead,
+    )
+    input = tmp_path / "input"
+    input.mkdir()
+    for i in range(10):
+        (input / f"{i}.txt").write_text(f"{{{{echo[{i:0>20}]}}}}")
+    transform_tree(
+        [PlaintextHandler()],
+        transformer,
+        input,
+        tmp_path / "output",
+        io_threads=4,
+    )
+    # Each file is 31 bytes, so only one more fits within the limit
+    assert read_ahead and max(read_ahead) <= 2
+    assert (tmp_path / "output" / "9.txt").read_text() == f"{9:0>20}"
@@ -0,0 +1,74 @@
+"""# Tests / Util test
+
+Test cases for utility functions.
+"""
+
+import random
+
+import pytest
+
+from transdoc.util import StringBuilder, indent_by, indent_chunks
+
+
+def reference_indent_by(indent: str, string: str) -> str:
+    """Implementation of `indent_by` without any fast paths."""
+    return "\n".join(
+        f"{indent}{line.rstrip()}" for line in string.splitlines()
+    ).lstrip()
+
+
+@pytest.mark.parametrize(
+    ("indent", "string", "expected"),
+    [
+        ("  ", "", ""),
+        ("  ", "single line  ", "single line"),
+        ("", "a \nb\n", "a\nb"),
+        ("  ", "a\nb", "a\n  b"),
+        ("  ", "\n\n  a\n\nb", "a\n  \n  b"),
+    ],
+)
+def test_indent_by(indent: str, string: str, expected: str):
+    assert indent_by(indent, string) == expected
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_indent_matches_reference(seed: int):
+    rng = random.Random(seed)
+    for _ in range(500):
+        string = "".join(
+            rng.choices(["a", " ", "\t", "\n", "\r", "\r\n", "\x85"], k=10),
+        )
+        indent = rng.choice(["", "  ", "\t", "> "])
+        expected = reference_indent_by(indent, string)
+        assert indent_by(indent, string) == expected
+        # Split the string into random chunks
+        cuts = sorted(rng.sample(range(len(string) + 1), rng.randint(0, 4)))
+        chunks = [
+            string[start:end]
+            for start, end in zip(
+                [0, *cuts],
+                [*cuts, len(string)],
+                strict=True,
+            )
+        ]
+        assert "".join(indent_chunks(indent, chunks)) == expected, chunks
+
+
+def test_indent_chunks_is_lazy():
+    def chunks():
+        yield "first line\n"
+        raise ValueError()
+
+    output = indent_chunks("  ", chunks())
+    assert next(output) == "first line"
+    with pytest.raises(ValueError):
+        next(output)
+
+
+def test_string_builder():
+    builder = StringBuilder()
+    builder.write("a")
+    builder.write("b")
+    assert builder.getvalue() == "ab"
+    builder.write("c")
+    assert builder.getvalue() == "abc"
@@ -0,0 +1,231 @@
+"""# Tests / Watch test
+
+Test cases for watching a tree and transforming files as they change.
+"""
+
+import queue
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from transdoc import (
+    TransdocTransformer,
+    WatchBuild,
+    get_all_handlers,
+    watch_tree,
+)
+from transdoc.__watch import FileWatcher, PollingWatcher
+
+RULE_FILE = """
+from transdoc.rules import file_contents
+
+
+def echo(value):
+    return value
+"""
+
+TIMEOUT = 5.0
+
+
+@pytest.fixture
+def watcher() -> Iterator[FileWatcher]:
+    with PollingWatcher(interval=0.01) as watcher:
+        yield watcher
+
+
+def wait_for(watcher: FileWatcher, path: Path) -> set[Path]:
+    """Wait until the watcher reports a change to the given path."""
+    changed: set[Path] = set()
+    deadline = time.monotonic() + TIMEOUT
+    while path not in changed and time.monotonic() < deadline:
+        changed |= watcher.changes(0.1)
+    return changed
+
+
+def test_watcher_detects_changes(
+    watcher: FileWatcher,
+    tmp_path: Path,
+):
+    (tmp_path / "nested").mkdir()
+    modified = tmp_path / "nested" / "modified.txt"
+    modified.write_text("old")
+    watcher.add(tmp_path)
+    # Make sure the modification time changes
+    time.sleep(0.01)
+    modified.write_text("new contents")
+    assert modified in wait_for(watcher, modified)
+    created = tmp_path / "created.txt"
+    created.write_text("")
+    assert created in wait_for(watcher, created)
+    modified.unlink()
+    assert modified in wait_for(watcher, modified)
+
+
+def test_watcher_detects_files_in_new_directories(
+    watcher: FileWatcher,
+    tmp_path: Path,
+):
+    watcher.add(tmp_path)
+    (tmp_path / "new").mkdir()
+    # Directories may need to be seen before their contents are watched
+    watcher.changes(0.05)
+    created = tmp_path / "new" / "created.txt"
+    created.write_text("")
+    assert created in wait_for(watcher, created)
+
+
+def test_watcher_watches_single_files(
+    watcher: FileWatcher,
+    tmp_path: Path,
+):
+    watched = tmp_path / "watched.txt"
+    watched.write_text("old")
+    watcher.add(watched)
+    (tmp_path / "ignored.txt").write_text("")
+    assert watcher.changes(0.05) == set()
+    watched.write_text("new contents")
+    assert watched in wait_for(watcher, watched)
+
+
+class Watching:
+    """Runs `watch_tree` in a background thread."""
+
+    def __init__(self, rule_file: Path, input: Path, output: Path) -> None:
+        self.builds: queue.Queue[WatchBuild] = queue.Queue()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(
+            target=watch_tree,
+            args=(
+                get_all_handlers(),
+                TransdocTransformer.from_file(rule_file),
+                input,
+                output,
+            ),
+            kwargs={
+                "watcher": PollingWatcher(interval=0.01),
+                "debounce": 0.02,
+                "on_build": self.builds.put,
+                "stop": self.stop,
+            },
+        )
+        self.thread.start()
+
+    def next_build(self) -> WatchBuild:
+        return self.builds.get(timeout=TIMEOUT)
+
+    def close(self) -> None:
+        self.stop.set()
+        self.thread.join(TIMEOUT)
+
+
+@pytest.fixture
+def rule_file(tmp_path: Path) -> Path:
+    path = tmp_path / "rules.py"
+    path.write_text(RULE_FILE)
+    return path
+
+
+@pytest.fixture
+def input(tmp_path: Path) -> Path:
+    input = tmp_path / "input"
+    (input / "nested").mkdir(parents=True)
+    (input / "a.txt").write_text("{{echo[a]}}")
+    (input / "nested" / "b.md").write_text("{{echo[b]}}")
+    return input
+
+
+@pytest.fixture
+def watching(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+) -> Iterator[Watching]:
+    watching = Watching(rule_file, input, tmp_path / "output")
+    yield watching
+    watching.close()
+
+
+def test_initial_build(watching: Watching, tmp_path: Path):
+    build = watching.next_build()
+    assert build.files == 2
+    assert build.errors == []
+    assert (tmp_path / "output" / "a.txt").read_text() == "a"
+
+
+def test_changed_files_are_rebuilt(
+    watching: Watching,
+    input: Path,
+    tmp_path: Path,
+):
+    watching.next_build()
+    (input / "a.txt").write_text("{{echo[changed]}}")
+    build = watching.next_build()
+    assert build.files == 1
+    assert (tmp_path / "output" / "a.txt").read_text() == "changed"
+
+
+def test_removed_files_are_removed(
+    watching: Watching,
+    input: Path,
+    tmp_path: Path,
+):
+    watching.next_build()
+    (input / "nested" / "b.md").unlink()
+    watching.next_build()
+    assert not (tmp_path / "output" / "nested").exists()
+
+
+def test_errors_are_reported(watching: Watching, input: Path):
+    watching.next_build()
+    (input / "a.txt").write_text("{{undefined}}")
+    build = watching.next_build()
+    assert len(build.errors) == 1
+
+
+def test_rule_file_is_reloaded(
+    watching: Watching,
+    rule_file: Path,
+    tmp_path: Path,
+):
+    watching.next_build()
+    rule_file.write_text(RULE_FILE.replace("return value", "return 'x'"))
+    build = watching.next_build()
+    assert build.reloaded
+    assert (tmp_path / "output" / "a.txt").read_text() == "x"
+
+
+def test_broken_rule_file_keeps_previous_rules(
+    watching: Watching,
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+):
+    watching.next_build()
+    rule_file.write_text("this is not python")
+    build = watching.next_build()
+    assert build.error is not None
+    (input / "a.txt").write_text("{{echo[still works]}}")
+    watching.next_build()
+    assert (tmp_path / "output" / "a.txt").read_text() == "still works"
+
+
+def test_dependencies_are_rebuilt(
+    rule_file: Path,
+    input: Path,
+    tmp_path: Path,
+):
+    snippet = tmp_path / "snippet.txt"
+    snippet.write_text("old")
+    (input / "a.txt").write_text(f"{{{{file_contents[{snippet}]}}}}")
+    watching = Watching(rule_file, input, tmp_path / "output")
+    try:
+        watching.next_build()
+        snippet.write_text("new")
+        build = watching.next_build()
+        assert build.files == 1
+        assert (tmp_path / "output" / "a.txt").read_text() == "new"
+    finally:
+        watching.close()
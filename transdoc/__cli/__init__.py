@@ -3,9 +3,12 @@
 Main entrypoint to the Transdoc CLI.
 """
 
+import contextlib
+import json
 import logging
 import os
 import re
+import shutil
 import sys
 from pathlib import Path
 from typing import IO
@@ -13,10 +16,15 @@ from typing import IO
 import click
 
 from transdoc import (
+    DiskCache,
+    TransdocMemoryReport,
+    TransdocProfile,
     TransdocTransformer,
+    WatchBuild,
     get_all_handlers,
     transform_file,
     transform_tree,
+    watch_tree,
 )
 from transdoc.__consts import VERSION
 from transdoc.util import print_error
@@ -27,7 +35,7 @@ from .util import pride
 log = logging.getLogger(__name__)
 
 
-help_text_width = os.get_terminal_size().columns - 4
+help_text_width = shutil.get_terminal_size().columns - 4
 
 
 HELP_TEXT = f"""
@@ -66,6 +74,40 @@ def handle_verbose(verbose: int):
     logging.basicConfig(level=mappings.get(verbose, "DEBUG"))
 
 
+def report_build(build: WatchBuild) -> None:
+    """Print the outcome of a build while watching."""
+    if build.error is not None:
+        print(
+            "Error while rebuilding, so using the previous rules"
+            if build.reloaded
+            else "Error while rebuilding",
+            file=sys.stderr,
+        )
+        print_error(build.error)
+        return
+    print(
+        f"{'Reloaded rules and checked' if build.reloaded else 'Checked'} "
+        f"{build.files} file{'' if build.files == 1 else 's'} in "
+        f"{build.duration * 1000:.0f} ms",
+        file=sys.stderr,
+    )
+    if build.errors:
+        print_error(ExceptionGroup("Errors while transforming", build.errors))
+
+
+def report_profile(
+    stats: TransdocProfile,
+    print_report: bool,
+    json_path: Path | None,
+) -> None:
+    """Print profiling statistics and/or write them to a JSON file."""
+    if print_report:
+        print(stats.report(), file=sys.stderr)
+    if json_path is not None:
+        with open(json_path, "w") as f:
+            json.dump(stats.to_json(), f, indent=2, sort_keys=True)
+
+
 @click.command("transdoc", help=HELP_TEXT, epilog=HELP_EPILOG)
 @click.argument(
     "input",
@@ -101,6 +143,29 @@ def handle_verbose(verbose: int):
     cls=Mutex,
     mutex_with=["dryrun"],
 )
+@click.option(
+    "-i",
+    "--incremental",
+    is_flag=True,
+    help=(
+        "Only transform files which changed since the output directory was "
+        "last built, and remove outputs whose inputs were removed."
+    ),
+    cls=Mutex,
+    mutex_with=["dryrun"],
+)
+@click.option(
+    "-w",
+    "--watch",
+    is_flag=True,
+    help=(
+        "After transforming the input directory, keep running and transform "
+        "files again whenever they change. Changes to the rule file cause it "
+        "to be reloaded."
+    ),
+    cls=Mutex,
+    mutex_with=["dryrun"],
+)
 @click.option(
     "--skip-if",
     help=(
@@ -109,6 +174,62 @@ def handle_verbose(verbose: int):
         "special characters."
     ),
 )
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    help=(
+        "Directory to cache the results of pure rules in, so that they can be "
+        "reused by later runs."
+    ),
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=0),
+    default=64,
+    show_default=True,
+    help="Maximum size of the rule result cache, in MiB.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help=(
+        "Print the time spent evaluating each rule and transforming each file."
+    ),
+)
+@click.option(
+    "--profile-json",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write profiling statistics to the given JSON file.",
+)
+@click.option(
+    "--memory-report",
+    is_flag=True,
+    help=(
+        "Print the peak and retained memory allocated while transforming "
+        "each file and evaluating each rule, and the top allocators. This "
+        "significantly slows down transformation."
+    ),
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default="number of CPUs",
+    help=(
+        "Number of processes to transform files in. Profiling and memory "
+        "reports always use a single process."
+    ),
+)
+@click.option(
+    "--io-threads",
+    type=click.IntRange(min=0),
+    help=(
+        "Number of threads to read, copy and write files in. Use 0 to "
+        "perform all I/O on the main thread. Defaults to a number based on "
+        "the number of CPUs."
+    ),
+)
 @click.option("-v", "--verbose", count=True)
 @click.version_option(VERSION)
 def cli(
@@ -118,13 +239,34 @@ def cli(
     *,
     dryrun: bool = False,
     force: bool = False,
+    incremental: bool = False,
+    watch: bool = False,
     skip_if: str | None = None,
+    cache_dir: Path | None = None,
+    cache_size: int = 64,
+    profile: bool = False,
+    profile_json: Path | None = None,
+    memory_report: bool = False,
+    jobs: int = 1,
+    io_threads: int | None = None,
     verbose: int = 0,
 ) -> int:
     """CLI entrypoint"""
     handle_verbose(verbose)
+    stats = TransdocProfile() if profile or profile_json is not None else None
+    memory = TransdocMemoryReport() if memory_report else None
+    disk_cache = (
+        DiskCache.for_rule_file(cache_dir, rule_file, cache_size * 1024 * 1024)
+        if cache_dir is not None
+        else None
+    )
     try:
-        transformer = TransdocTransformer.from_file(rule_file)
+        transformer = TransdocTransformer.from_file(
+            rule_file,
+            disk_cache=disk_cache,
+            profile=stats,
+            hooks=memory,
+        )
     except Exception as e:
         msg = f"Error evaluating rule file '{rule_file}'"
         log.exception(msg)
@@ -132,46 +274,85 @@ def cli(
         print_error(e)
         return 1
     handlers = get_all_handlers()
+    if stats is not None or memory is not None:
+        # Rule statistics can't be collected from other processes
+        jobs = 1
+    if memory is not None:
+        # Allocations made by I/O threads would be counted towards the file
+        # being transformed
+        io_threads = 0
 
-    if input == "-":
-        # Transform stdin
-        if output is not None:
-            out_file: IO | None = open(output, "w")  # noqa: SIM115
-        else:
-            out_file = sys.stdout
-        try:
-            transform_file(
-                handlers,
-                transformer,
-                "<stdin>",
-                sys.stdin,
-                out_file,
-            )
-        except ExceptionGroup as e:
-            print_error(e)
-            return 1
-    else:
-        if output is None and not dryrun:
-            print("--output must be given if --dryrun is not specified")
-            return 2
-
-        def skip_callback(p: Path):
-            """Whether to skip the given path"""
-            if skip_if is None:
-                return False
+    if memory is not None:
+        memory.start()
+    try:
+        if input == "-":
+            # Transform stdin
+            if output is not None:
+                out_file: IO | None = open(output, "w")  # noqa: SIM115
             else:
-                return re.search(skip_if, str(p)) is not None
-
-        try:
-            transform_tree(
-                handlers,
-                transformer,
-                Path(input),
-                output,
-                force=force,
-                skip_if=skip_callback,
-            )
-        except ExceptionGroup as e:
-            print_error(e)
-            return 1
-    return 0
+                out_file = sys.stdout
+            try:
+                transform_file(
+                    handlers,
+                    transformer,
+                    "<stdin>",
+                    sys.stdin,
+                    out_file,
+                )
+            except ExceptionGroup as e:
+                print_error(e)
+                return 1
+        else:
+            if output is None and not dryrun:
+                print("--output must be given if --dryrun is not specified")
+                return 2
+
+            def skip_callback(p: Path):
+                """Whether to skip the given path"""
+                if skip_if is None:
+                    return False
+                else:
+                    return re.search(skip_if, str(p)) is not None
+
+            if watch:
+                if output is None or not Path(input).is_dir():
+                    print("--watch requires an input directory and --output")
+                    return 2
+                with contextlib.suppress(KeyboardInterrupt):
+                    watch_tree(
+                        handlers,
+                        transformer,
+                        Path(input),
+                        output,
+                        force=force,
+                        skip_if=skip_callback,
+                        jobs=jobs,
+                        io_threads=io_threads,
+                        on_build=report_build,
+                    )
+                return 0
+
+            try:
+                transform_tree(
+                    handlers,
+                    transformer,
+                    Path(input),
+                    output,
+                    force=force,
+                    skip_if=skip_callback,
+                    incremental=incremental,
+                    jobs=jobs,
+                    io_threads=io_threads,
+                )
+            except ExceptionGroup as e:
+                print_error(e)
+                return 1
+        return 0
+    finally:
+        if memory is not None:
+            memory.stop()
+            print(memory.report(), file=sys.stderr)
+        if disk_cache is not None:
+            disk_cache.prune()
+        if stats is not None:
+            report_profile(stats, profile, profile_json)
@@ -0,0 +1,198 @@
+"""# Transdoc / Dependencies
+
+Recording of the files, modules and environment variables which rules use,
+so that outputs can be rebuilt when any of them change.
+"""
+
+import hashlib
+import importlib.util
+import logging
+import os
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+log = logging.getLogger("transdoc.dependencies")
+
+
+def hash_file(path: Path) -> str:
+    """Return the SHA-256 hash of the given file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+@dataclass
+class Dependencies:
+    """Set of things which the output of a rule or file depends on."""
+
+    files: set[str] = field(default_factory=set)
+    """Absolute paths of files which were read"""
+    modules: set[str] = field(default_factory=set)
+    """Names of modules which were imported"""
+    env: set[str] = field(default_factory=set)
+    """Names of environment variables which were used"""
+
+    def __bool__(self) -> bool:
+        return bool(self.files or self.modules or self.env)
+
+    def update(self, other: "Dependencies") -> None:
+        """Add the dependencies of `other` to this set."""
+        self.files.update(other.files)
+        self.modules.update(other.modules)
+        self.env.update(other.env)
+
+
+def dependency_keys(dependencies: Dependencies) -> list[str]:
+    """Return a key identifying each of the given dependencies."""
+    return [
+        *(f"file:{path}" for path in sorted(dependencies.files)),
+        *(f"module:{name}" for name in sorted(dependencies.modules)),
+        *(f"env:{name}" for name in sorted(dependencies.env)),
+    ]
+
+
+def fingerprint(key: str) -> str | None:
+    """Return a fingerprint of the current state of a dependency.
+
+    * Files are fingerprinted using a hash of their contents.
+    * Modules are fingerprinted using a hash of their source file. Other
+      modules which they import are not considered.
+    * Environment variables are fingerprinted using a hash of their value.
+
+    Returns `None` if the dependency doesn't exist, or is of an unknown kind.
+    """
+    kind, _, name = key.partition(":")
+    if kind == "file":
+        try:
+            return hash_file(Path(name))
+        except OSError:
+            return None
+    elif kind == "module":
+        try:
+            spec = importlib.util.find_spec(name)
+        except (ImportError, ValueError):
+            return None
+        if spec is None or not spec.has_location or spec.origin is None:
+            return None
+        try:
+            return hash_file(Path(spec.origin))
+        except OSError:
+            return None
+    elif kind == "env":
+        value = os.environ.get(name)
+        if value is None:
+            return None
+        return hashlib.sha256(value.encode()).hexdigest()
+    else:
+        log.warning(f"Unknown dependency {key!r}")
+        return None
+
+
+def dependencies_from_keys(keys: Iterable[str]) -> Dependencies:
+    """Return the dependencies identified by the given keys.
+
+    This is the inverse of `dependency_keys`. Unknown keys are ignored.
+    """
+    dependencies = Dependencies()
+    for key in keys:
+        kind, _, name = key.partition(":")
+        if kind == "file":
+            dependencies.files.add(name)
+        elif kind == "module":
+            dependencies.modules.add(name)
+        elif kind == "env":
+            dependencies.env.add(name)
+    return dependencies
+
+
+# Dependencies of the rule or file currently being evaluated, if they are
+# being recorded
+_recorder: ContextVar[Dependencies | None] = ContextVar(
+    "transdoc_dependencies",
+    default=None,
+)
+
+
+@contextmanager
+def recording_dependencies() -> Iterator[Dependencies]:
+    """Record the dependencies declared within a `with` block.
+
+    Recordings can be nested, in which case the dependencies recorded by the
+    inner block are also added to the outer one once it exits. Recordings
+    are stored in a context variable, so are shared with asynchronous tasks
+    started within the block, but not with other threads.
+
+    ```py
+    with recording_dependencies() as dependencies:
+        transformer.transform(text, "README.md")
+    print(dependencies.files)
+    ```
+    """
+    dependencies = Dependencies()
+    token = _recorder.set(dependencies)
+    try:
+        yield dependencies
+    finally:
+        _recorder.reset(token)
+        outer = _recorder.get()
+        if outer is not None:
+            outer.update(dependencies)
+
+
+def record_dependencies(dependencies: Dependencies) -> None:
+    """Add the given dependencies to the current recording, if any."""
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.update(dependencies)
+
+
+def depends_on_file(path: str | os.PathLike[str]) -> None:
+    """Declare that the output of the current rule depends on a file.
+
+    Rules which read files should call this, so that their outputs are
+    rebuilt when the file changes during incremental builds.
+
+    Parameters
+    ----------
+    path : str | PathLike
+        Path to the file, relative to the current working directory.
+    """
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.files.add(os.path.abspath(path))
+
+
+def depends_on_module(name: str) -> None:
+    """Declare that the output of the current rule depends on a module.
+
+    Rules which import modules should call this, so that their outputs are
+    rebuilt when the module's source file changes during incremental builds.
+
+    Parameters
+    ----------
+    name : str
+        Fully-qualified name of the module, as given to
+        `importlib.import_module`.
+    """
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.modules.add(name)
+
+
+def depends_on_env(name: str) -> None:
+    """Declare that the output of the current rule depends on an env var.
+
+    Rules which read environment variables should call this, so that their
+    outputs are rebuilt when the variable's value changes during incremental
+    builds.
+
+    Parameters
+    ----------
+    name : str
+        Name of the environment variable.
+    """
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.env.add(name)
@@ -0,0 +1,260 @@
+"""# Transdoc / Disk cache
+
+A persistent store of the results of pure rules, shared between runs.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any
+
+from transdoc.__consts import VERSION
+from transdoc.__dependencies import (
+    Dependencies,
+    dependencies_from_keys,
+    dependency_keys,
+    fingerprint,
+    hash_file,
+)
+
+log = logging.getLogger("transdoc.disk_cache")
+
+
+ENTRY_FORMAT = 2
+"""Version of the format of cache entries, included in their keys"""
+
+STABLE_TYPES = (str, bytes, int, float, complex, bool, type(None))
+"""Types whose `repr` is the same in every run"""
+
+
+def is_stable(value: Any) -> bool:
+    """Return whether the `repr` of the given value is the same in every run.
+
+    For example, this is not the case for `frozenset`s, whose ordering
+    depends on string hashing, which is randomized per process.
+    """
+    if isinstance(value, tuple):
+        return all(is_stable(item) for item in value)
+    return isinstance(value, STABLE_TYPES)
+
+
+class DiskCache:
+    """Cache of rule results, stored as files within a directory.
+
+    Entries are keyed using the rule's name, its arguments, the version of
+    Transdoc, and a namespace which should identify the rule-set (for example,
+    a hash of the rule file).
+    Each entry also stores a fingerprint of the dependencies recorded by the
+    rule, and is ignored if any of them have changed. When the cache grows
+    beyond its maximum size, the least-recently-used entries are removed by
+    `prune`.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        namespace: str,
+        max_size: int = 64 * 1024 * 1024,
+    ) -> None:
+        """Open a cache in the given directory, creating it if necessary.
+
+        Parameters
+        ----------
+        directory : Path
+            Directory to store cache entries in.
+        namespace : str
+            Identifier for the rule-set, used so that changes to rules
+            invalidate their cached results.
+        max_size : int, optional = 64 MiB
+            Maximum total size of cache entries in bytes.
+        """
+        self.__directory = directory
+        self.__namespace = namespace
+        self.__max_size = max_size
+        self.__hits = 0
+        self.__misses = 0
+        # Fingerprints of dependencies, which are only computed once, since
+        # many entries may share a dependency
+        self.__fingerprints: dict[str, str | None] = {}
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"DiskCache({str(self.__directory)!r})"
+
+    @classmethod
+    def for_rule_file(
+        cls,
+        directory: Path,
+        rule_file: Path,
+        max_size: int = 64 * 1024 * 1024,
+    ) -> "DiskCache":
+        """Open a cache for the rules defined in the given rule file.
+
+        The cache is namespaced using a hash of the rule file's contents, so
+        that editing the rule file invalidates all cached results. Modules
+        imported by the rule file are not included in the hash, so if they
+        change, the cache directory should be deleted, unless the rules which
+        use them declare them using `depends_on_module`.
+
+        Parameters
+        ----------
+        directory : Path
+            Directory to store cache entries in.
+        rule_file : Path
+            Rule file, as given to `TransdocTransformer.from_file`.
+        max_size : int, optional = 64 MiB
+            Maximum total size of cache entries in bytes.
+
+        Returns
+        -------
+        DiskCache
+            Cache for results of rules within the rule file.
+        """
+        return cls(directory, hash_file(rule_file), max_size)
+
+    def __entry_path(
+        self,
+        name: str,
+        args: tuple,
+        kwargs: dict[str, Any],
+    ) -> Path | None:
+        """Return the path of the entry for a rule call.
+
+        If the arguments can't be keyed reliably, returns `None`.
+        """
+        kwarg_items = tuple(sorted(kwargs.items()))
+        if not (is_stable(args) and is_stable(kwarg_items)):
+            return None
+        key = hashlib.sha256(
+            repr(
+                (
+                    ENTRY_FORMAT,
+                    VERSION,
+                    self.__namespace,
+                    name,
+                    args,
+                    kwarg_items,
+                ),
+            ).encode(),
+        ).hexdigest()
+        return self.__directory / key[:2] / key
+
+    def __fingerprint(self, key: str) -> str | None:
+        """Return the fingerprint of a dependency, computing it only once."""
+        if key not in self.__fingerprints:
+            self.__fingerprints[key] = fingerprint(key)
+        return self.__fingerprints[key]
+
+    def reset_fingerprints(self) -> None:
+        """Forget the fingerprints of dependencies, so they are found again.
+
+        Fingerprints are only found once, so this should be called if any
+        dependencies may have changed, such as between builds in watch mode.
+        """
+        self.__fingerprints.clear()
+
+    def get(
+        self,
+        name: str,
+        args: tuple,
+        kwargs: dict[str, Any],
+    ) -> tuple[str, Dependencies] | None:
+        """Look up the cached result of a rule call.
+
+        Returns the result and the dependencies the rule recorded, or `None`
+        if no result is cached, or if any of its dependencies have changed.
+        """
+        path = self.__entry_path(name, args, kwargs)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            result = entry["result"]
+            dependencies = entry["dependencies"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.__misses += 1
+            return None
+        if not all(
+            self.__fingerprint(key) == value
+            for key, value in dependencies.items()
+        ):
+            self.__misses += 1
+            return None
+        # Mark entry as recently used
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        self.__hits += 1
+        return result, dependencies_from_keys(dependencies)
+
+    def put(
+        self,
+        name: str,
+        args: tuple,
+        kwargs: dict[str, Any],
+        result: str,
+        dependencies: Dependencies | None = None,
+    ) -> None:
+        """Store the result of a rule call.
+
+        The current fingerprint of each of the rule's dependencies is stored
+        alongside the result, so that it can be ignored once they change.
+        """
+        path = self.__entry_path(name, args, kwargs)
+        if path is None:
+            return
+        entry = {
+            "result": result,
+            "dependencies": {
+                key: self.__fingerprint(key)
+                for key in dependency_keys(dependencies or Dependencies())
+            },
+        }
+        # Write to a temporary file then move it, so that concurrent readers
+        # never see a partially-written entry
+        try:
+            path.parent.mkdir(exist_ok=True)
+            with NamedTemporaryFile(
+                "w",
+                encoding="utf-8",
+                dir=path.parent,
+                delete=False,
+            ) as f:
+                json.dump(entry, f)
+            os.replace(f.name, path)
+        except OSError:
+            log.warning(f"Unable to write cache entry {path}", exc_info=True)
+
+    def prune(self) -> None:
+        """Remove least-recently-used entries until within the size limit."""
+        entries = []
+        total = 0
+        for entry in self.__directory.glob("*/*"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.__max_size:
+                break
+            log.debug(f"Evicting cache entry {entry}")
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    @property
+    def hits(self) -> int:
+        """Number of lookups during this run which found a cached result"""
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        """Number of lookups during this run which found no cached result"""
+        return self.__misses
@@ -0,0 +1,222 @@
+"""# Transdoc / Hooks
+
+Interface for observing events during transformation, eg for tracing.
+"""
+
+from typing import TYPE_CHECKING, Any
+
+from typing_extensions import override
+
+if TYPE_CHECKING:
+    from transdoc.handlers.api import TransdocHandler
+
+
+class TransdocHooks:
+    """Receiver of events which occur during transformation.
+
+    Subclass this and override the methods for the events you are interested
+    in, then pass an instance to the `TransdocTransformer` constructor. Events
+    are reported by the transformer, as well as by `transform_file` and
+    `transform_tree` when they are given that transformer. All methods do
+    nothing by default.
+
+    Events may be reported from multiple threads at once.
+    """
+
+    def file_started(self, path: str) -> None:
+        """A file has started being transformed.
+
+        Parameters
+        ----------
+        path : str
+            Path of the input file.
+        """
+
+    def handler_selected(self, path: str, handler: "TransdocHandler") -> None:
+        """A handler was chosen to transform a file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the input file.
+        handler : TransdocHandler
+            Handler which will transform the file.
+        """
+
+    def bytes_read(self, path: str, size: int) -> None:
+        """Data was read from an input file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the input file.
+        size : int
+            Number of bytes read.
+        """
+
+    def bytes_written(self, path: str, size: int) -> None:
+        """Data was written to an output file.
+
+        Parameters
+        ----------
+        path : str
+            Path of the input file which the output was produced from.
+        size : int
+            Number of bytes written.
+        """
+
+    def file_finished(
+        self,
+        path: str,
+        duration: float,
+        error: BaseException | None,
+    ) -> None:
+        """A file has finished being transformed.
+
+        Parameters
+        ----------
+        path : str
+            Path of the input file.
+        duration : float
+            Wall time spent on the file, in seconds.
+        error : BaseException | None
+            Error which occurred while transforming the file, if any.
+        """
+
+    def rule_started(self, name: str) -> None:
+        """A rule is about to be evaluated.
+
+        A batch of calls to a rule is reported once, but each call in the
+        batch is reported to `rule_evaluated`.
+
+        Parameters
+        ----------
+        name : str
+            Name of the rule.
+        """
+
+    def rule_evaluated(
+        self,
+        name: str,
+        duration: float,
+        output: Any,
+        error: bool,
+    ) -> None:
+        """A call to a rule has been evaluated.
+
+        Parameters
+        ----------
+        name : str
+            Name of the rule.
+        duration : float
+            Wall time spent evaluating the rule, in seconds.
+        output : Any
+            Output of the rule, or `None` if it raised an error.
+        error : bool
+            Whether the rule raised an error.
+        """
+
+    def rule_output_chunk(self, name: str, chunk: str) -> None:
+        """A chunk of a rule's streamed output was consumed.
+
+        Rules which return an iterable of chunks are reported to
+        `rule_evaluated` before their output is consumed, so each chunk is
+        reported separately as it is produced.
+
+        Parameters
+        ----------
+        name : str
+            Name of the rule.
+        chunk : str
+            Chunk of output.
+        """
+
+    def rule_cache_hit(self, name: str) -> None:
+        """The result of a call to a pure rule was found in a cache.
+
+        Parameters
+        ----------
+        name : str
+            Name of the rule.
+        """
+
+
+class MultiHooks(TransdocHooks):
+    """Hooks which report each event to multiple other hooks."""
+
+    def __init__(self, hooks: list[TransdocHooks]) -> None:
+        """Report events to each of the given hooks, in order."""
+        self.__hooks = hooks
+
+    def __repr__(self) -> str:
+        return f"MultiHooks({self.__hooks})"
+
+    @override
+    def file_started(self, path: str) -> None:
+        for hooks in self.__hooks:
+            hooks.file_started(path)
+
+    @override
+    def handler_selected(self, path: str, handler: "TransdocHandler") -> None:
+        for hooks in self.__hooks:
+            hooks.handler_selected(path, handler)
+
+    @override
+    def bytes_read(self, path: str, size: int) -> None:
+        for hooks in self.__hooks:
+            hooks.bytes_read(path, size)
+
+    @override
+    def bytes_written(self, path: str, size: int) -> None:
+        for hooks in self.__hooks:
+            hooks.bytes_written(path, size)
+
+    @override
+    def file_finished(
+        self,
+        path: str,
+        duration: float,
+        error: BaseException | None,
+    ) -> None:
+        for hooks in self.__hooks:
+            hooks.file_finished(path, duration, error)
+
+    @override
+    def rule_started(self, name: str) -> None:
+        for hooks in self.__hooks:
+            hooks.rule_started(name)
+
+    @override
+    def rule_evaluated(
+        self,
+        name: str,
+        duration: float,
+        output: Any,
+        error: bool,
+    ) -> None:
+        for hooks in self.__hooks:
+            hooks.rule_evaluated(name, duration, output, error)
+
+    @override
+    def rule_output_chunk(self, name: str, chunk: str) -> None:
+        for hooks in self.__hooks:
+            hooks.rule_output_chunk(name, chunk)
+
+    @override
+    def rule_cache_hit(self, name: str) -> None:
+        for hooks in self.__hooks:
+            hooks.rule_cache_hit(name)
+
+
+def combine_hooks(*hooks: TransdocHooks | None) -> TransdocHooks | None:
+    """Combine the given hooks, ignoring those which are `None`.
+
+    Returns `None` if no hooks are given, so that callers can skip reporting
+    events entirely.
+    """
+    present = [h for h in hooks if h is not None]
+    if not present:
+        return None
+    if len(present) == 1:
+        return present[0]
+    return MultiHooks(present)
@@ -8,8 +8,26 @@ __all__ = [
     "__version__",
     "transform_tree",
     "transform_file",
+    "watch_tree",
+    "WatchBuild",
     "TransdocTransformer",
+    "TransdocTemplate",
+    "DiskCache",
+    "TransdocProfile",
+    "TransdocHooks",
+    "RuleStats",
+    "TransdocMemoryReport",
+    "MemoryStats",
+    "MemoryAllocator",
     "TransdocRule",
+    "pure_rule",
+    "thread_unsafe_rule",
+    "batch_rule",
+    "Dependencies",
+    "recording_dependencies",
+    "depends_on_file",
+    "depends_on_module",
+    "depends_on_env",
     "get_all_handlers",
     "TransdocHandler",
     "util",
@@ -17,13 +35,32 @@ __all__ = [
 
 import logging
 from io import StringIO
+from typing import IO, cast
 
 from . import util
 from .__consts import VERSION as __version__  # noqa: N811
-from .__rule import TransdocRule
+from .__dependencies import (
+    Dependencies,
+    depends_on_env,
+    depends_on_file,
+    depends_on_module,
+    recording_dependencies,
+)
+from .__disk_cache import DiskCache
+from .__hooks import TransdocHooks
+from .__memory import MemoryAllocator, MemoryStats, TransdocMemoryReport
+from .__profile import RuleStats, TransdocProfile
+from .__rule import (
+    TransdocRule,
+    batch_rule,
+    pure_rule,
+    thread_unsafe_rule,
+)
+from .__template import TransdocTemplate
 from .__transform_file import transform_file
 from .__transform_tree import transform_tree
 from .__transformer import TransdocTransformer
+from .__watch import WatchBuild, watch_tree
 from .handlers import PlaintextHandler, TransdocHandler, get_all_handlers
 
 log = logging.getLogger("transdoc")
@@ -65,7 +102,7 @@ def transform(
         )
 
     in_buf = StringIO(input)
-    out_buf = StringIO()
-    handler.transform_file(transformer, path, in_buf, out_buf)
-    out_buf.seek(0)
-    return out_buf.read()
+    out_buf = util.StringBuilder()
+    # `StringBuilder` is a text file, but isn't recognised as an `IO[str]`
+    handler.transform_file(transformer, path, in_buf, cast(IO[str], out_buf))
+    return out_buf.getvalue()
@@ -0,0 +1,84 @@
+"""# Transdoc / LRU
+
+A size-bounded least-recently-used cache.
+"""
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from threading import Lock
+from typing import Generic, NamedTuple, TypeVar
+
+T = TypeVar("T")
+
+
+class CacheInfo(NamedTuple):
+    """Statistics about a cache."""
+
+    hits: int
+    """Number of lookups which found a value"""
+    misses: int
+    """Number of lookups which didn't find a value"""
+    maxsize: int | None
+    """Maximum number of entries, or `None` if unbounded"""
+    currsize: int
+    """Current number of entries"""
+
+
+class LruCache(Generic[T]):
+    """A mapping which evicts its least-recently-used entries when full.
+
+    The cache is safe to use from multiple threads.
+    """
+
+    def __init__(self, maxsize: int | None) -> None:
+        """Create an empty cache.
+
+        Parameters
+        ----------
+        maxsize : int | None
+            Maximum number of entries, or `None` for no limit.
+        """
+        self.__maxsize = maxsize
+        self.__entries: OrderedDict[Hashable, T] = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__lock = Lock()
+
+    def get(self, key: Hashable) -> T | None:
+        """Look up the given key, returning `None` if it isn't cached."""
+        with self.__lock:
+            try:
+                value = self.__entries[key]
+            except KeyError:
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__hits += 1
+            return value
+
+    def put(self, key: Hashable, value: T) -> None:
+        """Store a value, evicting the least-recently-used entry if full."""
+        if self.__maxsize == 0:
+            return
+        with self.__lock:
+            self.__entries[key] = value
+            self.__entries.move_to_end(key)
+            if (
+                self.__maxsize is not None
+                and len(self.__entries) > self.__maxsize
+            ):
+                self.__entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        with self.__lock:
+            self.__entries.clear()
+
+    def info(self) -> CacheInfo:
+        """Return statistics about the cache."""
+        return CacheInfo(
+            self.__hits,
+            self.__misses,
+            self.__maxsize,
+            len(self.__entries),
+        )
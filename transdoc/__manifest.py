@@ -0,0 +1,402 @@
+"""# Transdoc / Manifest
+
+A record of the inputs each output file was built from, so that unchanged
+files can be skipped when transforming a tree again.
+"""
+
+import json
+import logging
+import os
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+from functools import cache
+from importlib import metadata
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Any
+
+from transdoc.__consts import VERSION
+from transdoc.__dependencies import (
+    Dependencies,
+    dependency_keys,
+    fingerprint,
+    hash_file,
+)
+from transdoc.handlers.api import TransdocHandler
+
+log = logging.getLogger("transdoc.manifest")
+
+
+MANIFEST_NAME = ".transdoc-manifest.json"
+"""Name of the manifest file, within the output directory"""
+
+MANIFEST_VERSION = 2
+"""Version of the manifest format, increased whenever it changes"""
+
+COPY_HANDLER = "copy"
+"""Handler identity recorded for files which no handler matches"""
+
+
+@dataclass(frozen=True)
+class FileStamp:
+    """Identifying information about the contents of a file."""
+
+    size: int
+    """Size of the file, in bytes"""
+    mtime_ns: int
+    """Modification time of the file, in nanoseconds"""
+    sha256: str
+    """SHA-256 hash of the file's contents"""
+
+    @classmethod
+    def of(cls, path: Path) -> "FileStamp":
+        """Return the stamp of the given file."""
+        stat = path.stat()
+        return cls(stat.st_size, stat.st_mtime_ns, hash_file(path))
+
+    def matches(self, path: Path) -> bool:
+        """Return whether the given file still has the stamped contents.
+
+        The file is only hashed if its size is unchanged, but its
+        modification time differs.
+        """
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        if stat.st_size != self.size:
+            return False
+        if stat.st_mtime_ns == self.mtime_ns:
+            return True
+        return hash_file(path) == self.sha256
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    """Everything that the output of a single input file was built from."""
+
+    input: FileStamp
+    """Stamp of the input file"""
+    rules: str
+    """Hash of the rule file"""
+    handler: str
+    """Identity and version of the handler used to transform the file"""
+    output: FileStamp
+    """Stamp of the output file"""
+    dependencies: dict[str, str | None]
+    """
+    Fingerprint of each dependency recorded by rules while transforming the
+    file, by dependency key (see `dependency_keys`)
+    """
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "ManifestEntry":
+        """Load an entry from its JSON representation."""
+        return cls(
+            FileStamp(**data["input"]),
+            data["rules"],
+            data["handler"],
+            FileStamp(**data["output"]),
+            data["dependencies"],
+        )
+
+
+@cache
+def handler_class_identity(cls: type) -> str:
+    """Return a string identifying a handler class and its version.
+
+    The version is taken from the class's `__version__` attribute if it has
+    one, and otherwise from the distribution which provides its module.
+    """
+    version = getattr(cls, "__version__", None)
+    if version is None:
+        package = cls.__module__.split(".")[0]
+        if package == "transdoc":
+            version = VERSION
+        else:
+            distributions = metadata.packages_distributions().get(package)
+            try:
+                version = (
+                    metadata.version(distributions[0])
+                    if distributions
+                    else None
+                )
+            except metadata.PackageNotFoundError:
+                version = None
+    return f"{cls.__module__}.{cls.__qualname__}@{version}"
+
+
+def handler_identity(handler: TransdocHandler | None) -> str:
+    """Return a string identifying a handler and its version."""
+    if handler is None:
+        return COPY_HANDLER
+    return handler_class_identity(type(handler))
+
+
+class BuildManifest:
+    """Manifest of the files within an output directory.
+
+    Each entry is keyed by the path of the input file, relative to the root
+    of the input tree.
+    """
+
+    def __init__(self, output: Path, rules: str) -> None:
+        """Create an empty manifest for the given output directory.
+
+        Parameters
+        ----------
+        output : Path
+            Output directory, which the manifest is stored in.
+        rules : str
+            Hash of the rule file used for this build.
+        """
+        self.entries: dict[str, ManifestEntry] = {}
+        """Entry for each input file, by relative path"""
+        self.__output = output
+        self.__rules = rules
+        # Paths of outputs from a manifest whose entries couldn't be used
+        self.__previous: set[str] = set()
+        # Fingerprints of dependencies, which are only computed once, since
+        # many files may share a dependency
+        self.__fingerprints: dict[str, str | None] = {}
+
+    def __repr__(self) -> str:
+        return f"BuildManifest({str(self.__output)!r})"
+
+    @property
+    def path(self) -> Path:
+        """Path of the manifest file"""
+        return self.__output / MANIFEST_NAME
+
+    @classmethod
+    def load(cls, output: Path, rules: str) -> "BuildManifest | None":
+        """Load the manifest from the given output directory.
+
+        Returns `None` if the directory does not contain a manifest. If the
+        manifest can't be read, or was written by a different version of
+        Transdoc, an empty manifest is returned, so that every file is
+        rebuilt.
+        """
+        manifest = cls(output, rules)
+        try:
+            with open(manifest.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            log.warning(
+                f"Unable to read manifest {manifest.path}, so every file "
+                f"will be rebuilt",
+                exc_info=True,
+            )
+            return manifest
+        if not isinstance(data, dict):
+            log.warning(
+                f"Manifest {manifest.path} is malformed, so every file will "
+                f"be rebuilt",
+            )
+            return manifest
+        # Keep the paths of the outputs, so that stale outputs can still be
+        # removed if the entries can't be used
+        manifest.__previous = set(data.get("files", {}))
+        if (
+            data.get("version") != MANIFEST_VERSION
+            or data.get("transdoc") != VERSION
+        ):
+            log.info(
+                f"Manifest {manifest.path} was written by a different "
+                f"version of Transdoc, so every file will be rebuilt",
+            )
+            return manifest
+        try:
+            manifest.entries = {
+                name: ManifestEntry.from_json(entry)
+                for name, entry in data["files"].items()
+            }
+        except (KeyError, TypeError):
+            log.warning(
+                f"Manifest {manifest.path} is malformed, so every file will "
+                f"be rebuilt",
+                exc_info=True,
+            )
+        return manifest
+
+    def is_up_to_date(
+        self,
+        name: str,
+        input: Path,
+        output: Path,
+        handler: TransdocHandler | None,
+    ) -> bool:
+        """Return whether the output of an input file is up to date.
+
+        This is the case if the input file, rule file, handler and every
+        recorded dependency are the same as when the output was built, and the
+        output has not been changed since.
+        """
+        entry = self.entries.get(name)
+        return (
+            entry is not None
+            and entry.rules == self.__rules
+            and entry.handler == handler_identity(handler)
+            and entry.input.matches(input)
+            and entry.output.matches(output)
+            and all(
+                self.__fingerprint(key) == value
+                for key, value in entry.dependencies.items()
+            )
+        )
+
+    def reset_fingerprints(self) -> None:
+        """Forget the fingerprints of dependencies, so they are found again.
+
+        Fingerprints are only found once, so this should be called before
+        reusing the manifest for another build.
+        """
+        self.__fingerprints.clear()
+
+    def dependents(self, paths: set[str]) -> set[str]:
+        """Return the entries which depend on any of the given files.
+
+        Parameters
+        ----------
+        paths : set[str]
+            Absolute paths of files.
+
+        Returns
+        -------
+        set[str]
+            Relative paths of the input files whose entries depend on any of
+            the files.
+        """
+        keys = {f"file:{path}" for path in paths}
+        return {
+            name
+            for name, entry in self.entries.items()
+            if not keys.isdisjoint(entry.dependencies)
+        }
+
+    def dependency_files(self) -> set[str]:
+        """Return the absolute paths of every file which entries depend on."""
+        return {
+            key.removeprefix("file:")
+            for entry in self.entries.values()
+            for key in entry.dependencies
+            if key.startswith("file:")
+        }
+
+    def __fingerprint(self, key: str) -> str | None:
+        """Return the fingerprint of a dependency, computing it only once."""
+        if key not in self.__fingerprints:
+            self.__fingerprints[key] = fingerprint(key)
+        return self.__fingerprints[key]
+
+    def record(
+        self,
+        name: str,
+        input: FileStamp,
+        output: Path,
+        handler: TransdocHandler | None,
+        dependencies: Dependencies,
+    ) -> None:
+        """Record that an output file was built from the given input.
+
+        Parameters
+        ----------
+        name : str
+            Path of the input file, relative to the root of the input tree.
+        input : FileStamp
+            Stamp of the input file, taken before it was transformed.
+        output : Path
+            Output file, which must exist.
+        handler : TransdocHandler | None
+            Handler used to transform the file, or `None` if it was copied.
+        dependencies : Dependencies
+            Dependencies recorded while transforming the file.
+        """
+        self.entries[name] = ManifestEntry(
+            input,
+            self.__rules,
+            handler_identity(handler),
+            FileStamp.of(output),
+            {
+                key: self.__fingerprint(key)
+                for key in dependency_keys(dependencies)
+            },
+        )
+
+    def remove_stale(self, names: set[str]) -> list[str]:
+        """Remove entries whose input file no longer exists.
+
+        The output files of the removed entries are deleted, along with any
+        directories which are left empty.
+
+        Parameters
+        ----------
+        names : set[str]
+            Relative paths of every input file within the tree.
+
+        Returns
+        -------
+        list[str]
+            Relative paths of the removed entries.
+        """
+        stale = sorted((set(self.entries) | self.__previous) - names)
+        self.__previous.clear()
+        self.remove(stale)
+        return stale
+
+    def remove(self, names: Iterable[str]) -> None:
+        """Remove the entries of the given input files, and their outputs.
+
+        Directories which are left empty are also removed.
+
+        Parameters
+        ----------
+        names : Iterable[str]
+            Relative paths of the input files.
+        """
+        root = self.__output.resolve()
+        for name in names:
+            self.entries.pop(name, None)
+            output = (root / name).resolve()
+            # Names come from the manifest file, which may have been edited
+            if output == root or not output.is_relative_to(root):
+                log.warning(
+                    f"Manifest entry {name!r} is outside the output "
+                    f"directory, so not removing it",
+                )
+                continue
+            log.info(f"Input of {output} was removed, so removing it")
+            output.unlink(missing_ok=True)
+            # Remove parent directories if they are now empty
+            parent = output.parent
+            while parent != root and parent.is_dir():
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+
+    def save(self) -> None:
+        """Write the manifest to the output directory."""
+        data = {
+            "version": MANIFEST_VERSION,
+            "transdoc": VERSION,
+            "files": {
+                name: asdict(entry)
+                for name, entry in sorted(self.entries.items())
+            },
+        }
+        # Write to a temporary file then move it, so that an interrupted
+        # write never leaves a corrupted manifest
+        self.__output.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(
+            "w",
+            encoding="utf-8",
+            dir=self.__output,
+            prefix=MANIFEST_NAME,
+            delete=False,
+        ) as f:
+            json.dump(data, f, indent=1)
+        os.replace(f.name, self.path)
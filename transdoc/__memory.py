@@ -0,0 +1,302 @@
+"""# Transdoc / Memory
+
+Accounting of the memory allocated while transforming each file, and while
+evaluating each rule, using `tracemalloc`.
+"""
+
+import threading
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Self
+
+from typing_extensions import override
+
+from transdoc.__hooks import TransdocHooks
+
+if TYPE_CHECKING:
+    from transdoc.handlers.api import TransdocHandler
+
+
+@dataclass
+class MemoryStats:
+    """Statistics about the memory allocated by a file or rule."""
+
+    count: int = 0
+    """Number of times the file was transformed, or the rule was evaluated"""
+    peak: int = 0
+    """Largest peak of memory allocated during one measurement, in bytes"""
+    retained: int = 0
+    """
+    Total memory which was allocated during each measurement, and was still
+    allocated at its end, in bytes. For rules, this is generally the size of
+    their outputs.
+    """
+
+    def add(self, peak: int, retained: int) -> None:
+        """Add a measurement to the statistics."""
+        self.count += 1
+        self.peak = max(self.peak, peak)
+        self.retained += retained
+
+
+@dataclass(frozen=True)
+class MemoryAllocator:
+    """A source location which allocated memory."""
+
+    location: str
+    """Source location, as `file:line`"""
+    size: int
+    """Memory allocated at the location, in bytes"""
+    count: int
+    """Number of allocated blocks of memory"""
+
+
+class _Measurement:
+    """In-progress measurements for a single thread."""
+
+    def __init__(self) -> None:
+        self.file: str | None = None
+        self.file_start = 0
+        self.file_peak = 0
+        self.rule: str | None = None
+        self.rule_start = 0
+
+
+class TransdocMemoryReport(TransdocHooks):
+    """Memory usage of each file and rule, measured using `tracemalloc`.
+
+    Pass a memory report to the `TransdocTransformer` constructor as its
+    `hooks`, then transform files within a `with` block, during which memory
+    allocations are traced. Memory is measured from when a handler is chosen
+    for a file until the file is finished, and from when each rule starts
+    being evaluated until it has been evaluated.
+
+    `tracemalloc` traces every thread at once, so measurements are only
+    accurate when files and rules are processed one at a time. Tracing also
+    significantly slows down execution.
+
+    ```py
+    report = TransdocMemoryReport()
+    transformer = TransdocTransformer.from_file("rules.py", hooks=report)
+    with report:
+        transform_tree(get_all_handlers(), transformer, input, output)
+    print(report.report())
+    ```
+    """
+
+    def __init__(self, top: int = 10, frames: int = 1) -> None:
+        """Create an empty memory report.
+
+        Parameters
+        ----------
+        top : int, optional = 10
+            Number of top allocators to record.
+        frames : int, optional = 1
+            Number of stack frames to record for each allocation. If
+            `tracemalloc` is already tracing, its existing setting is used.
+        """
+        self.files: dict[str, MemoryStats] = {}
+        """Memory statistics for each file, by file path"""
+        self.rules: dict[str, MemoryStats] = {}
+        """Memory statistics for each rule, by rule name"""
+        self.top_allocators: list[MemoryAllocator] = []
+        """
+        Source locations which allocated the most memory which was still
+        allocated when tracing stopped, largest first
+        """
+        self.__top = top
+        self.__frames = frames
+        self.__started_tracing = False
+        self.__snapshot: tracemalloc.Snapshot | None = None
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def __repr__(self) -> str:
+        return (
+            f"TransdocMemoryReport({len(self.rules)} rules, "
+            f"{len(self.files)} files)"
+        )
+
+    def start(self) -> None:
+        """Start tracing memory allocations, if they are not being traced."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.__frames)
+            self.__started_tracing = True
+        self.__snapshot = tracemalloc.take_snapshot()
+
+    def stop(self) -> None:
+        """Record the top allocators, then stop tracing memory allocations.
+
+        Tracing is only stopped if it was started by `start`.
+        """
+        if self.__snapshot is not None:
+            # Exclude allocations made by the report itself
+            filters = [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+            stats = (
+                tracemalloc.take_snapshot()
+                .filter_traces(filters)
+                .compare_to(self.__snapshot.filter_traces(filters), "lineno")
+            )
+            self.top_allocators = [
+                MemoryAllocator(
+                    f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    stat.size_diff,
+                    stat.count_diff,
+                )
+                for stat in stats[: self.__top]
+                if stat.size_diff > 0
+            ]
+            self.__snapshot = None
+        if self.__started_tracing:
+            tracemalloc.stop()
+            self.__started_tracing = False
+
+    def __enter__(self) -> Self:
+        self.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.stop()
+
+    def __measurement(self) -> _Measurement:
+        """Return the in-progress measurements of the current thread."""
+        measurement: _Measurement | None = getattr(
+            self.__local,
+            "measurement",
+            None,
+        )
+        if measurement is None:
+            measurement = self.__local.measurement = _Measurement()
+        return measurement
+
+    @override
+    def handler_selected(self, path: str, handler: "TransdocHandler") -> None:
+        if not tracemalloc.is_tracing():
+            return
+        measurement = self.__measurement()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        measurement.file = path
+        measurement.file_start = current
+        measurement.file_peak = current
+
+    @override
+    def file_finished(
+        self,
+        path: str,
+        duration: float,
+        error: BaseException | None,
+    ) -> None:
+        measurement = self.__measurement()
+        if measurement.file != path or not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(measurement.file_peak, peak)
+        measurement.file = None
+        with self.__lock:
+            stats = self.files.get(path)
+            if stats is None:
+                stats = self.files[path] = MemoryStats()
+            stats.add(
+                peak - measurement.file_start,
+                max(0, current - measurement.file_start),
+            )
+
+    @override
+    def rule_started(self, name: str) -> None:
+        if not tracemalloc.is_tracing():
+            return
+        measurement = self.__measurement()
+        current, peak = tracemalloc.get_traced_memory()
+        # Keep the peak of the file, since it is about to be reset
+        measurement.file_peak = max(measurement.file_peak, peak)
+        tracemalloc.reset_peak()
+        measurement.rule = name
+        measurement.rule_start = current
+
+    @override
+    def rule_evaluated(
+        self,
+        name: str,
+        duration: float,
+        output: Any,
+        error: bool,
+    ) -> None:
+        measurement = self.__measurement()
+        # Only the first call of each batch is measured
+        if measurement.rule != name or not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        measurement.rule = None
+        with self.__lock:
+            stats = self.rules.get(name)
+            if stats is None:
+                stats = self.rules[name] = MemoryStats()
+            stats.add(
+                peak - measurement.rule_start,
+                max(0, current - measurement.rule_start),
+            )
+
+    def report(self, limit: int | None = None) -> str:
+        """Format the statistics as tables, with the largest peaks first.
+
+        Parameters
+        ----------
+        limit : int, optional
+            Maximum number of files and rules to include.
+
+        Returns
+        -------
+        str
+            Tables of file, rule and allocator statistics.
+        """
+        lines: list[str] = []
+        for kind, items in [("file", self.files), ("rule", self.rules)]:
+            rows = sorted(
+                items.items(),
+                key=lambda item: item[1].peak,
+                reverse=True,
+            )[:limit]
+            if not rows:
+                continue
+            width = max(max(len(name) for name, _ in rows), len(kind))
+            if lines:
+                lines.append("")
+            lines.append(
+                f"{kind:<{width}} {'count':>8} {'peak':>12} {'retained':>12}",
+            )
+            lines.extend(
+                f"{name:<{width}} {stats.count:>8} {stats.peak:>12} "
+                f"{stats.retained:>12}"
+                for name, stats in rows
+            )
+
+        if self.top_allocators:
+            width = max(
+                max(len(a.location) for a in self.top_allocators),
+                len("allocator"),
+            )
+            if lines:
+                lines.append("")
+            lines.append(f"{'allocator':<{width}} {'size':>12} {'blocks':>8}")
+            lines.extend(
+                f"{a.location:<{width}} {a.size:>12} {a.count:>8}"
+                for a in self.top_allocators
+            )
+
+        return "\n".join(lines)
+
+    def to_json(self) -> dict[str, Any]:
+        """Return the statistics in a form which can be serialized as JSON."""
+        return {
+            "files": {
+                path: asdict(stats) for path, stats in self.files.items()
+            },
+            "rules": {
+                name: asdict(stats) for name, stats in self.rules.items()
+            },
+            "top_allocators": [asdict(a) for a in self.top_allocators],
+        }
@@ -0,0 +1,209 @@
+"""# Transdoc / Profile
+
+Statistics about the time spent evaluating each rule, and transforming each
+file.
+"""
+
+from dataclasses import asdict, dataclass
+from threading import Lock
+from typing import Any
+
+from typing_extensions import override
+
+from transdoc.__hooks import TransdocHooks
+
+
+def utf8_size(text: str) -> int:
+    """Return the size of the given text in bytes, when encoded as UTF-8."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-8", "surrogatepass"))
+
+
+@dataclass
+class RuleStats:
+    """Statistics about the calls to a rule."""
+
+    calls: int = 0
+    """Number of calls to the rule, including those answered by a cache"""
+    total_time: float = 0.0
+    """Total wall time spent evaluating the rule, in seconds"""
+    max_time: float = 0.0
+    """Longest wall time spent evaluating one call to the rule, in seconds"""
+    output_size: int = 0
+    """
+    Total size of the output of the rule, in bytes when encoded as UTF-8.
+    Outputs which are iterables of chunks are counted as they are consumed.
+    """
+    errors: int = 0
+    """Number of calls to the rule which raised an error"""
+    cache_hits: int = 0
+    """Number of calls to the rule whose result was cached"""
+
+
+class TransdocProfile(TransdocHooks):
+    """Profiling statistics for a `TransdocTransformer`.
+
+    Pass a profile to the `TransdocTransformer` constructor to record the
+    statistics of every rule it evaluates. `transform_tree` also records the
+    time spent on each file.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty profile."""
+        self.rules: dict[str, RuleStats] = {}
+        """Statistics for each rule, by rule name"""
+        self.files: dict[str, float] = {}
+        """Total time spent on each file, by file path, in seconds"""
+        self.__lock = Lock()
+
+    def __repr__(self) -> str:
+        return (
+            f"TransdocProfile({len(self.rules)} rules, "
+            f"{len(self.files)} files)"
+        )
+
+    def record_rule(
+        self,
+        name: str,
+        duration: float,
+        output: Any = None,
+        *,
+        calls: int = 1,
+        error: bool = False,
+    ) -> None:
+        """Record the evaluation of a rule.
+
+        Parameters
+        ----------
+        name : str
+            Name of the rule.
+        duration : float
+            Wall time spent evaluating the rule, in seconds.
+        output : Any, optional
+            Output of the rule, used to record its size if it is a string.
+            The size of iterable outputs is recorded using
+            `record_output_chunk` as they are consumed.
+        calls : int, optional = 1
+            Number of calls that were evaluated (eg by a batch function).
+        error : bool, optional = False
+            Whether the evaluation raised an error.
+        """
+        with self.__lock:
+            stats = self.rules.get(name)
+            if stats is None:
+                stats = self.rules[name] = RuleStats()
+            stats.calls += calls
+            stats.total_time += duration
+            stats.max_time = max(stats.max_time, duration / calls)
+            if isinstance(output, str):
+                stats.output_size += utf8_size(output)
+            if error:
+                stats.errors += 1
+
+    def record_output_chunk(self, name: str, chunk: str) -> None:
+        """Record a chunk of the streamed output of a rule."""
+        size = utf8_size(chunk)
+        with self.__lock:
+            stats = self.rules.get(name)
+            if stats is None:
+                stats = self.rules[name] = RuleStats()
+            stats.output_size += size
+
+    def record_cache_hit(self, name: str) -> None:
+        """Record that the result of a call to a rule was cached."""
+        with self.__lock:
+            stats = self.rules.get(name)
+            if stats is None:
+                stats = self.rules[name] = RuleStats()
+            stats.cache_hits += 1
+
+    def record_file(self, path: str, duration: float) -> None:
+        """Record the time spent transforming a file."""
+        with self.__lock:
+            self.files[path] = self.files.get(path, 0.0) + duration
+
+    @override
+    def rule_evaluated(
+        self,
+        name: str,
+        duration: float,
+        output: Any,
+        error: bool,
+    ) -> None:
+        self.record_rule(name, duration, output, error=error)
+
+    @override
+    def rule_output_chunk(self, name: str, chunk: str) -> None:
+        self.record_output_chunk(name, chunk)
+
+    @override
+    def rule_cache_hit(self, name: str) -> None:
+        self.record_cache_hit(name)
+
+    @override
+    def file_finished(
+        self,
+        path: str,
+        duration: float,
+        error: BaseException | None,
+    ) -> None:
+        self.record_file(path, duration)
+
+    def report(self, limit: int | None = None) -> str:
+        """Format the statistics as tables, with the slowest items first.
+
+        Parameters
+        ----------
+        limit : int, optional
+            Maximum number of rules and files to include.
+
+        Returns
+        -------
+        str
+            Tables of rule and file statistics.
+        """
+        rules = sorted(
+            self.rules.items(),
+            key=lambda item: item[1].total_time,
+            reverse=True,
+        )[:limit]
+        files = sorted(
+            self.files.items(),
+            key=lambda item: item[1],
+            reverse=True,
+        )[:limit]
+
+        name_width = max((len(name) for name, _ in rules), default=0)
+        name_width = max(name_width, len("rule"))
+        lines = [
+            f"{'rule':<{name_width}} {'calls':>8} {'total (s)':>10} "
+            f"{'max (s)':>10} {'output (B)':>10} {'errors':>7} {'cached':>7}",
+        ]
+        lines.extend(
+            f"{name:<{name_width}} {stats.calls:>8} "
+            f"{stats.total_time:>10.4f} {stats.max_time:>10.4f} "
+            f"{stats.output_size:>10} {stats.errors:>7} "
+            f"{stats.cache_hits:>7}"
+            for name, stats in rules
+        )
+
+        if files:
+            path_width = max(max(len(path) for path, _ in files), len("file"))
+            lines.append("")
+            lines.append(f"{'file':<{path_width}} {'total (s)':>10}")
+            lines.extend(
+                f"{path:<{path_width}} {duration:>10.4f}"
+                for path, duration in files
+            )
+
+        return "\n".join(lines)
+
+    def to_json(self) -> dict[str, Any]:
+        """Return the statistics in a form which can be serialized as JSON."""
+        return {
+            "rules": {
+                name: asdict(stats) for name, stats in self.rules.items()
+            },
+            "files": dict(self.files),
+        }
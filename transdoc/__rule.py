@@ -1,11 +1,173 @@
 """# Transdoc / rule
 
-Type definition for Transdoc rules
+Type definition for Transdoc rules, and decorators for declaring their
+properties.
 """
-from collections.abc import Callable
 
-TransdocRule = Callable[..., str]
+from collections.abc import Awaitable, Callable, Iterable, Sequence
+from functools import wraps
+from typing import Any, TypeVar
+
+RuleOutput = str | Iterable[str]
+"""
+Output of a rule. This is either a string, or an iterable of strings (eg a
+generator), which is indented and written to the output as it is produced.
+"""
+
+TransdocRule = Callable[..., RuleOutput | Awaitable[RuleOutput]]
 """
 Rules are Python functions (potentially accepting arguments) which can be
 called within Transdoc input files.
+
+Rules can also be asynchronous functions (defined using `async def`), in which
+case `TransdocTransformer.transform_async` evaluates them concurrently.
+
+Rules which produce large outputs can return an iterable of chunks of text
+(eg by being a generator function), so that their output doesn't need to be
+held in memory all at once.
 """
+
+R = TypeVar("R", bound=Callable[..., Any])
+
+RuleArguments = tuple[tuple[Any, ...], dict[str, Any]]
+"""Positional and keyword arguments of a rule call"""
+
+BatchFunction = Callable[[Sequence[RuleArguments]], Sequence[RuleOutput]]
+"""
+Function which evaluates many calls to a rule at once, returning the output of
+each call in order.
+"""
+
+
+def set_rule_attribute(rule: R, attribute: str, value: Any) -> R:
+    """Set an attribute on a rule, wrapping it if that is not possible."""
+    try:
+        setattr(rule, attribute, value)
+    except (AttributeError, TypeError):
+        # Eg built-in functions or bound methods
+        original = rule
+
+        @wraps(original)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            return original(*args, **kwargs)
+
+        setattr(wrapper, attribute, value)
+        rule = wrapper  # type: ignore[assignment]
+    return rule
+
+
+def pure_rule(rule: R) -> R:
+    """Declare that the given rule is pure.
+
+    A pure rule always produces the same output given the same arguments, and
+    has no side effects. Transdoc caches the results of pure rules, so that
+    they are not evaluated repeatedly for identical rule calls.
+
+    ```py
+    from transdoc import pure_rule
+
+    @pure_rule
+    def shout(text: str) -> str:
+        return text.upper()
+    ```
+
+    Parameters
+    ----------
+    rule : TransdocRule
+        Rule to declare as pure.
+
+    Returns
+    -------
+    TransdocRule
+        The given rule.
+    """
+    return set_rule_attribute(rule, "__transdoc_pure__", True)
+
+
+def is_pure_rule(rule: Callable[..., Any]) -> bool:
+    """Return whether the given rule was declared as pure using `pure_rule`."""
+    return getattr(rule, "__transdoc_pure__", False) is True
+
+
+def thread_unsafe_rule(rule: R) -> R:
+    """Declare that the given rule is not thread-safe.
+
+    When a `TransdocTransformer` evaluates rule calls using a thread pool (see
+    its `max_workers` option), thread-unsafe rules are always evaluated on the
+    calling thread.
+
+    ```py
+    from transdoc import thread_unsafe_rule
+
+    @thread_unsafe_rule
+    def counter() -> str:
+        global count
+        count += 1
+        return str(count)
+    ```
+
+    Parameters
+    ----------
+    rule : TransdocRule
+        Rule to declare as thread-unsafe.
+
+    Returns
+    -------
+    TransdocRule
+        The given rule.
+    """
+    return set_rule_attribute(rule, "__transdoc_thread_safe__", False)
+
+
+def is_thread_safe_rule(rule: Callable[..., Any]) -> bool:
+    """Return whether the given rule was not declared as thread-unsafe."""
+    return getattr(rule, "__transdoc_thread_safe__", True) is not False
+
+
+def batch_rule(batch: BatchFunction) -> Callable[[R], R]:
+    """Declare a function which evaluates many calls to a rule at once.
+
+    When a rule is called multiple times within an input, the transformer
+    gives the arguments of every call to `batch`, rather than calling the
+    rule once for each of them. This allows expensive setup work to be shared
+    between calls. If `batch` raises an exception, the calls are evaluated
+    individually instead, so that errors are reported for the correct call.
+
+    Calls are batched within each input given to the transformer, such as
+    each call to `TransdocTransformer.transform`. Inputs which are streamed
+    (eg by `TransdocTransformer.transform_stream`, which is used to transform
+    files) are batched one chunk at a time, so calls in different chunks of a
+    large file are given to `batch` separately.
+
+    ```py
+    from transdoc import batch_rule
+
+    def shout_all(calls):
+        return [text.upper() for (text,), _ in calls]
+
+    @batch_rule(shout_all)
+    def shout(text: str) -> str:
+        return text.upper()
+    ```
+
+    Parameters
+    ----------
+    batch : (Sequence[tuple[tuple, dict]]) -> Sequence[str]
+        Function which accepts the positional and keyword arguments of each
+        call, and returns the output of each call in order.
+
+    Returns
+    -------
+    (TransdocRule) -> TransdocRule
+        Decorator which declares the batch function of a rule.
+    """
+
+    def decorator(rule: R) -> R:
+        return set_rule_attribute(rule, "__transdoc_batch__", batch)
+
+    return decorator
+
+
+def get_batch_function(rule: Callable[..., Any]) -> BatchFunction | None:
+    """Return the batch function declared for a rule using `batch_rule`."""
+    return getattr(rule, "__transdoc_batch__", None)
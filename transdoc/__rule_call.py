@@ -0,0 +1,178 @@
+"""# Transdoc / Rule call
+
+Parsing of rule calls into a reusable compiled form.
+"""
+
+import ast
+from dataclasses import dataclass
+from enum import Enum, auto
+from types import CodeType
+from typing import Any
+
+ARGS_COLLECTOR = "__transdoc_collect_args__"
+"""
+Name used in place of the rule when evaluating the arguments of a rule call
+"""
+
+
+def collect_args(*args: Any, **kwargs: Any) -> tuple[tuple, dict[str, Any]]:
+    """Return the given arguments, so that rule calls can be inspected."""
+    return args, kwargs
+
+
+class RuleCallKind(Enum):
+    """Syntax used by a rule call."""
+
+    NAME = auto()
+    """Name only, eg `{{rule}}`"""
+    BRACKET = auto()
+    """Square brackets, eg `{{rule[text]}}`"""
+    CALL = auto()
+    """Python function call, eg `{{rule('text')}}`"""
+    EXPRESSION = auto()
+    """
+    Python expression which starts with a function call, eg
+    `{{rule('a') + rule('b')}}`
+    """
+
+
+@dataclass(frozen=True)
+class RuleCall:
+    """A parsed rule call."""
+
+    name: str
+    """Name of the rule being called"""
+    kind: RuleCallKind
+    """Syntax used by the rule call"""
+    args: tuple[Any, ...] | None = ()
+    """
+    Positional arguments, or `None` if they are not literals and must be
+    evaluated using `code`.
+    """
+    kwargs: tuple[tuple[str, Any], ...] | None = ()
+    """
+    Keyword arguments, or `None` if they are not literals and must be
+    evaluated using `code`.
+    """
+    code: CodeType | None = None
+    """
+    Compiled code. For `CALL` rule calls, this evaluates to the arguments of
+    the call. For `EXPRESSION` rule calls, this evaluates to the result.
+    """
+
+    def arguments(
+        self,
+        namespace: dict[str, Any],
+    ) -> tuple[tuple, dict[str, Any]]:
+        """Evaluate the arguments of the rule call.
+
+        Parameters
+        ----------
+        namespace : dict[str, Any]
+            Namespace to evaluate non-literal arguments in. It must map
+            `ARGS_COLLECTOR` to `collect_args`.
+
+        Returns
+        -------
+        tuple[tuple, dict[str, Any]]
+            Positional and keyword arguments.
+        """
+        if self.args is None or self.kwargs is None:
+            assert self.code is not None
+            return eval(self.code, namespace)
+        return self.args, dict(self.kwargs)
+
+
+def literal_arguments(
+    call: ast.Call,
+) -> tuple[tuple[Any, ...], tuple[tuple[str, Any], ...]] | None:
+    """Evaluate the arguments of a call, if they are all hashable literals.
+
+    Otherwise, returns `None`. Unhashable literals (eg lists) are rejected, as
+    the same values are shared between every evaluation of the call.
+    """
+    try:
+        args = tuple(
+            ast.literal_eval(arg)
+            for arg in call.args
+            if not isinstance(arg, ast.Starred)
+        )
+        kwargs = tuple(
+            (kw.arg, ast.literal_eval(kw.value))
+            for kw in call.keywords
+            if kw.arg is not None
+        )
+    except (ValueError, TypeError):
+        return None
+    if len(args) != len(call.args) or len(kwargs) != len(call.keywords):
+        # Uses `*args` or `**kwargs`
+        return None
+    try:
+        hash((args, kwargs))
+    except TypeError:
+        return None
+    return args, kwargs
+
+
+def parse_python_call(name: str, call: str) -> RuleCall:
+    """Parse a rule call which uses Python syntax.
+
+    Raises
+    ------
+    SyntaxError
+        The rule call is not valid Python syntax.
+    """
+    tree = ast.parse(call, "<transdoc>", mode="eval")
+    body = tree.body
+    if not (
+        isinstance(body, ast.Call)
+        and isinstance(body.func, ast.Name)
+        and body.func.id == name
+    ):
+        return RuleCall(
+            name,
+            RuleCallKind.EXPRESSION,
+            None,
+            None,
+            compile(tree, "<transdoc>", "eval"),
+        )
+
+    if (literal := literal_arguments(body)) is not None:
+        args, kwargs = literal
+        return RuleCall(name, RuleCallKind.CALL, args, kwargs)
+
+    # Replace the rule with a function that returns its arguments
+    body.func = ast.copy_location(ast.Name(ARGS_COLLECTOR, ast.Load()), body)
+    return RuleCall(
+        name,
+        RuleCallKind.CALL,
+        None,
+        None,
+        compile(tree, "<transdoc>", "eval"),
+    )
+
+
+def parse_rule_call(call: str) -> RuleCall | None:
+    """Parse the given rule call, excluding its `{{` and `}}`.
+
+    Returns `None` if the rule call uses invalid syntax.
+
+    Raises
+    ------
+    SyntaxError
+        The rule call looks like a Python function call, but is not valid
+        Python syntax.
+    """
+    # If it's just a function name, evaluate it as a call with no arguments
+    if call.isidentifier():
+        return RuleCall(call, RuleCallKind.NAME)
+    # If it uses square brackets, then the contained string is the argument
+    name, _, content = call.partition("[")
+    if name.isidentifier() and call.endswith("]"):
+        # Remove final `]`
+        return RuleCall(name, RuleCallKind.BRACKET, (content[:-1],))
+    # Otherwise, it should be a regular function call
+    name = call.split("(", 1)[0]
+    if name.isidentifier() and call.endswith(")"):
+        return parse_python_call(name, call)
+    return None
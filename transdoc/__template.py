@@ -0,0 +1,208 @@
+"""# Transdoc / Template
+
+Inputs which have been scanned ahead of time, so that they can be rendered
+repeatedly.
+"""
+
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from transdoc.errors import (
+    TransdocSyntaxError,
+    TransdocTransformationError,
+    TransdocTransformExceptionGroup,
+)
+from transdoc.scanner import TokenKind, rule_call_contents, scan
+from transdoc.source_pos import LazySourceRange, SourceIndex, SourcePos
+
+if TYPE_CHECKING:
+    from transdoc.__transformer import CallResult, TransdocTransformer
+
+
+def unclosed_error(
+    filename: str,
+    position: LazySourceRange,
+) -> TransdocSyntaxError:
+    """Create an error for a rule call which is never closed."""
+    return TransdocSyntaxError(
+        filename,
+        position,
+        "Unclosed rule call. Did you forget a closing '}}'?",
+    )
+
+
+@dataclass(frozen=True)
+class TransdocTemplate:
+    """An input which has been compiled for repeated rendering.
+
+    Templates are created using `TransdocTransformer.compile`, and can be
+    rendered using any `TransdocTransformer`, without scanning the input
+    again.
+    """
+
+    filename: str
+    """Name of the file which the input belongs to, used in error reporting"""
+    literals: tuple[str, ...]
+    """
+    Literal text of the input. This has one more element than `calls`, such
+    that each rule call is between two literal segments.
+    """
+    calls: tuple[str, ...]
+    """Contents of each rule call, excluding their `{{` and `}}`"""
+    positions: tuple[LazySourceRange, ...]
+    """
+    Source range of each rule call. These are only resolved when first needed
+    if the template was compiled using `lazy_positions=True`.
+    """
+    unclosed: LazySourceRange | None
+    """Source range of an unclosed rule call, if the input contains one"""
+    end: SourcePos
+    """Source position of the end of the input"""
+
+    @staticmethod
+    def compile(
+        input: str,
+        filename: str,
+        # `SourcePos` is an immutable type, so is ok to have a default value
+        position_offset: SourcePos = SourcePos(1, 1),  # noqa: B008
+        *,
+        lazy_positions: bool = False,
+    ) -> "TransdocTemplate":
+        """Compile the given input into a template.
+
+        Parameters
+        ----------
+        input : str
+            Input string to compile.
+        filename : str
+            Name of file which the input string belongs to, used in error
+            reporting.
+        position_offset : SourcePos, optional
+            Source position to use when offsetting source positions in errors.
+        lazy_positions : bool, optional = False
+            Whether to only resolve the source positions of rule calls if they
+            are needed. This avoids indexing the lines of inputs which are
+            only rendered once, but the template keeps a reference to the
+            input until it is discarded.
+
+        Returns
+        -------
+        TransdocTemplate
+            Compiled template.
+        """
+        index = SourceIndex(input, position_offset)
+        make_range = index.lazy_range if lazy_positions else index.range
+        literals: list[str] = []
+        calls: list[str] = []
+        positions: list[LazySourceRange] = []
+        unclosed = None
+        # Start of the literal text which precedes the next rule call
+        literal_start = 0
+
+        for token in scan(input):
+            if token.kind is TokenKind.CALL:
+                literals.append(input[literal_start : token.start])
+                calls.append(rule_call_contents(input, token))
+                positions.append(make_range(token.start, token.end))
+                literal_start = token.end
+            elif token.kind is TokenKind.UNCLOSED:
+                # Unclosed rule calls are output as-is
+                unclosed = make_range(token.start, token.end)
+
+        literals.append(input[literal_start:])
+
+        return TransdocTemplate(
+            filename,
+            tuple(literals),
+            tuple(calls),
+            tuple(positions),
+            unclosed,
+            position_offset.offset_by_str(input),
+        )
+
+    def render(
+        self,
+        transformer: "TransdocTransformer",
+        indentation: str = "",
+    ) -> str:
+        r"""Render the template using the rules of the given transformer.
+
+        Parameters
+        ----------
+        transformer : TransdocTransformer
+            Transformer to evaluate rule calls with.
+        indentation : str, optional
+            String to use for indentation (eg `' ' * 4` for 4 spaces, or
+            `'\t'` for one tab).
+
+        Returns
+        -------
+        str
+            Resultant text.
+
+        Raises
+        ------
+        TransdocTransformExceptionGroup
+            Errors encountered during rendering.
+        """
+        errors: list[TransdocTransformationError] = []
+        parts: list[str] = []
+        self.render_into(transformer, indentation, parts.append, errors)
+        if len(errors):
+            raise TransdocTransformExceptionGroup(errors)
+        return "".join(parts)
+
+    def render_into(
+        self,
+        transformer: "TransdocTransformer",
+        indentation: str,
+        write: Callable[[str], Any],
+        errors: list[TransdocTransformationError],
+    ) -> None:
+        """Render the template, passing each segment of its output to `write`.
+
+        Rather than being raised, errors are added to `errors`. The output of
+        rule calls which failed is omitted.
+        """
+        self.write_results(
+            transformer._eval_calls(
+                list(zip(self.calls, self.positions, strict=True)),
+                self.filename,
+                indentation,
+            ),
+            write,
+            errors,
+        )
+
+    def write_results(
+        self,
+        results: Sequence["CallResult"],
+        write: Callable[[str], Any],
+        errors: list[TransdocTransformationError],
+    ) -> None:
+        """Write the template's literal text and the results of its rule calls.
+
+        Outputs which are iterators are written one chunk at a time. Errors
+        are added to `errors`.
+        """
+        literals = self.literals
+        if literals[0]:
+            write(literals[0])
+        for result, literal in zip(results, literals[1:], strict=True):
+            if isinstance(result, str):
+                if result:
+                    write(result)
+            elif isinstance(result, TransdocTransformationError):
+                errors.append(result)
+            else:
+                try:
+                    for chunk in result:
+                        write(chunk)
+                except TransdocTransformationError as e:
+                    errors.append(e)
+            if literal:
+                write(literal)
+
+        if self.unclosed is not None:
+            errors.append(unclosed_error(self.filename, self.unclosed))
@@ -5,6 +5,7 @@ Process a single file using transdoc.
 
 import logging
 from collections.abc import Sequence
+from time import perf_counter
 from typing import IO
 
 from transdoc.__transformer import TransdocTransformer
@@ -47,6 +48,29 @@ def transform_file(
     TransdocHandlerError
         No handlers that match input file
     """
+    hooks = transformer.hooks
+    if hooks is None:
+        transform_file_using(handlers, transformer, in_path, in_file, out_file)
+        return
+
+    start = perf_counter()
+    hooks.file_started(in_path)
+    try:
+        transform_file_using(handlers, transformer, in_path, in_file, out_file)
+    except BaseException as e:
+        hooks.file_finished(in_path, perf_counter() - start, e)
+        raise
+    hooks.file_finished(in_path, perf_counter() - start, None)
+
+
+def transform_file_using(
+    handlers: Sequence[TransdocHandler],
+    transformer: TransdocTransformer,
+    in_path: str,
+    in_file: IO,
+    out_file: IO | None,
+) -> None:
+    """Find a handler for the input file, and use it to transform the file."""
     handler = find_matching_handler(handlers, in_path)
     if handler is None:
         raise TransdocNoHandlerError(
@@ -56,6 +80,8 @@ def transform_file(
         )
 
     log.info(f"Handler {handler} can handle file {in_path}")
+    if transformer.hooks is not None:
+        transformer.hooks.handler_selected(in_path, handler)
     handler.transform_file(
         transformer,
         in_path,
@@ -5,14 +5,27 @@ Process an entire directory tree (or a single file) using transdoc.
 
 import logging
 import os
+import pickle
 import re
 import sys
-from collections.abc import Callable, Sequence
-from dataclasses import dataclass
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from io import StringIO
 from pathlib import Path
-from shutil import copyfile, rmtree
-from typing import IO, AnyStr, Literal
+from shutil import copyfile, copyfileobj, rmtree
+from time import perf_counter
+from typing import IO, AnyStr, Literal, cast
 
+from transdoc.__dependencies import (
+    Dependencies,
+    hash_file,
+    recording_dependencies,
+)
+from transdoc.__hooks import TransdocHooks
+from transdoc.__manifest import BuildManifest, FileStamp
 from transdoc.__transformer import TransdocTransformer
 from transdoc.errors import (
     TransdocOutputDirectoryNonEmptyError,
@@ -22,13 +35,30 @@ from transdoc.errors import (
 )
 from transdoc.handlers import find_matching_handler
 from transdoc.handlers.api import TransdocHandler
-from transdoc.util import file_is_binary
+from transdoc.util import (
+    StringBuilder,
+    file_is_binary,
+    file_may_contain_rule_calls,
+)
 
 log = logging.getLogger("transdoc.transform_tree")
 
 
 OutputFileType = Path | Literal["stdout", "devnull"]
 
+READ_AHEAD_MAX_SIZE = 1024 * 1024
+"""
+Size in bytes of the largest input file which is read ahead of time by I/O
+threads. Larger files are streamed from their input to their output, so that
+memory usage doesn't depend on the size of files.
+"""
+
+READ_AHEAD_BYTES = 16 * 1024 * 1024
+"""
+Maximum total size in bytes of the inputs which I/O threads read ahead of
+time, and of the outputs waiting to be written by them
+"""
+
 
 @dataclass
 class FileMapping:
@@ -88,6 +118,749 @@ def expand_tree(
     return file_mappings
 
 
+@dataclass
+class FileResult:
+    """Outcome of transforming a single file mapping"""
+
+    fast_path: bool
+    """
+    Whether the file matched a handler, but contained no rule calls, so was
+    copied without being transformed
+    """
+    read: bool
+    """Whether the input file was read"""
+    duration: float
+    """Wall time spent on the file, in seconds"""
+    errors: list[TransdocTransformationError] = field(default_factory=list)
+    """Errors which occurred while transforming the file"""
+    dependencies: Dependencies = field(default_factory=Dependencies)
+    """Dependencies recorded by rules while transforming the file"""
+
+
+@dataclass
+class PreparedFile:
+    """A file mapping whose I/O has been performed, ready to be transformed"""
+
+    mapping: FileMapping
+    """File mapping"""
+    handler: TransdocHandler | None
+    """
+    Handler to transform the file using, or `None` if no transformation is
+    needed
+    """
+    text: str | None
+    """Contents of the input file, if it was read to be transformed"""
+    stdout_text: str | None
+    """
+    Text to print to stdout, if the output is stdout and the file was not
+    transformed
+    """
+    fast_path: bool
+    """
+    Whether the file contained no rule calls, so was copied rather than
+    transformed
+    """
+    read: bool
+    """Whether the input file was read"""
+    duration: float
+    """Wall time spent preparing the file, in seconds"""
+
+
+def report_file_io(
+    hooks: TransdocHooks,
+    mapping: FileMapping,
+    read: bool,
+    written: int | None = None,
+) -> None:
+    """Report the sizes of the input and output files of a mapping.
+
+    If the number of bytes written is not given, it is found from the output
+    file.
+    """
+    if read:
+        hooks.bytes_read(str(mapping.input), mapping.input.stat().st_size)
+    if written is not None:
+        hooks.bytes_written(str(mapping.input), written)
+    elif isinstance(mapping.output, Path) and mapping.output.exists():
+        hooks.bytes_written(str(mapping.input), mapping.output.stat().st_size)
+
+
+def leaf_errors(
+    group: BaseExceptionGroup[TransdocTransformationError],
+) -> list[TransdocTransformationError]:
+    """Return the errors within a (possibly nested) exception group."""
+    errors: list[TransdocTransformationError] = []
+    for e in group.exceptions:
+        if isinstance(e, BaseExceptionGroup):
+            errors.extend(leaf_errors(e))
+        else:
+            errors.append(e)
+    return errors
+
+
+def copy_text_file(input: Path, output: Path) -> None:
+    """Copy a text file, translating its newlines like a transformed file."""
+    with open(input) as in_file, open(output, "w") as out_file:
+        copyfileobj(in_file, out_file)
+
+
+def prepare_mapping(
+    handlers: Sequence[TransdocHandler],
+    mapping: FileMapping,
+    read_input: bool = True,
+) -> PreparedFile:
+    """Perform the I/O for a file mapping which doesn't need transformation.
+
+    Files which don't match a handler are copied to their output as-is.
+    Files which contain no rule calls are copied as text, so that their
+    newlines are translated in the same way as if they had been transformed.
+    Other files are read, ready to be transformed.
+    Nothing is written to stdout, so this is safe to call from any thread.
+
+    Parameters
+    ----------
+    handlers : Sequence[TransdocHandler]
+        Handlers to consider using when transforming the file.
+    mapping : FileMapping
+        File mapping to prepare.
+    read_input : bool, optional = True
+        Whether to read the contents of files which need transformation.
+    """
+    start = perf_counter()
+    text: str | None = None
+    stdout_text: str | None = None
+    fast_path = False
+    # Whether the input file was read
+    read = True
+
+    # If we intend to output files, we should first create parent dirs
+    if isinstance(mapping.output, Path):
+        mapping.output.parent.mkdir(parents=True, exist_ok=True)
+
+    handler = find_matching_handler(handlers, str(mapping.input))
+    if handler is None:
+        # No handlers found, just copy file
+        if isinstance(mapping.output, Path):
+            act = "copying"
+            copyfile(mapping.input, mapping.output)
+        elif mapping.output == "stdout":
+            act = "printing"
+            # Only write plaintext files
+            if file_is_binary(mapping.input):
+                stdout_text = "[ binary file ]\n"
+            else:
+                with open(mapping.input) as f:
+                    stdout_text = f.read() + "\n"
+        else:
+            act = "skipping"
+            read = False
+        log.info(
+            f"No handlers found that match file {mapping.input}, {act}",
+        )
+    elif not file_may_contain_rule_calls(mapping.input):
+        # Handler found, but the file contains no rule calls, so there is
+        # no need to transform it
+        fast_path = True
+        handler = None
+        if isinstance(mapping.output, Path):
+            copy_text_file(mapping.input, mapping.output)
+        elif mapping.output == "stdout":
+            with open(mapping.input) as f:
+                stdout_text = f.read()
+        log.info(
+            f"File {mapping.input} contains no rule calls, so was not "
+            f"transformed",
+        )
+    elif read_input:
+        with open(mapping.input) as f:
+            text = f.read()
+
+    return PreparedFile(
+        mapping,
+        handler,
+        text,
+        stdout_text,
+        fast_path,
+        read,
+        perf_counter() - start,
+    )
+
+
+def transform_prepared(
+    transformer: TransdocTransformer,
+    prepared: PreparedFile,
+    show_filename: bool,
+) -> tuple[FileResult, str | None]:
+    """Transform a prepared file, printing any output to stdout.
+
+    This must be called in the same order as the files are given, so that
+    output to stdout is in a stable order.
+
+    Returns
+    -------
+    tuple[FileResult, str | None]
+        Result of the file, and the output to write to the output file, if
+        it was read ahead of time. Otherwise, the output is written as it is
+        produced.
+    """
+    start = perf_counter()
+    mapping = prepared.mapping
+    hooks = transformer.hooks
+    if hooks is not None:
+        hooks.file_started(str(mapping.input))
+    errors: list[TransdocTransformationError] = []
+    dependencies = Dependencies()
+
+    # Only show filenames if there are multiple input files
+    if mapping.output == "stdout" and show_filename:
+        print(f"\n\n### {mapping.input} ###", file=sys.stderr)
+
+    output: str | None = None
+    if prepared.stdout_text is not None:
+        sys.stdout.write(prepared.stdout_text)
+    elif prepared.handler is not None:
+        handler = prepared.handler
+        log.info(f"Using handler {handler} to process {mapping.input}")
+        if hooks is not None:
+            hooks.handler_selected(str(mapping.input), handler)
+        # Files which were read ahead of time have their output buffered, so
+        # that it can be written by an I/O thread. Other files are streamed
+        # directly from their input to their output.
+        if prepared.text is not None:
+            in_file: IO = StringIO(prepared.text)
+        else:
+            in_file = open(mapping.input)  # noqa: SIM115
+        if isinstance(mapping.output, Path):
+            out_file: IO | None = (
+                cast(IO, StringBuilder())
+                if prepared.text is not None
+                else open(mapping.output, "w")  # noqa: SIM115
+            )
+        elif mapping.output == "stdout":
+            out_file = sys.stdout
+        else:  # mapping.output == "devnull"
+            out_file = None
+
+        try:
+            with recording_dependencies() as dependencies:
+                handler.transform_file(
+                    transformer,
+                    str(mapping.input),
+                    in_file,
+                    out_file,
+                )
+        except* TransdocTransformationError as group:
+            msg = f"Error occurred while transforming {mapping.input}"
+            log.exception(msg)
+            for e in leaf_errors(group):
+                e.add_note(msg)
+                errors.append(e)
+        finally:
+            in_file.close()
+            if isinstance(mapping.output, Path) and out_file is not None:
+                out_file.close()
+        if isinstance(out_file, StringBuilder):
+            # Any partial output is still written, as it would be when writing
+            # directly to the output file
+            output = out_file.getvalue()
+
+    duration = prepared.duration + perf_counter() - start
+    if hooks is not None:
+        report_file_io(
+            hooks,
+            mapping,
+            prepared.read,
+            len(output.encode()) if output is not None else None,
+        )
+        hooks.file_finished(
+            str(mapping.input),
+            duration,
+            TransdocTransformExceptionGroup(errors) if errors else None,
+        )
+    result = FileResult(
+        prepared.fast_path,
+        prepared.read,
+        duration,
+        errors,
+        dependencies,
+    )
+    return result, output
+
+
+def write_output(path: Path, text: str) -> None:
+    """Write transformed output to a file."""
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def transform_mapping(
+    handlers: Sequence[TransdocHandler],
+    transformer: TransdocTransformer,
+    mapping: FileMapping,
+    show_filename: bool,
+) -> FileResult:
+    """Transform, copy or print a single file mapping on the calling thread.
+
+    The file is streamed from its input to its output. Errors which occur
+    during transformation are collected in the result, rather than being
+    raised.
+    """
+    prepared = prepare_mapping(handlers, mapping, read_input=False)
+    result, _ = transform_prepared(transformer, prepared, show_filename)
+    return result
+
+
+def transform_with_io_threads(
+    handlers: Sequence[TransdocHandler],
+    transformer: TransdocTransformer,
+    mappings: list[FileMapping],
+    io_threads: int,
+    show_filename: bool,
+) -> Iterator[FileResult]:
+    """Transform file mappings, performing their I/O on a pool of threads.
+
+    Inputs are read ahead of time, and files which don't need transformation
+    are copied, by the pool, while files are transformed one at a time on the
+    calling thread, in order. The transformed outputs are then written by the
+    pool. The number and total size of files waiting to be transformed or
+    written is limited, so that memory usage is bounded. Files larger than
+    `READ_AHEAD_MAX_SIZE` are streamed on the calling thread instead.
+    """
+    window = io_threads * 4
+    with ThreadPoolExecutor(
+        io_threads,
+        thread_name_prefix="transdoc-io",
+    ) as executor:
+        # Files being prepared, and the number of bytes read ahead for each
+        pending: deque[tuple[Future[PreparedFile], int]] = deque()
+        pending_bytes = 0
+        # Outputs being written, and their sizes
+        writes: deque[tuple[Future[None], int]] = deque()
+        write_bytes = 0
+        queued = iter(mappings)
+        # Mapping which didn't fit within the read-ahead limit
+        next_mapping: FileMapping | None = None
+
+        def fill() -> None:
+            nonlocal pending_bytes, next_mapping
+            while len(pending) < window:
+                mapping = next_mapping or next(queued, None)
+                next_mapping = None
+                if mapping is None:
+                    return
+                try:
+                    size = mapping.input.stat().st_size
+                except OSError:
+                    # Reported when the file is prepared
+                    size = 0
+                read_input = size <= READ_AHEAD_MAX_SIZE
+                if not read_input:
+                    size = 0
+                elif pending and pending_bytes + size > READ_AHEAD_BYTES:
+                    # Wait for earlier files to be transformed
+                    next_mapping = mapping
+                    return
+                pending_bytes += size
+                pending.append(
+                    (
+                        executor.submit(
+                            prepare_mapping,
+                            handlers,
+                            mapping,
+                            read_input,
+                        ),
+                        size,
+                    ),
+                )
+
+        fill()
+        while pending:
+            future, size = pending.popleft()
+            prepared = future.result()
+            pending_bytes -= size
+            fill()
+            result, output = transform_prepared(
+                transformer,
+                prepared,
+                show_filename,
+            )
+            if output is not None:
+                assert isinstance(prepared.mapping.output, Path)
+                writes.append(
+                    (
+                        executor.submit(
+                            write_output,
+                            prepared.mapping.output,
+                            output,
+                        ),
+                        len(output),
+                    ),
+                )
+                write_bytes += len(output)
+                del output
+                while writes and (
+                    len(writes) > window or write_bytes > READ_AHEAD_BYTES
+                ):
+                    write, written = writes.popleft()
+                    write.result()
+                    write_bytes -= written
+            yield result
+        # Raise any errors that occurred while writing
+        for write, _ in writes:
+            write.result()
+
+
+# State of each worker process, set by `init_worker`
+_worker_handlers: Sequence[TransdocHandler] = []
+_worker_transformer: TransdocTransformer | None = None
+
+
+def init_worker(
+    handlers: Sequence[TransdocHandler],
+    load_transformer: Callable[[], TransdocTransformer],
+) -> None:
+    """Set up a worker process, loading its rules once."""
+    global _worker_handlers, _worker_transformer
+    _worker_handlers = handlers
+    _worker_transformer = load_transformer()
+
+
+def transform_chunk(
+    chunk: list[tuple[FileMapping, bool]],
+) -> list[FileResult]:
+    """Transform a chunk of file mappings within a worker process."""
+    assert _worker_transformer is not None, "Worker was not initialized"
+    results = [
+        transform_mapping(
+            _worker_handlers,
+            _worker_transformer,
+            mapping,
+            show_filename,
+        )
+        for mapping, show_filename in chunk
+    ]
+    # Errors are sent back to the main process along with their causes, so
+    # drop any causes which can't be pickled
+    for result in results:
+        for e in result.errors:
+            try:
+                pickle.dumps(e.__cause__)
+            except Exception:
+                e.__cause__ = None
+    return results
+
+
+def transform_in_processes(
+    handlers: Sequence[TransdocHandler],
+    load_transformer: Callable[[], TransdocTransformer],
+    mappings: list[FileMapping],
+    jobs: int,
+    show_filename: bool,
+) -> Iterator[FileResult]:
+    """Transform file mappings using a pool of worker processes.
+
+    Mappings are sent to workers in chunks, and results are yielded in the
+    same order as the mappings, regardless of the order they complete in.
+    """
+    # Give each worker a few chunks, so that work is balanced between them
+    chunk_size = max(1, min(64, len(mappings) // (jobs * 4)))
+    chunks = [
+        [(m, show_filename) for m in mappings[i : i + chunk_size]]
+        for i in range(0, len(mappings), chunk_size)
+    ]
+    log.info(
+        f"Transforming {len(mappings)} files using {jobs} processes, in "
+        f"{len(chunks)} chunks",
+    )
+    with ProcessPoolExecutor(
+        jobs,
+        initializer=init_worker,
+        initargs=(handlers, load_transformer),
+    ) as executor:
+        for results in executor.map(transform_chunk, chunks):
+            yield from results
+
+
+def report_results(
+    hooks: TransdocHooks | None,
+    mappings: list[FileMapping],
+    results: Iterable[FileResult],
+) -> Iterator[FileResult]:
+    """Report file events for results produced by worker processes."""
+    for mapping, result in zip(mappings, results, strict=True):
+        if hooks is not None:
+            hooks.file_started(str(mapping.input))
+            report_file_io(hooks, mapping, result.read)
+            hooks.file_finished(
+                str(mapping.input),
+                result.duration,
+                (
+                    TransdocTransformExceptionGroup(result.errors)
+                    if result.errors
+                    else None
+                ),
+            )
+        yield result
+
+
+def transform_with_processes(
+    handlers: Sequence[TransdocHandler],
+    load_transformer: Callable[[], TransdocTransformer],
+    mappings: list[FileMapping],
+    jobs: int,
+    io_threads: int,
+    show_filename: bool,
+) -> Iterator[FileResult]:
+    """Transform file mappings using worker processes.
+
+    Files which don't need transformation are first copied using a pool of
+    threads (if `io_threads` is non-zero), so that only files which need
+    transformation are sent to the worker processes.
+    """
+    if io_threads:
+        with ThreadPoolExecutor(
+            io_threads,
+            thread_name_prefix="transdoc-io",
+        ) as executor:
+            prepared = list(
+                executor.map(
+                    partial(prepare_mapping, handlers, read_input=False),
+                    mappings,
+                ),
+            )
+    else:
+        prepared = [
+            prepare_mapping(handlers, m, read_input=False) for m in mappings
+        ]
+
+    to_transform = [p.mapping for p in prepared if p.handler is not None]
+    transformed = iter(
+        transform_in_processes(
+            handlers,
+            load_transformer,
+            to_transform,
+            max(1, min(jobs, len(to_transform))),
+            show_filename,
+        )
+        if to_transform
+        else [],
+    )
+    for p in prepared:
+        if p.handler is not None:
+            yield next(transformed)
+        else:
+            yield FileResult(p.fast_path, p.read, p.duration)
+
+
+def make_skip_callback(
+    skip_if: Callable[[Path], bool] | re.Pattern[AnyStr],
+) -> Callable[[Path], bool]:
+    """Return a function which determines whether to skip a file.
+
+    If `skip_if` is a regex, files whose paths match it are skipped.
+    """
+    if isinstance(skip_if, re.Pattern):
+        regex: re.Pattern = skip_if
+        return lambda p: regex.search(str(p)) is not None
+    return skip_if
+
+
+@dataclass
+class PendingEntry:
+    """A file which is being rebuilt, to be recorded in the build manifest"""
+
+    name: str
+    """Path of the input file, relative to the root of the input tree"""
+    input: FileStamp
+    """Stamp of the input file, taken before it was transformed"""
+    handler: TransdocHandler | None
+    """Handler used to transform the file, or `None` if it is copied"""
+
+
+def find_outdated(
+    handlers: Sequence[TransdocHandler],
+    manifest: BuildManifest,
+    input: Path,
+    mappings: list[FileMapping],
+) -> tuple[list[FileMapping], list[PendingEntry]]:
+    """Find the file mappings whose outputs are not up to date.
+
+    Returns
+    -------
+    tuple[list[FileMapping], list[PendingEntry]]
+        Mappings which need to be rebuilt, and the manifest entry to record
+        for each of them once they are rebuilt.
+    """
+    outdated: list[FileMapping] = []
+    pending: list[PendingEntry] = []
+    for mapping in mappings:
+        assert isinstance(mapping.output, Path)
+        name = mapping.input.relative_to(input).as_posix()
+        handler = find_matching_handler(handlers, str(mapping.input))
+        if manifest.is_up_to_date(
+            name,
+            mapping.input,
+            mapping.output,
+            handler,
+        ):
+            log.debug(f"Output of {mapping.input} is up to date")
+            continue
+        outdated.append(mapping)
+        pending.append(
+            PendingEntry(name, FileStamp.of(mapping.input), handler),
+        )
+    return outdated, pending
+
+
+def transform_mappings(
+    handlers: Sequence[TransdocHandler],
+    transformer: TransdocTransformer,
+    input: Path,
+    mappings: list[FileMapping],
+    *,
+    manifest: BuildManifest | None = None,
+    jobs: int = 1,
+    io_threads: int | None = None,
+    show_filename: bool = True,
+) -> list[TransdocTransformationError]:
+    """Transform the given file mappings from the tree at `input`.
+
+    If a build manifest is given, mappings whose outputs are up to date are
+    skipped, and the manifest is updated and saved once every file is
+    finished. See `transform_tree` for a description of the other options.
+
+    Returns
+    -------
+    list[TransdocTransformationError]
+        Errors that occurred while transforming the files, in the order of
+        the files they occurred in.
+    """
+    total = len(mappings)
+    pending: list[PendingEntry] = []
+    if manifest is not None:
+        # The manifest may be reused between builds, during which its
+        # dependencies may have changed
+        manifest.reset_fingerprints()
+        mappings, pending = find_outdated(handlers, manifest, input, mappings)
+        log.info(
+            f"{total - len(mappings)} of {total} files are up to date, and "
+            f"were not transformed",
+        )
+    if io_threads is None:
+        io_threads = min(32, (os.cpu_count() or 1) + 4)
+
+    load_transformer = transformer._loader()
+    if jobs > 1 and load_transformer is None:
+        log.warning(
+            "Transformer was not loaded from a rule file, so files will be "
+            "transformed in a single process",
+        )
+    results: Iterable[FileResult]
+    if (
+        jobs > 1
+        and load_transformer is not None
+        and len(mappings) > 1
+        and not any(m.output == "stdout" for m in mappings)
+    ):
+        results = report_results(
+            transformer.hooks,
+            mappings,
+            transform_with_processes(
+                handlers,
+                load_transformer,
+                mappings,
+                jobs,
+                io_threads,
+                show_filename,
+            ),
+        )
+    elif io_threads and len(mappings) > 1:
+        results = transform_with_io_threads(
+            handlers,
+            transformer,
+            mappings,
+            io_threads,
+            show_filename,
+        )
+    else:
+        results = (
+            transform_mapping(handlers, transformer, m, show_filename)
+            for m in mappings
+        )
+
+    errors: list[TransdocTransformationError] = []
+    # Number of files with no rule calls, which were copied without using a
+    # handler
+    fast_path_count = 0
+    # Dependencies of each file, or `None` if it failed to transform
+    built: list[Dependencies | None] = []
+    for result in results:
+        errors.extend(result.errors)
+        fast_path_count += result.fast_path
+        built.append(None if result.errors else result.dependencies)
+
+    if manifest is not None:
+        # Outputs may be written asynchronously, so they are only recorded
+        # once every file is finished
+        for mapping, entry, dependencies in zip(
+            mappings,
+            pending,
+            built,
+            strict=True,
+        ):
+            if dependencies is not None:
+                assert isinstance(mapping.output, Path)
+                manifest.record(
+                    entry.name,
+                    entry.input,
+                    mapping.output,
+                    entry.handler,
+                    dependencies,
+                )
+            else:
+                # Rebuild the file next time, since its output is incomplete
+                manifest.entries.pop(entry.name, None)
+        manifest.save()
+
+    log.info(
+        f"{fast_path_count} of {total} files contained no rule calls, and "
+        f"were not transformed",
+    )
+    return errors
+
+
+def open_manifest(
+    transformer: TransdocTransformer,
+    input: Path,
+    output: Path | None,
+) -> tuple[BuildManifest | None, bool]:
+    """Open the build manifest for an incremental build.
+
+    Returns
+    -------
+    tuple[BuildManifest | None, bool]
+        The manifest, or `None` if an incremental build is not possible, and
+        whether it was loaded from an existing output directory.
+    """
+    if output is None or output == Path("-") or not input.is_dir():
+        log.info(
+            "Incremental builds require an input and output directory, so "
+            "every file will be transformed",
+        )
+        return None, False
+    if transformer.rule_file is None:
+        log.warning(
+            "Transformer was not loaded from a rule file, so every file will "
+            "be transformed",
+        )
+        return None, False
+    rules = hash_file(transformer.rule_file)
+    manifest = BuildManifest.load(output, rules)
+    if manifest is None:
+        return BuildManifest(output, rules), False
+    return manifest, True
+
+
 def transform_tree(
     handlers: Sequence[TransdocHandler],
     transformer: TransdocTransformer,
@@ -96,6 +869,9 @@ def transform_tree(
     *,
     force: bool = False,
     skip_if: Callable[[Path], bool] | re.Pattern[AnyStr] = lambda _: False,
+    jobs: int = 1,
+    io_threads: int | None = None,
+    incremental: bool = False,
 ) -> None:
     """Transform all files within a tree.
 
@@ -123,27 +899,52 @@ def transform_tree(
     skip_if : Callable[[Path], bool], optional = lambda _: False
         A callback to determine whether a file should be excluded from
         transformation. For example, to skip files that are gitignored.
+    jobs : int, optional = 1
+        Number of processes to transform files in. If this is more than `1`,
+        each worker process loads the transformer's rule file again, so the
+        transformer must have been created using
+        `TransdocTransformer.from_file`, and the handlers must be picklable.
+        Files are otherwise transformed one at a time in the calling process,
+        which is also the case when writing to stdout. When using multiple
+        processes, file events are reported to the transformer's hooks once
+        each file is finished, and rule events are not reported.
+    io_threads : int, optional
+        Number of threads to read, copy and write files in, while files are
+        transformed on the calling thread (or in worker processes). Defaults
+        to a number based on the number of CPUs. If this is `0`, all I/O is
+        performed on the calling thread. Output to stdout is always in the
+        same order as the input files.
+    incremental : bool, optional = False
+        Whether to only transform files which changed since the output
+        directory was last built. A manifest of the inputs each output was
+        built from, including the files, modules and environment variables
+        which rules declared that they depend on, is stored in the output
+        directory, and outputs whose inputs no longer exist are removed. If
+        the output directory contains a manifest, it is updated in-place,
+        even if `force` is not given. Only supported when the input and
+        output are both directories, and the transformer was created using
+        `TransdocTransformer.from_file`.
 
     Raises
     ------
     FileExistsError
         If output exists as a file or non-empty directory, and the `force`
         option was not set.
-    ExceptionGroup
-        Any exceptions that occurred while transforming the files.
+    TransdocTransformExceptionGroup
+        Errors that occurred while transforming the files, in the order of
+        the files they occurred in.
     """
     file_mappings = expand_tree(input, output)
-    # If skip_if is a regex, turn it into a function
-    if isinstance(skip_if, re.Pattern):
+    skip_callback = make_skip_callback(skip_if)
 
-        def make_regex_matcher(regex: re.Pattern):
-            return lambda p: regex.search(str(p)) is not None
+    manifest: BuildManifest | None = None
+    resuming = False
+    if incremental:
+        manifest, resuming = open_manifest(transformer, input, output)
 
-        skip_callback = make_regex_matcher(skip_if)
-    else:
-        skip_callback = skip_if
-
-    if not force and output is not None and output.exists():
+    if resuming:
+        log.info(f"Updating output dir {output} incrementally")
+    elif not force and output is not None and output.exists():
         if output.is_dir():
             if len(os.listdir(output)):
                 raise TransdocOutputDirectoryNonEmptyError(output)
@@ -155,73 +956,29 @@ def transform_tree(
                 )
         else:
             raise TransdocOutputFileExistsError(output)
-
-    # Remove the output file/directory
-    if output is not None and output.is_dir() and force:
+    elif output is not None and output.is_dir() and force:
+        # Remove the output file/directory
         log.info(f"Removing output dir {output}")
         rmtree(output)
 
-    errors: list[TransdocTransformationError] = []
-
-    # TODO: Consider using threading to speed this process up
-    for mapping in file_mappings:
-        if skip_callback(mapping.input):
-            continue
-
-        # Only show filenames if there are multiple input files
-        if mapping.output == "stdout" and len(file_mappings) > 1:
-            print(f"\n\n### {mapping.input} ###", file=sys.stderr)
-
-        # If we intend to output files, we should first create parent dirs
-        if isinstance(mapping.output, Path):
-            mapping.output.parent.mkdir(parents=True, exist_ok=True)
-
-        handler = find_matching_handler(handlers, str(mapping.input))
-        if handler is None:
-            # No handlers found, just copy file
-            if isinstance(mapping.output, Path):
-                act = "copying"
-                copyfile(mapping.input, mapping.output)
-            elif mapping.output == "stdout":
-                act = "printing"
-                # Only write plaintext files
-                if file_is_binary(mapping.input):
-                    print("[ binary file ]")
-                else:
-                    with open(mapping.input) as f:
-                        print(f.read())
-            else:
-                act = "skipping"
-            log.info(
-                f"No handlers found that match file {mapping.input}, {act}",
-            )
-        else:
-            # Handler found
-            log.info(f"Using handler {handler} to process {mapping.input}")
-            # Now open files
-            in_file = open(mapping.input)  # noqa: SIM115
-            if isinstance(mapping.output, Path):
-                out_file: IO | None = (
-                    open(mapping.output, "w") if mapping.output else None  # noqa: SIM115
-                )
-            elif mapping.output == "stdout":
-                out_file = sys.stdout
-            else:  # mapping.output == "devnull"
-                out_file = None
-
-            # And perform the transformation
-            try:
-                handler.transform_file(
-                    transformer,
-                    str(mapping.input),
-                    in_file,
-                    out_file,
-                )
-            except TransdocTransformationError as e:
-                msg = f"Error occurred while transforming {mapping.input}"
-                log.exception(msg)
-                e.add_note(msg)
-                errors.append(e)
+    mappings = [m for m in file_mappings if not skip_callback(m.input)]
+    # Only show filenames if there are multiple input files
+    show_filename = len(file_mappings) > 1
+    if manifest is not None:
+        # Outputs of skipped files are kept, since their inputs still exist
+        manifest.remove_stale(
+            {m.input.relative_to(input).as_posix() for m in file_mappings},
+        )
+    errors = transform_mappings(
+        handlers,
+        transformer,
+        input,
+        mappings,
+        manifest=manifest,
+        jobs=jobs,
+        io_threads=io_threads,
+        show_filename=show_filename,
+    )
 
     if len(errors):
         raise TransdocTransformExceptionGroup(errors)
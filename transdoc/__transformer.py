@@ -3,29 +3,169 @@
 Code that transforms input strings given a set of rules.
 """
 
+import asyncio
+import contextvars
 import importlib.util
-import re
+import inspect
+import logging
 import sys
-from io import StringIO
+from collections.abc import (
+    Awaitable,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Sequence,
+)
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any
+from time import perf_counter
+from typing import IO, Any, TypeVar, cast
 
-from transdoc.__rule import TransdocRule
+from transdoc.__dependencies import (
+    Dependencies,
+    record_dependencies,
+    recording_dependencies,
+)
+from transdoc.__disk_cache import DiskCache
+from transdoc.__hooks import TransdocHooks, combine_hooks
+from transdoc.__lru import CacheInfo, LruCache
+from transdoc.__profile import TransdocProfile
+from transdoc.__rule import (
+    RuleOutput,
+    TransdocRule,
+    get_batch_function,
+    is_pure_rule,
+    is_thread_safe_rule,
+)
+from transdoc.__rule_call import (
+    ARGS_COLLECTOR,
+    RuleCallKind,
+    collect_args,
+    parse_rule_call,
+)
+from transdoc.__template import TransdocTemplate
 from transdoc.errors import (
     TransdocEvaluationError,
     TransdocNameError,
+    TransdocNoRuleFileError,
     TransdocSyntaxError,
     TransdocTransformationError,
     TransdocTransformExceptionGroup,
 )
-from transdoc.source_pos import SourcePos, SourceRange
-from transdoc.util import indent_by
+from transdoc.scanner import (
+    RULE_CALL_CLOSE,
+    RULE_CALL_OPEN,
+    complete_prefix_length,
+)
+from transdoc.source_pos import LazySourceRange, SourcePos
+from transdoc.util import indent_by, indent_chunks
+
+T = TypeVar("T")
+
+CallResult = str | Iterator[str] | TransdocTransformationError
+"""
+Result of evaluating a rule call: its output, an iterator of chunks of its
+output, or the error it raised
+"""
+
+log = logging.getLogger("transdoc.transformer")
+
+
+def evaluation_error(
+    filename: str,
+    position: LazySourceRange,
+) -> TransdocEvaluationError:
+    """Create an error for a rule which failed during evaluation."""
+    return TransdocEvaluationError(
+        filename,
+        position,
+        "An error occurred while evaluating the rule",
+    )
+
+
+def indent_output(
+    indent: str,
+    output: RuleOutput,
+    filename: str,
+    position: LazySourceRange,
+) -> str | Iterator[str]:
+    """Indent the output of a rule.
+
+    Iterable outputs are indented lazily, as they are consumed. Errors raised
+    while doing so are reported as evaluation errors.
+    """
+    if isinstance(output, str):
+        return indent_by(indent, output)
+    return stream_output(
+        indent_chunks(indent, iter(output)),
+        filename,
+        position,
+    )
+
+
+def stream_output(
+    chunks: Iterator[str],
+    filename: str,
+    position: LazySourceRange,
+) -> Iterator[str]:
+    """Yield the given chunks of a rule's output, reporting any errors."""
+    try:
+        yield from chunks
+    except Exception as e:
+        raise evaluation_error(filename, position) from e
+
+
+def report_chunks(
+    hooks: TransdocHooks,
+    name: str,
+    chunks: Iterable[str],
+) -> Iterator[str]:
+    """Yield the chunks of a rule's output, reporting each to the hooks."""
+    for chunk in chunks:
+        hooks.rule_output_chunk(name, chunk)
+        yield chunk
+
+
+def run_awaitable(awaitable: Awaitable[T]) -> T:
+    """Run an awaitable to completion from synchronous code.
+
+    Raises
+    ------
+    RuntimeError
+        This was called from within a running event loop.
+    """
+
+    async def wrapper() -> T:
+        return await awaitable
+
+    coroutine = wrapper()
+    try:
+        return asyncio.run(coroutine)
+    except RuntimeError:
+        # If an event loop is already running, the coroutines were never
+        # started, so close them to avoid warnings
+        coroutine.close()
+        if inspect.iscoroutine(awaitable):
+            awaitable.close()
+        raise
 
 
 class TransdocTransformer:
     """Transdoc transformer, responsible for applying rules to given inputs."""
 
-    def __init__(self, rules: dict[str, TransdocRule]) -> None:
+    def __init__(
+        self,
+        rules: dict[str, TransdocRule],
+        *,
+        call_cache_size: int | None = 1024,
+        result_cache_size: int | None = 1024,
+        disk_cache: DiskCache | None = None,
+        max_workers: int = 1,
+        profile: TransdocProfile | None = None,
+        hooks: TransdocHooks | None = None,
+    ) -> None:
         """Create an instance of a TransdocTransformer with the given rule-set.
 
         Parameters
@@ -33,15 +173,82 @@ class TransdocTransformer:
         rules : dict[str, TransdocRule]
             Dictionary, mapping between rule names, and their corresponding
             functions.
+        call_cache_size : int | None, optional = 1024
+            Maximum number of distinct rule calls to keep in parsed form, so
+            that repeated rule calls don't need to be parsed again. `None`
+            means the cache is unbounded.
+        result_cache_size : int | None, optional = 1024
+            Maximum number of results of pure rules (those declared using
+            `pure_rule`) to cache. `None` means the cache is unbounded.
+        disk_cache : DiskCache, optional
+            Persistent cache to store the results of pure rules in, so that
+            they can be reused between runs.
+        max_workers : int, optional = 1
+            Maximum number of threads to use to evaluate the rule calls within
+            each input concurrently. If this is `1`, rule calls are evaluated
+            one at a time on the calling thread. Rules declared using
+            `thread_unsafe_rule` are always evaluated on the calling thread.
+        profile : TransdocProfile, optional
+            Profile to record statistics about each rule's evaluation in.
+        hooks : TransdocHooks, optional
+            Hooks to report events to, such as the evaluation of each rule.
 
         """
-        self.__rules = rules
+        # Copied, so that the rules can't change after the namespace below is
+        # created from them
+        self.__rules = dict(rules)
+        # Namespace used to evaluate Python rule calls. This is separate from
+        # the rules, so that `eval` doesn't add `__builtins__` to them.
+        self.__namespace: dict[str, Any] = {
+            **self.__rules,
+            ARGS_COLLECTOR: collect_args,
+        }
+        self.__parse_rule_call = lru_cache(maxsize=call_cache_size)(
+            parse_rule_call,
+        )
+        # Results of pure rules, and the dependencies they recorded
+        self.__results: LruCache[tuple[str, Dependencies | None]] = LruCache(
+            result_cache_size,
+        )
+        self.__disk_cache = disk_cache
+        self.__max_workers = max_workers
+        self.__profile = profile
+        # `None` when there are no hooks, so that events are not reported
+        self.__hooks = combine_hooks(profile, hooks)
+        # Created when first needed
+        self.__executor: ThreadPoolExecutor | None = None
+        # Set by `from_file`, so that the rules can be loaded again
+        self.__rule_file: Path | None = None
+        self.__options: dict[str, Any] = {}
 
     def __repr__(self) -> str:
         return f"TransdocTransformer({self.__rules})"
 
+    @property
+    def profile(self) -> TransdocProfile | None:
+        """Profile which statistics about rule evaluations are recorded in"""
+        return self.__profile
+
+    @property
+    def hooks(self) -> TransdocHooks | None:
+        """Hooks which events are reported to, including the profile"""
+        return self.__hooks
+
+    def close(self) -> None:
+        """Release resources held by the transformer, such as worker threads.
+
+        The transformer can still be used after it is closed.
+        """
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
     @classmethod
-    def from_file(cls, rule_file: Path) -> "TransdocTransformer":
+    def from_file(
+        cls,
+        rule_file: Path,
+        **options: Any,
+    ) -> "TransdocTransformer":
         """Create a TransdocTransformer by loading rules from a Python file.
 
         Items are considered to be rules if they are callable, and if they are
@@ -51,6 +258,8 @@ class TransdocTransformer:
         ----------
         rule_file : Path
             path to Python file to load from.
+        **options : Any
+            Options to pass to the `TransdocTransformer` constructor.
 
         Returns
         -------
@@ -65,7 +274,9 @@ class TransdocTransformer:
 
         # Add rule file's directory to the module search path, so that imports
         # work as-expected
-        sys.path.append(str(rule_file.parent.absolute()))
+        rule_dir = str(rule_file.parent.absolute())
+        if rule_dir not in sys.path:
+            sys.path.append(rule_dir)
         # Now begin the import
         spec = importlib.util.spec_from_file_location(module_name, rule_file)
         assert spec is not None, "Import spec for rule file was None"
@@ -85,10 +296,66 @@ class TransdocTransformer:
             )
             raise
 
-        return cls.from_namespace(module)
+        transformer = cls.from_namespace(module, **options)
+        transformer.__rule_file = rule_file
+        transformer.__options = options
+        return transformer
+
+    @property
+    def rule_file(self) -> Path | None:
+        """Rule file the transformer was loaded from, if any"""
+        return self.__rule_file
+
+    def reload(self) -> "TransdocTransformer":
+        """Load the rule file again, creating a new transformer from it.
+
+        The new transformer uses the same options, including the same profile,
+        hooks and disk cache. Modules imported by the rule file are not
+        reloaded.
+
+        Returns
+        -------
+        TransdocTransformer
+            Transformer with the current rules from the rule file.
+
+        Raises
+        ------
+        TransdocNoRuleFileError
+            The transformer was not created using `from_file`.
+        """
+        if self.__rule_file is None:
+            raise TransdocNoRuleFileError()
+        return TransdocTransformer.from_file(
+            self.__rule_file,
+            **self.__options,
+        )
+
+    def _loader(self) -> Callable[[], "TransdocTransformer"] | None:
+        """Return a picklable function which loads the rule file again.
+
+        The loaded transformer uses the same options, except that it has no
+        profile or hooks, since they can't be shared between processes.
+        Returns `None` if the transformer wasn't loaded from a rule file.
+        """
+        if self.__rule_file is None:
+            return None
+        options = {
+            name: value
+            for name, value in self.__options.items()
+            if name not in ("profile", "hooks")
+        }
+        return partial(
+            TransdocTransformer.from_file,
+            self.__rule_file.absolute(),
+            **options,
+        )
 
     @classmethod
-    def from_namespace(cls, namespace: Any) -> "TransdocTransformer":
+    def from_namespace(
+        cls,
+        namespace: Any,
+        **options: Any,
+    ) -> "TransdocTransformer":
         """Create a `TransdocTransformer` from attributes on a namespace.
 
         A namespace can be any object, including modules.
@@ -102,6 +369,8 @@ class TransdocTransformer:
         namespace : Any
             Namespace to collect rules from. This can be a Python module, or
             any other object.
+        **options : Any
+            Options to pass to the `TransdocTransformer` constructor.
 
         Returns
         -------
@@ -117,18 +386,58 @@ class TransdocTransformer:
             if callable(item):
                 collected_rules[attr_name] = item
 
-        return TransdocTransformer(collected_rules)
+        return TransdocTransformer(collected_rules, **options)
 
     def _eval_rule(
         self,
         rule: str,
         filename: str,
-        position: SourceRange,
+        position: LazySourceRange,
         indent: str,
-    ) -> str:
+    ) -> str | Iterator[str]:
         """Execute a command, alongside the given set of rules.
 
-        Returns the output of the given command.
+        Returns the output of the given command, or an iterator of chunks of
+        it. Asynchronous rules are run to completion in a new event loop.
+        """
+        output = self.__begin_rule(rule, filename, position)
+        try:
+            if inspect.isawaitable(output):
+                output = run_awaitable(output)
+            return indent_output(indent, output, filename, position)
+        except Exception as e:
+            raise evaluation_error(filename, position) from e
+
+    async def _eval_rule_async(
+        self,
+        rule: str,
+        filename: str,
+        position: LazySourceRange,
+        indent: str,
+    ) -> str | Iterator[str]:
+        """Execute a command, alongside the given set of rules.
+
+        Returns the output of the given command, or an iterator of chunks of
+        it, awaiting it if the rule is asynchronous.
+        """
+        output = self.__begin_rule(rule, filename, position)
+        try:
+            if inspect.isawaitable(output):
+                output = await output
+            return indent_output(indent, output, filename, position)
+        except Exception as e:
+            raise evaluation_error(filename, position) from e
+
+    def __begin_rule(
+        self,
+        rule: str,
+        filename: str,
+        position: LazySourceRange,
+    ) -> RuleOutput | Awaitable[RuleOutput]:
+        """Begin executing a command.
+
+        Returns the output of the command, or an awaitable that produces it if
+        the rule is asynchronous.
         """
 
         def name_error(name: str):
@@ -139,53 +448,260 @@ class TransdocTransformer:
                 f"Unrecognised rule name '{rule}'",
             )
 
-        def eval_error():
-            return TransdocEvaluationError(
+        try:
+            call = self.__parse_rule_call(rule)
+        except SyntaxError as e:
+            if rule.split("(", 1)[0] not in self.__rules:
+                raise name_error(rule) from None
+            raise evaluation_error(filename, position) from e
+
+        if call is None:
+            raise TransdocSyntaxError(
                 filename,
                 position,
-                "An error occurred while evaluating the rule",
+                "unable to evaluate rule due to invalid syntax",
             )
 
-        # If it's just a function name, evaluate it as a call with no arguments
-        if rule.isidentifier():
-            if rule not in self.__rules:
-                raise name_error(rule)
-            try:
-                return indent_by(indent, self.__rules[rule]())
-            except Exception as e:
-                raise eval_error() from e
-        # If it uses square brackets, then extract the contained string, and
-        # pass that
-        if rule.split("[")[0].isidentifier() and rule.endswith("]"):
-            rule_name, content_str = rule.split("[", 1)
-            # Remove final `]`
-            content_str = content_str[:-1]
-            if rule_name not in self.__rules:
-                raise name_error(rule_name)
-            try:
-                return indent_by(indent, self.__rules[rule_name](content_str))
-            except Exception as e:
-                raise eval_error() from e
-        # Otherwise, it should be a regular function call
-        # This calls `eval` with the rules dictionary set as the globals, since
-        # otherwise it'd just be too complex to parse things.
-        if rule.split("(")[0].isidentifier() and rule.endswith(")"):
-            rule_name = rule.split("(", 1)[0]
-            if rule_name not in self.__rules:
-                raise name_error(rule_name)
-            try:
-                return indent_by(indent, eval(rule, self.__rules))
-            except Exception as e:
-                raise eval_error() from e
+        if call.name not in self.__rules:
+            raise name_error(call.name)
 
-        # If we reach this point, it's not valid data, and we should give an
-        # error
-        raise TransdocSyntaxError(
+        def evaluate() -> RuleOutput | Awaitable[RuleOutput]:
+            assert call is not None
+            if call.kind is RuleCallKind.EXPRESSION:
+                assert call.code is not None
+                return eval(call.code, self.__namespace)
+            args, kwargs = call.arguments(self.__namespace)
+            return self.__call_rule(call.name, args, kwargs)
+
+        return self.__report_evaluation(
+            call.name,
+            evaluate,
             filename,
             position,
-            "unable to evaluate rule due to invalid syntax",
         )
 
+    def __report_evaluation(
+        self,
+        name: str,
+        evaluate: Callable[[], RuleOutput | Awaitable[RuleOutput]],
+        filename: str,
+        position: LazySourceRange,
+    ) -> RuleOutput | Awaitable[RuleOutput]:
+        """Evaluate a call to a rule, reporting it to the hooks."""
+        hooks = self.__hooks
+        start = 0.0
+        if hooks is not None:
+            hooks.rule_started(name)
+            start = perf_counter()
+        try:
+            output = evaluate()
+        except Exception as e:
+            if hooks is not None:
+                hooks.rule_evaluated(
+                    name,
+                    perf_counter() - start,
+                    None,
+                    True,
+                )
+            raise evaluation_error(filename, position) from e
+
+        if hooks is not None:
+            if inspect.isawaitable(output):
+                return self.__report_when_done(name, start, output)
+            hooks.rule_evaluated(
+                name,
+                perf_counter() - start,
+                output,
+                False,
+            )
+            if not isinstance(output, str):
+                output = report_chunks(hooks, name, output)
+        return output
+
+    async def __report_when_done(
+        self,
+        name: str,
+        start: float,
+        output: Awaitable[RuleOutput],
+    ) -> RuleOutput:
+        """Await the output of an asynchronous rule, then report it."""
+        assert self.__hooks is not None
+        try:
+            result = await output
+        except Exception:
+            self.__hooks.rule_evaluated(
+                name,
+                perf_counter() - start,
+                None,
+                True,
+            )
+            raise
+        self.__hooks.rule_evaluated(
+            name,
+            perf_counter() - start,
+            result,
+            False,
+        )
+        if not isinstance(result, str):
+            result = report_chunks(self.__hooks, name, result)
+        return result
+
+    def __call_rule(
+        self,
+        name: str,
+        args: tuple,
+        kwargs: dict[str, Any],
+    ) -> RuleOutput | Awaitable[RuleOutput]:
+        """Call a rule, using the result cache if the rule is pure.
+
+        Only outputs which are strings are cached, along with the dependencies
+        the rule recorded, so that they are recorded again when the cached
+        output is used.
+        """
+        key, cached = self.__lookup_result(name, args, kwargs)
+        if cached is not None:
+            return cached
+        return self.__call_uncached(name, args, kwargs, key)
+
+    def __call_uncached(
+        self,
+        name: str,
+        args: tuple,
+        kwargs: dict[str, Any],
+        key: Hashable | None,
+    ) -> RuleOutput | Awaitable[RuleOutput]:
+        """Call a rule whose result isn't cached.
+
+        If `key` isn't `None`, the result is stored under it.
+        """
+        if key is None:
+            return self.__rules[name](*args, **kwargs)
+        with recording_dependencies() as dependencies:
+            output = self.__rules[name](*args, **kwargs)
+        if inspect.isawaitable(output):
+            return self.__store_result_when_done(
+                key,
+                name,
+                args,
+                kwargs,
+                output,
+                dependencies,
+            )
+        if isinstance(output, str):
+            self.__store_result(key, name, args, kwargs, output, dependencies)
+        return output
+
+    def __lookup_result(
+        self,
+        name: str,
+        args: tuple,
+        kwargs: dict[str, Any],
+    ) -> tuple[Hashable | None, str | None]:
+        """Look up the cached result of a rule call.
+
+        Returns the key to store the result under (or `None` if the result
+        cannot be cached), and the cached result (or `None` if there isn't
+        one).
+        """
+        if not is_pure_rule(self.__rules[name]):
+            return None, None
+
+        # Include the type of each argument, like `lru_cache(typed=True)`,
+        # since arguments such as `1`, `1.0` and `True` are equal, but may
+        # give different results
+        key = (
+            name,
+            tuple((type(arg), arg) for arg in args),
+            tuple(
+                (keyword, type(value), value)
+                for keyword, value in sorted(kwargs.items())
+            ),
+        )
+        try:
+            entry = self.__results.get(key)
+        except TypeError:
+            # Unhashable arguments, so results can't be cached
+            return None, None
+        cached: str | None = None
+        if entry is not None:
+            cached, dependencies = entry
+            if dependencies is not None:
+                record_dependencies(dependencies)
+        elif self.__disk_cache is not None:
+            stored = self.__disk_cache.get(name, args, kwargs)
+            if stored is not None:
+                cached, dependencies = stored
+                record_dependencies(dependencies)
+                self.__results.put(key, (cached, dependencies or None))
+
+        if cached is not None and self.__hooks is not None:
+            self.__hooks.rule_cache_hit(name)
+        return key, cached
+
+    def __store_result(
+        self,
+        key: Hashable,
+        name: str,
+        args: tuple,
+        kwargs: dict[str, Any],
+        output: str,
+        dependencies: Dependencies,
+    ) -> None:
+        """Store the result of a pure rule in the result caches.
+
+        The dependencies are stored alongside the result, so that they are
+        recorded again when the result is reused, and so that the disk cache
+        can ignore the result once they change.
+        """
+        self.__results.put(key, (output, dependencies or None))
+        if self.__disk_cache is not None:
+            self.__disk_cache.put(name, args, kwargs, output, dependencies)
+
+    async def __store_result_when_done(
+        self,
+        key: Hashable,
+        name: str,
+        args: tuple,
+        kwargs: dict[str, Any],
+        output: Awaitable[RuleOutput],
+        dependencies: Dependencies,
+    ) -> RuleOutput:
+        """Await the result of an asynchronous pure rule, then store it."""
+        with recording_dependencies() as awaited:
+            result = await output
+        dependencies.update(awaited)
+        if isinstance(result, str):
+            self.__store_result(
+                key,
+                name,
+                args,
+                kwargs,
+                result,
+                dependencies,
+            )
+        return result
+
+    def clear_result_cache(self) -> None:
+        """Remove every result from the cache of results of pure rules.
+
+        This should be called if anything which pure rules depend on changes.
+        Results in the disk cache are kept, but the fingerprints of their
+        dependencies are found again, so that outdated results are ignored.
+        """
+        self.__results.clear()
+        if self.__disk_cache is not None:
+            self.__disk_cache.reset_fingerprints()
+
+    def result_cache_info(self) -> CacheInfo:
+        """Return statistics about the cache of results of pure rules.
+
+        Returns
+        -------
+        CacheInfo
+            Hits, misses, maximum size and current size of the cache.
+        """
+        return self.__results.info()
+
     def transform(
         self,
         input: str,
@@ -214,72 +730,575 @@ class TransdocTransformer:
         str
             Resultant text.
         """
+        return TransdocTemplate.compile(
+            input,
+            filename,
+            position_offset,
+            lazy_positions=True,
+        ).render(self, indentation)
+
+    def compile(
+        self,
+        input: str,
+        filename: str,
+        # `SourcePos` is an immutable type, so is ok to have a default value
+        position_offset: SourcePos = SourcePos(1, 1),  # noqa: B008
+    ) -> TransdocTemplate:
+        """Compile the given input into a template, for repeated rendering.
+
+        The template stores the literal text, rule calls and source positions
+        of the input, so that rendering it only requires evaluating the rule
+        calls. It can be rendered using any `TransdocTransformer`. Source
+        positions are resolved while compiling, so the template doesn't keep
+        a reference to the input.
+
+        ```py
+        template = transformer.compile("Hello, {{name}}!", "<string>")
+        template.render(transformer)
+        ```
+
+        Parameters
+        ----------
+        input : str
+            Input string to compile.
+        filename : str
+            Name of file which the input string belongs to, used in error
+            reporting.
+        position_offset : SourcePos, optional
+            Source position to use when offsetting source positions in errors.
+
+        Returns
+        -------
+        TransdocTemplate
+            Compiled template.
+        """
+        return TransdocTemplate.compile(input, filename, position_offset)
+
+    def transform_into(
+        self,
+        input: str,
+        out_file: IO[str] | None,
+        filename: str,
+        # `SourcePos` is an immutable type, so is ok to have a default value
+        position_offset: SourcePos = SourcePos(1, 1),  # noqa: B008
+        indentation: str = "",
+    ) -> None:
+        r"""Apply the Transdoc rules to the given input, writing the result.
+
+        Literal text and the outputs of rule calls are written to `out_file`
+        directly, rather than being combined into one string first.
+
+        Unlike `transform`, output up to the point of any errors is still
+        written.
+
+        Parameters
+        ----------
+        input : str
+            Input string to transform
+        out_file : IO[str] | None
+            File to write output to, or `None` if no output should be produced.
+        filename : str
+            Name of file which the input string belongs to, used in error
+            reporting.
+        position_offset : SourcePos, optional
+            Source position to use when offsetting source positions in errors.
+        indentation : str, optional
+            String to use for indentation (eg `' ' * 4` for 4 spaces, or
+            `'\t'` for one tab).
+
+        Raises
+        ------
+        TransdocTransformExceptionGroup
+            Errors encountered during transformation.
+        """
         errors: list[TransdocTransformationError] = []
+        self.__transform_into(
+            input,
+            filename,
+            position_offset,
+            indentation,
+            out_file.write if out_file is not None else lambda _: None,
+            errors,
+        )
+        if len(errors):
+            raise TransdocTransformExceptionGroup(errors)
 
-        # Match rule calls
-        # \{\{  => opening '{{'
-        # .+?   => any characters, non-greedy to avoid matching the entire
-        #          input (including new-lines due to `re.DOTALL`)
-        # \}\}  => closing '}}'
-        rule_call_regex = re.compile(r"\{\{.+?\}\}", re.DOTALL)
+    def transform_stream(
+        self,
+        in_file: IO[str],
+        out_file: IO[str] | None,
+        filename: str,
+        # `SourcePos` is an immutable type, so is ok to have a default value
+        position_offset: SourcePos = SourcePos(1, 1),  # noqa: B008
+        indentation: str = "",
+        *,
+        chunk_size: int = 64 * 1024,
+    ) -> None:
+        r"""Apply the Transdoc rules to an input file, writing the result.
+
+        The input is read in chunks, and the output is written as each chunk is
+        transformed, so memory usage is bounded by the chunk size and the size
+        of the largest rule call, rather than the size of the input.
 
-        # Output buffer
-        output = StringIO()
+        Unlike `transform`, output up to the point of any errors is still
+        written. An unclosed rule call causes the remainder of the input to be
+        buffered until it is reported as an error.
 
-        # Position within input string, used for adding to output buffer
-        input_pos = 0
+        Parameters
+        ----------
+        in_file : IO[str]
+            File to read input from.
+        out_file : IO[str] | None
+            File to write output to, or `None` if no output should be produced.
+        filename : str
+            Name of input file, used in error reporting.
+        position_offset : SourcePos, optional
+            Source position to use when offsetting source positions in errors.
+        indentation : str, optional
+            String to use for indentation (eg `' ' * 4` for 4 spaces, or
+            `'\t'` for one tab).
+        chunk_size : int, optional = 64 KiB
+            Number of characters to read from the input at a time.
 
-        for match in rule_call_regex.finditer(input):
-            # Rule call, excluding leading '{{' and trailing '}}'
-            rule_call = match.group(0)[2:-2]
-            start = position_offset.offset_by_str(input[: match.start()])
-            end = position_offset.offset_by_str(input[: match.end()])
+        Raises
+        ------
+        TransdocTransformExceptionGroup
+            Errors encountered during transformation.
+        """
+        errors: list[TransdocTransformationError] = []
+        write: Callable[[str], Any] = (
+            out_file.write if out_file is not None else lambda _: None
+        )
 
-            # Add non-matched input to output
-            output.write(input[input_pos : match.start()])
-            input_pos = match.end()
+        # Text which has been read, but not yet transformed
+        pending = ""
+        # Chunks of a rule call which has not been closed yet. These are only
+        # joined once the call is closed, or the input ends, so that a long
+        # unclosed call isn't copied and scanned again for each chunk.
+        unclosed: list[str] = []
+        # Total length of the chunks in `unclosed`
+        unclosed_length = 0
 
-            try:
-                output.write(
-                    self._eval_rule(
-                        rule_call,
-                        filename,
-                        SourceRange(start, end),
-                        indentation,
-                    ),
+        while chunk := in_file.read(chunk_size):
+            close_from = 0
+            if unclosed:
+                # Only the new chunk, and the last character before it, can
+                # contain the '}}' which closes the call
+                if (unclosed[-1][-1] + chunk).find(RULE_CALL_CLOSE) == -1:
+                    unclosed.append(chunk)
+                    unclosed_length += len(chunk)
+                    continue
+                close_from = unclosed_length - 1
+                unclosed.append(chunk)
+                pending = "".join(unclosed)
+                unclosed = []
+            else:
+                pending += chunk
+            complete = complete_prefix_length(pending, close_from)
+            if complete:
+                position_offset = self.__transform_into(
+                    pending[:complete],
+                    filename,
+                    position_offset,
+                    indentation,
+                    write,
+                    errors,
                 )
-            except TransdocTransformationError as e:
-                errors.append(e)
-
-        # Finally, write remaining string
-        output.write(input[input_pos:])
-
-        # Check for un-closed instances of {{
-        # Derived from: https://stackoverflow.com/a/406408/6335363
-        # \{\{          => opening '{{'
-        # (?!\}\})      => fail when encountering a closing `}}`
-        # ((?!\}\}).)*  => repeatedly check for closing `}}` matching all chars
-        #                  until it is found
-        # $             => end of string
-        unclosed_regex = re.compile(
-            r"\{\{((?!\}\}).)*$",
-            re.DOTALL,
+                pending = pending[complete:]
+            # Remaining text is either a trailing '{', or starts with a '{{'
+            # which is unclosed. Once the call contains at least two
+            # characters, any later '}}' closes it.
+            if len(pending) >= len(RULE_CALL_OPEN) + 2:
+                unclosed = [pending]
+                unclosed_length = len(pending)
+                pending = ""
+
+        # Input is finished, so transform whatever remains
+        self.__transform_into(
+            "".join(unclosed) + pending,
+            filename,
+            position_offset,
+            indentation,
+            write,
+            errors,
         )
-        if unclosed := unclosed_regex.search(input):
-            unclosed_pos = position_offset.offset_by_str(
-                input[: unclosed.start()],
+
+        if len(errors):
+            raise TransdocTransformExceptionGroup(errors)
+
+    def __transform_into(
+        self,
+        input: str,
+        filename: str,
+        position_offset: SourcePos,
+        indentation: str,
+        write: Callable[[str], Any],
+        errors: list[TransdocTransformationError],
+    ) -> SourcePos:
+        """Transform the given input, passing the output to `write`.
+
+        Errors are added to `errors`. Returns the source position of the end of
+        the input.
+        """
+        template = TransdocTemplate.compile(
+            input,
+            filename,
+            position_offset,
+            lazy_positions=True,
+        )
+        template.render_into(self, indentation, write, errors)
+        return template.end
+
+    def _eval_calls(
+        self,
+        calls: list[tuple[str, LazySourceRange]],
+        filename: str,
+        indentation: str,
+    ) -> list[CallResult]:
+        """Evaluate the given rule calls.
+
+        Calls to rules which declare a batch function are evaluated together.
+
+        Returns the output of each rule call in order, or the error it raised.
+        """
+        batched = self.__eval_batches(calls, filename, indentation)
+        if batched:
+            remaining = [
+                (i, call) for i, call in enumerate(calls) if i not in batched
+            ]
+            results = self.__eval_calls_individually(
+                [call for _, call in remaining],
+                filename,
+                indentation,
+            )
+            batched.update(
+                (i, result)
+                for (i, _), result in zip(remaining, results, strict=True)
+            )
+            return [batched[i] for i in range(len(calls))]
+
+        return self.__eval_calls_individually(calls, filename, indentation)
+
+    def __eval_calls_individually(
+        self,
+        calls: list[tuple[str, LazySourceRange]],
+        filename: str,
+        indentation: str,
+    ) -> list[CallResult]:
+        """Evaluate each of the given rule calls.
+
+        If `max_workers` is greater than 1, thread-safe rules are evaluated
+        using a thread pool.
+        """
+        evaluate = self.__eval_rule_or_error
+
+        if self.__max_workers <= 1 or len(calls) <= 1:
+            return [
+                evaluate(rule, filename, position, indentation)
+                for rule, position in calls
+            ]
+
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(
+                self.__max_workers,
+                thread_name_prefix="transdoc",
+            )
+        # Each call is evaluated in a copy of the current context, so that
+        # dependencies are recorded by the calling thread's recording
+        futures = [
+            self.__executor.submit(
+                contextvars.copy_context().run,
+                evaluate,
+                rule,
+                filename,
+                position,
+                indentation,
             )
-            range = SourceRange(unclosed_pos, unclosed_pos + SourcePos(0, 2))
-            errors.append(
-                TransdocSyntaxError(
+            if self.__is_thread_safe_call(rule)
+            else None
+            for rule, position in calls
+        ]
+        return [
+            # Thread-unsafe rules are evaluated here instead
+            future.result()
+            if future is not None
+            else evaluate(rule, filename, position, indentation)
+            for future, (rule, position) in zip(futures, calls, strict=True)
+        ]
+
+    def __eval_batches(
+        self,
+        calls: list[tuple[str, LazySourceRange]],
+        filename: str,
+        indentation: str,
+    ) -> dict[int, CallResult]:
+        """Evaluate calls to rules which declare a batch function.
+
+        Calls are grouped by rule, and each rule's batch function is called
+        once for all its uncached calls. Only the given calls are batched, so
+        when an input is transformed in chunks (eg by `transform_stream`),
+        each chunk is batched separately. If a batch function fails, its calls
+        are evaluated individually.
+
+        Returns a mapping from the index of each evaluated call to its output.
+        Calls which are not evaluated (eg because they could not be parsed)
+        should be evaluated individually.
+        """
+        # Mapping from rule name to the index, arguments and cache key of each
+        # of its calls
+        groups: dict[
+            str,
+            list[tuple[int, tuple, dict[str, Any], Hashable | None]],
+        ] = {}
+        results: dict[int, CallResult] = {}
+
+        for i, (rule, _) in enumerate(calls):
+            try:
+                call = self.__parse_rule_call(rule)
+                if (
+                    call is None
+                    or call.kind is RuleCallKind.EXPRESSION
+                    or call.name not in self.__rules
+                    or get_batch_function(self.__rules[call.name]) is None
+                ):
+                    continue
+                args, kwargs = call.arguments(self.__namespace)
+            except Exception:
+                # Errors are reported when the call is evaluated individually
+                continue
+            key, cached = self.__lookup_result(call.name, args, kwargs)
+            if cached is not None:
+                if self.__hooks is not None:
+                    self.__hooks.rule_evaluated(call.name, 0.0, cached, False)
+                results[i] = self.__indent_or_error(
+                    cached,
                     filename,
-                    range,
-                    "Unclosed rule call. Did you forget a closing '}}'?",
-                ),
+                    calls[i][1],
+                    indentation,
+                )
+            else:
+                groups.setdefault(call.name, []).append((i, args, kwargs, key))
+
+        for name, group in groups.items():
+            batch = get_batch_function(self.__rules[name])
+            assert batch is not None
+            if self.__hooks is not None:
+                self.__hooks.rule_started(name)
+            start = perf_counter()
+            outputs: Sequence[RuleOutput] | None
+            try:
+                # Dependencies can't be attributed to individual calls, so
+                # every call depends on all of them
+                with recording_dependencies() as dependencies:
+                    outputs = batch(
+                        [(args, kwargs) for _, args, kwargs, _ in group],
+                    )
+            except Exception:
+                log.warning(
+                    f"Batch evaluation of rule '{name}' failed, evaluating "
+                    f"calls individually",
+                    exc_info=True,
+                )
+                outputs = None
+            if outputs is not None and len(outputs) != len(group):
+                log.warning(
+                    f"Batch function for rule '{name}' returned "
+                    f"{len(outputs)} outputs for {len(group)} calls, "
+                    f"evaluating calls individually",
+                )
+                outputs = None
+            if outputs is None:
+                if self.__hooks is not None:
+                    # The batch is reported as one failed evaluation
+                    self.__hooks.rule_evaluated(
+                        name,
+                        perf_counter() - start,
+                        None,
+                        True,
+                    )
+                # The arguments were already evaluated and looked up in the
+                # result cache, so they are reused rather than parsing and
+                # evaluating each call again
+                for i, args, kwargs, key in group:
+                    results[i] = self.__call_with_arguments_or_error(
+                        name,
+                        args,
+                        kwargs,
+                        key,
+                        filename,
+                        calls[i][1],
+                        indentation,
+                    )
+                continue
+            # Share the time of the batch between its calls
+            duration = (perf_counter() - start) / len(group)
+            for (i, args, kwargs, key), output in zip(
+                group,
+                outputs,
+                strict=True,
+            ):
+                if self.__hooks is not None:
+                    self.__hooks.rule_evaluated(name, duration, output, False)
+                    if not isinstance(output, str):
+                        output = report_chunks(self.__hooks, name, output)
+                if key is not None and isinstance(output, str):
+                    self.__store_result(
+                        key,
+                        name,
+                        args,
+                        kwargs,
+                        output,
+                        dependencies,
+                    )
+                results[i] = self.__indent_or_error(
+                    output,
+                    filename,
+                    calls[i][1],
+                    indentation,
+                )
+
+        return results
+
+    def __call_with_arguments_or_error(
+        self,
+        name: str,
+        args: tuple,
+        kwargs: dict[str, Any],
+        key: Hashable | None,
+        filename: str,
+        position: LazySourceRange,
+        indent: str,
+    ) -> CallResult:
+        """Call a rule, returning its output or the error it raised.
+
+        Unlike `_eval_rule`, the call has already been parsed, and its
+        arguments evaluated and looked up in the result cache, giving `key`.
+        """
+        try:
+            output = self.__report_evaluation(
+                name,
+                partial(self.__call_uncached, name, args, kwargs, key),
+                filename,
+                position,
             )
+            if inspect.isawaitable(output):
+                output = run_awaitable(output)
+        except TransdocTransformationError as e:
+            return e
+        except Exception as e:
+            error = evaluation_error(filename, position)
+            error.__cause__ = e
+            return error
+        return self.__indent_or_error(output, filename, position, indent)
+
+    @staticmethod
+    def __indent_or_error(
+        output: RuleOutput,
+        filename: str,
+        position: LazySourceRange,
+        indent: str,
+    ) -> CallResult:
+        """Indent the output of a rule, or return the error this causes."""
+        try:
+            return indent_output(indent, output, filename, position)
+        except Exception as e:
+            error = evaluation_error(filename, position)
+            error.__cause__ = e
+            return error
+
+    def __eval_rule_or_error(
+        self,
+        rule: str,
+        filename: str,
+        position: LazySourceRange,
+        indent: str,
+    ) -> CallResult:
+        """Execute a command, returning its output or the error it raised."""
+        try:
+            return self._eval_rule(rule, filename, position, indent)
+        except TransdocTransformationError as e:
+            return e
+
+    def __is_thread_safe_call(self, rule: str) -> bool:
+        """Return whether the given command can be evaluated on any thread.
+
+        Invalid commands are considered thread-unsafe, so that their errors are
+        reported from the calling thread.
+        """
+        try:
+            call = self.__parse_rule_call(rule)
+        except SyntaxError:
+            return False
+        if call is None or call.name not in self.__rules:
+            return False
+        return is_thread_safe_rule(self.__rules[call.name])
+
+    async def transform_async(
+        self,
+        input: str,
+        filename: str,
+        # `SourcePos` is an immutable type, so is ok to have a default value
+        position_offset: SourcePos = SourcePos(1, 1),  # noqa: B008
+        indentation: str = "",
+    ) -> str:
+        r"""Apply the Transdoc rules to the given input, returning the result.
+
+        All rule calls in the input are evaluated concurrently, so that
+        asynchronous rules (defined using `async def`) can wait on I/O at the
+        same time. Their results are then combined in the order of the input.
+
+        Parameters
+        ----------
+        input : str
+            Input string to transform
+        filename : str
+            Name of file which the input string belongs to, used in error
+            reporting.
+        position_offset : SourcePos, optional
+            Source position to use when offsetting source positions in errors.
+        indentation : str, optional
+            String to use for indentation (eg `' ' * 4` for 4 spaces, or
+            `'\t'` for one tab).
+
+        Returns
+        -------
+        str
+            Resultant text.
+        """
+        template = TransdocTemplate.compile(
+            input,
+            filename,
+            position_offset,
+            lazy_positions=True,
+        )
+        results = await asyncio.gather(
+            *(
+                self._eval_rule_async(rule, filename, position, indentation)
+                for rule, position in zip(
+                    template.calls,
+                    template.positions,
+                    strict=True,
+                )
+            ),
+            return_exceptions=True,
+        )
+
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(
+                result,
+                TransdocTransformationError,
+            ):
+                raise result
+
+        errors: list[TransdocTransformationError] = []
+        output: list[str] = []
+        template.write_results(
+            cast(list[CallResult], results),
+            output.append,
+            errors,
+        )
 
         if len(errors):
             raise TransdocTransformExceptionGroup(errors)
 
-        output.seek(0)
-        return output.read()
+        return "".join(output)
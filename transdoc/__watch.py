@@ -0,0 +1,404 @@
+"""# Transdoc / Watch
+
+Watch a tree for changes, transforming files as they change, while keeping
+the transformer and handlers loaded.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from time import perf_counter
+from typing import AnyStr, Self
+
+from typing_extensions import override
+
+from transdoc.__dependencies import hash_file
+from transdoc.__manifest import BuildManifest
+from transdoc.__transform_tree import (
+    FileMapping,
+    make_skip_callback,
+    transform_mappings,
+    transform_tree,
+)
+from transdoc.__transformer import TransdocTransformer
+from transdoc.errors import (
+    TransdocNoRuleFileError,
+    TransdocTransformationError,
+    TransdocTransformExceptionGroup,
+)
+from transdoc.handlers.api import TransdocHandler
+
+log = logging.getLogger("transdoc.watch")
+
+
+class FileWatcher(ABC):
+    """Watches files and directories for changes."""
+
+    @abstractmethod
+    def add(self, path: Path) -> None:
+        """Watch a file, or a directory and all of its descendants."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def changes(self, timeout: float | None = None) -> set[Path]:
+        """Wait for watched paths to change.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait, in seconds. By default, this waits until
+            something changes.
+
+        Returns
+        -------
+        set[Path]
+            Paths of files which were created, modified or removed. Paths of
+            directories are given if they were created or removed, or if
+            changes within them may have been missed, in which case all of
+            their contents should be considered changed. If nothing changed
+            before the timeout, this is empty.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def close(self) -> None:
+        """Stop watching for changes."""
+        raise NotImplementedError()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+
+def stat_key(path: Path) -> tuple[int, int] | None:
+    """Return the modification time and size of a file, if it exists."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class PollingWatcher(FileWatcher):
+    """Watches for changes by regularly scanning every watched file.
+
+    This works on every platform, but scanning large trees is slow.
+    """
+
+    def __init__(self, interval: float = 0.5) -> None:
+        """Create a watcher which isn't watching anything.
+
+        Parameters
+        ----------
+        interval : float, optional = 0.5
+            Time to wait between scans, in seconds.
+        """
+        self.__interval = interval
+        self.__roots: set[Path] = set()
+        self.__snapshot: dict[Path, tuple[int, int]] = {}
+
+    def __repr__(self) -> str:
+        return f"PollingWatcher({len(self.__roots)} paths)"
+
+    @staticmethod
+    def __scan_root(root: Path) -> dict[Path, tuple[int, int]]:
+        """Return the modification time and size of each file in a root."""
+        if not root.is_dir():
+            key = stat_key(root)
+            return {root: key} if key is not None else {}
+        snapshot: dict[Path, tuple[int, int]] = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = Path(dirpath, filename)
+                key = stat_key(path)
+                if key is not None:
+                    snapshot[path] = key
+        return snapshot
+
+    @override
+    def add(self, path: Path) -> None:
+        self.__roots.add(path)
+        self.__snapshot.update(self.__scan_root(path))
+
+    @override
+    def changes(self, timeout: float | None = None) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot: dict[Path, tuple[int, int]] = {}
+            for root in self.__roots:
+                snapshot.update(self.__scan_root(root))
+            changed = {
+                path
+                for path in snapshot.keys() | self.__snapshot.keys()
+                if snapshot.get(path) != self.__snapshot.get(path)
+            }
+            self.__snapshot = snapshot
+            if changed:
+                return changed
+            delay = self.__interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                delay = min(delay, remaining)
+            time.sleep(delay)
+
+    @override
+    def close(self) -> None:
+        self.__roots.clear()
+        self.__snapshot.clear()
+
+
+@dataclass
+class WatchBuild:
+    """Outcome of a build performed while watching a tree"""
+
+    files: int
+    """
+    Number of input files which were checked, and transformed if they
+    changed
+    """
+    duration: float
+    """Wall time taken by the build, in seconds"""
+    reloaded: bool = False
+    """Whether the rule file was reloaded before the build"""
+    errors: list[TransdocTransformationError] = field(default_factory=list)
+    """Errors which occurred while transforming files"""
+    error: Exception | None = None
+    """Error which prevented the build, such as an error in the rule file"""
+
+
+def watch_tree(
+    handlers: Sequence[TransdocHandler],
+    transformer: TransdocTransformer,
+    input: Path,
+    output: Path,
+    *,
+    force: bool = False,
+    skip_if: Callable[[Path], bool] | re.Pattern[AnyStr] = lambda _: False,
+    jobs: int = 1,
+    io_threads: int | None = None,
+    watcher: FileWatcher | None = None,
+    debounce: float = 0.05,
+    on_build: Callable[[WatchBuild], None] | None = None,
+    stop: threading.Event | None = None,
+) -> None:
+    """Transform a tree, then transform files again whenever they change.
+
+    The tree is first built incrementally (see `transform_tree`). Then, each
+    time files change, only the changed files, and files which depend on
+    them, are transformed again using the same transformer. If the rule file
+    changes, it is loaded again, and every file is checked. Errors are
+    reported to `on_build` rather than being raised.
+
+    Parameters
+    ----------
+    handlers : Sequence[TransdocHandler]
+        Handlers to consider using when transforming files.
+    transformer : TransdocTransformer
+        Transformer to use, which must have been created using
+        `TransdocTransformer.from_file`.
+    input : Path
+        Input directory to watch.
+    output : Path
+        Output directory.
+    force : bool, optional = False
+        Whether to remove the output directory before the first build, if it
+        was not created by an incremental build.
+    skip_if : Callable[[Path], bool], optional = lambda _: False
+        A callback (or regex) to determine whether a file should be excluded
+        from transformation.
+    jobs : int, optional = 1
+        Number of processes to transform files in when the whole tree is
+        checked. Changed files are always transformed in this process.
+    io_threads : int, optional
+        Number of threads to read, copy and write files in.
+    watcher : FileWatcher, optional
+        Watcher to use. Defaults to a `PollingWatcher`.
+    debounce : float, optional = 0.05
+        Time to wait for further changes before building, in seconds, so
+        that files which are written in several steps are only built once.
+    on_build : Callable[[WatchBuild], None], optional
+        Callback which is given the outcome of each build.
+    stop : threading.Event, optional
+        Event which stops watching once it is set. By default, this watches
+        forever.
+
+    Raises
+    ------
+    TransdocNoRuleFileError
+        The transformer was not created using `TransdocTransformer.from_file`.
+    """
+    rule_file = transformer.rule_file
+    if rule_file is None:
+        raise TransdocNoRuleFileError()
+    rule_file = rule_file.absolute()
+    root = input.absolute()
+    output_root = output.absolute()
+    skip_callback = make_skip_callback(skip_if)
+    owns_watcher = watcher is None
+    files_watcher = PollingWatcher() if watcher is None else watcher
+    # Paths of dependency files which are being watched
+    watched: set[str] = set()
+
+    def watch_dependencies(manifest: BuildManifest) -> None:
+        """Watch files which were included by rules."""
+        for path in manifest.dependency_files() - watched:
+            watched.add(path)
+            try:
+                files_watcher.add(Path(path))
+            except OSError:
+                log.warning(f"Unable to watch {path}", exc_info=True)
+
+    def report(build: WatchBuild) -> None:
+        if build.error is not None:
+            log.error("Build failed", exc_info=build.error)
+        log.info(
+            f"Checked {build.files} files in {build.duration * 1000:.1f} ms",
+        )
+        if on_build is not None:
+            on_build(build)
+
+    def build_all(reloaded: bool, force: bool = False) -> BuildManifest:
+        """Transform every file which changed."""
+        start = perf_counter()
+        errors: list[TransdocTransformationError] = []
+        try:
+            transform_tree(
+                handlers,
+                transformer,
+                input,
+                output,
+                force=force,
+                skip_if=skip_callback,
+                jobs=jobs,
+                io_threads=io_threads,
+                incremental=True,
+            )
+        except TransdocTransformExceptionGroup as e:
+            errors = [
+                error
+                for error in e.exceptions
+                if isinstance(error, TransdocTransformationError)
+            ]
+        manifest = BuildManifest.load(output, hash_file(rule_file))
+        assert manifest is not None, "Incremental build didn't write manifest"
+        watch_dependencies(manifest)
+        report(
+            WatchBuild(
+                len(manifest.entries) + len(errors),
+                perf_counter() - start,
+                reloaded,
+                errors,
+            ),
+        )
+        return manifest
+
+    def build_changed(manifest: BuildManifest, changed: set[Path]) -> None:
+        """Transform the files which are affected by the given changes."""
+        start = perf_counter()
+        names: set[str] = set()
+        paths: set[str] = set()
+        for path in changed:
+            if path.is_relative_to(output_root):
+                continue
+            paths.add(str(path))
+            if not path.is_relative_to(root):
+                continue
+            name = path.relative_to(root).as_posix()
+            if path.is_dir():
+                names.update(
+                    Path(dirpath, filename).relative_to(root).as_posix()
+                    for dirpath, _, filenames in os.walk(path)
+                    for filename in filenames
+                )
+            else:
+                names.add(name)
+                # If a directory was removed, so were the files within it
+                names.update(
+                    entry
+                    for entry in manifest.entries
+                    if entry.startswith(f"{name}/")
+                )
+        # Files included by rules may be inside or outside the input tree
+        if dependents := manifest.dependents(paths):
+            names.update(dependents)
+            # Results of pure rules may depend on the files which changed
+            transformer.clear_result_cache()
+
+        mappings = []
+        removed = []
+        for name in sorted(names):
+            path = input / name
+            if not path.is_file():
+                if name in manifest.entries:
+                    removed.append(name)
+            elif not skip_callback(path):
+                mappings.append(FileMapping(path, output / name))
+        manifest.remove(removed)
+        errors = transform_mappings(
+            handlers,
+            transformer,
+            input,
+            mappings,
+            manifest=manifest,
+            io_threads=io_threads,
+        )
+        if removed and not mappings:
+            manifest.save()
+        watch_dependencies(manifest)
+        report(
+            WatchBuild(
+                len(mappings) + len(removed),
+                perf_counter() - start,
+                errors=errors,
+            ),
+        )
+
+    try:
+        files_watcher.add(root)
+        files_watcher.add(rule_file)
+        manifest = build_all(reloaded=False, force=force)
+
+        while stop is None or not stop.is_set():
+            # Wake up regularly to check whether to stop
+            changed = files_watcher.changes(None if stop is None else 0.1)
+            if not changed:
+                continue
+            # Wait for changes to settle
+            while more := files_watcher.changes(debounce):
+                changed |= more
+            log.debug(f"Changed: {sorted(map(str, changed))}")
+
+            start = perf_counter()
+            reloaded = rule_file in changed
+            try:
+                if reloaded:
+                    log.info(f"Rule file {rule_file} changed, reloading it")
+                    new_transformer = transformer.reload()
+                    transformer.close()
+                    transformer = new_transformer
+                    # Dependencies may have changed alongside the rule file
+                    transformer.clear_result_cache()
+                    manifest = build_all(reloaded=True)
+                elif root in changed:
+                    manifest = build_all(reloaded=False)
+                else:
+                    build_changed(manifest, changed)
+            except Exception as e:
+                # Keep watching using the previous rules, so that the error
+                # can be fixed
+                report(
+                    WatchBuild(0, perf_counter() - start, reloaded, error=e),
+                )
+    finally:
+        if owns_watcher:
+            files_watcher.close()
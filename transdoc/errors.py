@@ -10,7 +10,7 @@ from typing import Any
 
 from typing_extensions import override
 
-from transdoc.source_pos import SourceRange
+from transdoc.source_pos import LazySourceRange, SourceRange
 
 
 class TransdocError(Exception):
@@ -59,14 +59,53 @@ class TransdocOutputFileExistsError(TransdocFileExistsError):
         super().__init__(f"Output file '{file}' already exists")
 
 
+class TransdocNoRuleFileError(TransdocError):
+    """Transformer was not loaded from a rule file"""
+
+    def __init__(self) -> None:
+        """Transformer was not loaded from a rule file"""
+        super().__init__(
+            "The transformer must be created using "
+            "TransdocTransformer.from_file",
+        )
+
+
 class TransdocTransformationError(TransdocError):
     """An error that occurred when processing files using Transdoc."""
 
-    def __init__(self, filename: str, pos: SourceRange, *args: Any) -> None:
+    def __init__(
+        self,
+        filename: str,
+        pos: LazySourceRange,
+        *args: Any,
+    ) -> None:
         """An error that occurred when processing files using Transdoc."""
         super().__init__(args)
         self.filename = filename
-        self.pos = pos
+        self.__pos = pos
+
+    @property
+    def pos(self) -> SourceRange:
+        """Source range where the error occurred"""
+        if not isinstance(self.__pos, SourceRange):
+            # Only resolve the position once it is needed
+            self.__pos = self.__pos()
+        return self.__pos
+
+    @pos.setter
+    def pos(self, pos: LazySourceRange) -> None:
+        self.__pos = pos
+
+    @override
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Errors are pickled when they are sent between processes, so resolve
+        # the position (which may refer to the entire source text) first. The
+        # cause of the error is kept, but its traceback is lost.
+        state = dict(self.__dict__)
+        state["_TransdocTransformationError__pos"] = self.pos
+        if self.__cause__ is not None:
+            state["__cause__"] = self.__cause__
+        return (type(self), (self.filename, self.pos, *self.args[0]), state)
 
 
 class TransdocNoHandlerError(TransdocTransformationError):
@@ -91,7 +130,7 @@ class TransdocTransformExceptionGroup(ExceptionGroup):
     def __new__(
         cls,
         excs: Sequence[TransdocTransformationError],
-    ) -> 'TransdocTransformExceptionGroup':
+    ) -> "TransdocTransformExceptionGroup":
         """Exception group of errors when performing a transformation"""
         return super().__new__(
             cls,
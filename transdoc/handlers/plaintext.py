@@ -38,10 +38,7 @@ class PlaintextHandler(TransdocHandler):
     ):
         # Intentionally ignore exceptions, allowing them to fall through to
         # The caller
-        transformed = transformer.transform(in_file.read(), in_path)
-
-        if out_file is not None:
-            out_file.write(transformed)
+        transformer.transform_stream(in_file, out_file, in_path)
 
 
 if __name__ == "__main__":
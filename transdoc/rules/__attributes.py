@@ -4,9 +4,13 @@ Rule for listing the attributes of the given object.
 """
 
 import importlib
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
+from types import ModuleType
 from typing import Any
 
+from transdoc.__dependencies import depends_on_module
+from transdoc.__rule import RuleArguments, batch_rule, pure_rule
+
 
 def attributes_default_filter(attr_name: str, attr_object: Any) -> bool:
     """Default filter used by attributes rule.
@@ -72,25 +76,63 @@ def python_object_attributes_rule_gen(
     if formatter is None:
         formatter = attributes_default_formatter
 
+    def list_attributes(data: Any, module: str, object: str | None) -> str:
+        return "\n".join(
+            formatter(module, object, attr)
+            for attr in dir(data)
+            if filter(attr, getattr(data, attr))
+        )
+
+    def python_object_attributes_batch(
+        calls: Sequence[RuleArguments],
+    ) -> list[str]:
+        # Import each module and list the attributes of each object only once
+        modules: dict[str, ModuleType] = {}
+        outputs: dict[tuple[str, str | None], str] = {}
+        results = []
+        for args, kwargs in calls:
+            module, object = bind_arguments(*args, **kwargs)
+            if (module, object) not in outputs:
+                depends_on_module(module)
+                if module not in modules:
+                    modules[module] = importlib.import_module(module)
+                data = modules[module]
+                if object is not None:
+                    data = getattr(data, object)
+                outputs[(module, object)] = list_attributes(
+                    data,
+                    module,
+                    object,
+                )
+            results.append(outputs[(module, object)])
+        return results
+
+    @pure_rule
+    @batch_rule(python_object_attributes_batch)
     def python_object_attributes(
         module: str,
         object: str | None = None,
     ) -> str:
+        depends_on_module(module)
         if object is None:
             data = importlib.import_module(module)
         else:
             mod = importlib.import_module(module)
             data = getattr(mod, object)
 
-        return "\n".join(
-            formatter(module, object, attr)
-            for attr in dir(data)
-            if filter(attr, getattr(data, attr))
-        )
+        return list_attributes(data, module, object)
 
     return python_object_attributes
 
 
+def bind_arguments(
+    module: str,
+    object: str | None = None,
+) -> tuple[str, str | None]:
+    """Bind the arguments of a `python_object_attributes` rule call."""
+    return module, object
+
+
 python_object_attributes = python_object_attributes_rule_gen()
 """
 Generate a list of attributes for an object.
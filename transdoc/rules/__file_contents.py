@@ -3,10 +3,23 @@
 Rule for getting the contents of a file.
 """
 
-from functools import cache
+import os
+from functools import lru_cache
+
+from transdoc.__dependencies import depends_on_file
+
+
+@lru_cache(maxsize=256)
+def read_file(path: str, mtime_ns: int, size: int) -> str:
+    """Read the contents of a file, caching the result.
+
+    The file's modification time and size are part of the cache key, so that
+    changes to the file are seen.
+    """
+    with open(path, encoding="utf-8") as f:
+        return f.read()
 
 
-@cache
 def file_contents(path: str) -> str:
     """Transdoc rule that evaluates to the contents of a file.
 
@@ -15,5 +28,7 @@ def file_contents(path: str) -> str:
     path : str
         Path to the file to include.
     """
-    with open(path, encoding="utf-8") as f:
-        return f.read()
+    # Declared for every call, since only reading the file is cached
+    depends_on_file(path)
+    stat = os.stat(path)
+    return read_file(path, stat.st_mtime_ns, stat.st_size)
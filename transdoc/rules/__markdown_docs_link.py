@@ -5,6 +5,8 @@ A rule generator for generating Markdown links to a documentation site.
 
 from collections.abc import Callable
 
+from transdoc.__rule import pure_rule
+
 
 def markdown_docs_link_rule_gen(
     base_url: str,
@@ -44,6 +46,7 @@ def markdown_docs_link_rule_gen(
     """
     base_url = base_url.removesuffix("/")
 
+    @pure_rule
     def markdown_docs_link(path: str, text: str | None = None) -> str:
         full_url = f"{base_url}/{path}"
         if text is None:
@@ -0,0 +1,131 @@
+"""# Transdoc / Scanner
+
+Tokenizer that locates rule calls within input text.
+
+The input is split into literal spans, rule calls and unclosed rule calls in a
+single linear pass, without backtracking.
+"""
+
+from enum import Enum, auto
+from typing import NamedTuple
+
+RULE_CALL_OPEN = "{{"
+"""Opening delimiter for rule calls"""
+RULE_CALL_CLOSE = "}}"
+"""Closing delimiter for rule calls"""
+
+
+class TokenKind(Enum):
+    """Kind of a `Token`."""
+
+    LITERAL = auto()
+    """Text which is not part of a rule call"""
+    CALL = auto()
+    """A rule call, including its leading `{{` and trailing `}}`"""
+    UNCLOSED = auto()
+    """An opening `{{` which is never closed"""
+
+
+class Token(NamedTuple):
+    """A span of the input text."""
+
+    kind: TokenKind
+    """Kind of span"""
+    start: int
+    """Offset of the start of the span"""
+    end: int
+    """Offset of the end of the span (exclusive)"""
+
+
+def rule_call_contents(input: str, token: Token) -> str:
+    """Return the contents of a rule call, excluding its delimiters."""
+    return input[token.start + 2 : token.end - 2]
+
+
+def scan(input: str) -> list[Token]:
+    """Split the given input into literal spans and rule calls.
+
+    Rule calls start with `{{`, and end at the first `}}` after at least one
+    character. Calls cannot be nested. If a `{{` is never closed, an
+    `UNCLOSED` token covering the `{{` is produced, and the remaining input is
+    treated as literal text.
+
+    Parameters
+    ----------
+    input : str
+        Input text to scan.
+
+    Returns
+    -------
+    list[Token]
+        Tokens, in order, which together cover the entire input.
+    """
+    tokens: list[Token] = []
+    # Bind frequently-used names locally, since this loop is hot for inputs
+    # with many rule calls
+    append = tokens.append
+    find = input.find
+    literal = TokenKind.LITERAL
+    call = TokenKind.CALL
+    pos = 0
+
+    while (start := find(RULE_CALL_OPEN, pos)) != -1:
+        # Rule calls must contain at least one character
+        end = find(RULE_CALL_CLOSE, start + 3)
+        if end == -1:
+            # No more '}}' in the input, so nothing after this can be closed.
+            # `{{}}` is not a rule call, but is still closed, so the unclosed
+            # call is the next '{{' after it, if there is one.
+            if input.startswith(RULE_CALL_CLOSE, start + 2):
+                start = find(RULE_CALL_OPEN, start + 4)
+            if start != -1:
+                if start > pos:
+                    append(Token(literal, pos, start))
+                append(Token(TokenKind.UNCLOSED, start, start + 2))
+                pos = start + 2
+            break
+
+        if start > pos:
+            append(Token(literal, pos, start))
+        end += 2
+        append(Token(call, start, end))
+        pos = end
+
+    if pos < len(input):
+        append(Token(literal, pos, len(input)))
+
+    return tokens
+
+
+def complete_prefix_length(input: str, close_from: int = 0) -> int:
+    """Return the length of the longest prefix which can be scanned by itself.
+
+    This is used when scanning text incrementally. Scanning the prefix gives
+    the same tokens as it would if the text following it was included. The
+    remaining text either starts with a `{{` which has not been closed yet, or
+    is a single trailing `{`.
+
+    Parameters
+    ----------
+    input : str
+        Input text received so far.
+    close_from : int, optional = 0
+        Offset at which to start searching for the `}}` of a rule call which
+        starts at the beginning of `input`. This allows searches to resume
+        where they left off, rather than re-scanning long unclosed calls.
+
+    Returns
+    -------
+    int
+        Length of the prefix.
+    """
+    pos = 0
+    while (start := input.find(RULE_CALL_OPEN, pos)) != -1:
+        end = input.find(RULE_CALL_CLOSE, max(start + 3, close_from))
+        if end == -1:
+            return start
+        pos = end + 2
+        close_from = 0
+    if input.endswith("{", pos):
+        return len(input) - 1
+    return len(input)
@@ -1,12 +1,15 @@
 """# Transdoc / Source pos
 
-Definition for `SourcePos` class.
+Definitions for `SourcePos`, `SourceRange` and `SourceIndex` classes.
 """
 
+from bisect import bisect_right
+from collections.abc import Callable
 from dataclasses import dataclass
+from functools import partial
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class SourcePos:
     """A position within a source file."""
 
@@ -53,11 +56,15 @@ class SourcePos:
         if row_offset == 0:
             return SourcePos(self.row, self.col + len(string))
         else:
-            last_row = string.rsplit("\n", 1)[-1]
-            return SourcePos(self.row + row_offset, len(last_row) + 1)
+            # Avoid copying the string to find the length of its last row
+            last_row_start = string.rfind("\n") + 1
+            return SourcePos(
+                self.row + row_offset,
+                len(string) - last_row_start + 1,
+            )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class SourceRange:
     """A range of positions within a source file.
 
@@ -80,3 +87,82 @@ class SourceRange:
             SourcePos.zero(),
             SourcePos.zero(),
         )
+
+
+LazySourceRange = SourceRange | Callable[[], SourceRange]
+"""
+A `SourceRange`, or a function which computes it, so that source positions
+are only computed if they are needed (eg when reporting an error).
+"""
+
+
+def resolve_range(pos: LazySourceRange) -> SourceRange:
+    """Return the `SourceRange` represented by the given lazy source range."""
+    return pos if isinstance(pos, SourceRange) else pos()
+
+
+class SourceIndex:
+    """Index of line starts within a string.
+
+    This allows string offsets to be resolved to `SourcePos` values in
+    logarithmic time, rather than needing to re-scan the string's prefix for
+    every lookup. The index is built when it is first used.
+    """
+
+    def __init__(
+        self,
+        string: str,
+        # `SourcePos` is an immutable type, so is ok to have a default value
+        origin: SourcePos = SourcePos(1, 1),  # noqa: B008
+    ) -> None:
+        """Build a line index for the given string.
+
+        Parameters
+        ----------
+        string : str
+            String to index.
+        origin : SourcePos, optional
+            Source position of the start of the string. Defaults to
+            `SourcePos(1, 1)`.
+        """
+        self.__string = string
+        self.__origin = origin
+        self.__line_starts: list[int] | None = None
+
+    def __get_line_starts(self) -> list[int]:
+        """Return the offset of the start of each line, building the index."""
+        if self.__line_starts is None:
+            line_starts = [0]
+            find = self.__string.find
+            newline = find("\n")
+            while newline != -1:
+                line_starts.append(newline + 1)
+                newline = find("\n", newline + 1)
+            self.__line_starts = line_starts
+        return self.__line_starts
+
+    def pos(self, offset: int) -> SourcePos:
+        """Return the `SourcePos` of the character at the given offset.
+
+        This is equivalent to `origin.offset_by_str(string[:offset])`.
+        """
+        line_starts = self.__get_line_starts()
+        line = bisect_right(line_starts, offset) - 1
+        if line == 0:
+            return SourcePos(self.__origin.row, self.__origin.col + offset)
+        else:
+            return SourcePos(
+                self.__origin.row + line,
+                offset - line_starts[line] + 1,
+            )
+
+    def range(self, start: int, end: int) -> "SourceRange":
+        """Return the `SourceRange` spanning the given offsets."""
+        return SourceRange(self.pos(start), self.pos(end))
+
+    def lazy_range(self, start: int, end: int) -> LazySourceRange:
+        """Return a `LazySourceRange` spanning the given offsets.
+
+        The range is only resolved to row and column numbers if it is used.
+        """
+        return partial(self.range, start, end)
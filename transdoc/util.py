@@ -3,21 +3,128 @@
 Utility functions for Transdoc.
 """
 
+import mmap
+import re
 import sys
+from collections.abc import Iterable, Iterator
+from io import TextIOBase
 from pathlib import Path
 
 from colored import Fore, Style
 
 from transdoc.errors import TransdocTransformationError
+from transdoc.scanner import RULE_CALL_OPEN
+
+__line_break = re.compile(r"[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+"""Characters which `str.splitlines` considers to be line boundaries"""
+
+__needs_cleanup = re.compile(
+    r"[\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]|[^\S\n]\n|\s\Z",
+)
+"""
+Text which `indent_by` would change, other than leading whitespace, when the
+indentation is empty: line boundaries other than `\\n`, and trailing
+whitespace.
+"""
 
 
 def indent_by(indent: str, string: str) -> str:
     """Indent the given string using the given indentation."""
+    # Fast paths, which avoid splitting the string into lines
+    if not string:
+        return ""
+    if __line_break.search(string) is None:
+        return (indent + string.rstrip()).lstrip()
+    if not indent and __needs_cleanup.search(string) is None:
+        return string.lstrip()
     return "\n".join(
         f"{indent}{line.rstrip()}" for line in string.splitlines()
     ).lstrip()
 
 
+def indent_chunks(indent: str, chunks: Iterable[str]) -> Iterator[str]:
+    """Indent the text given by an iterable of chunks, yielding it in chunks.
+
+    This produces the same text as `indent_by(indent, "".join(chunks))`,
+    without needing to hold all of the text in memory at once.
+    """
+    # Text at the end of the previous chunk which can't be output yet, as it
+    # may be trailing whitespace, or the `\r` of a `\r\n`
+    pending = ""
+    # Whether the start of the current line has been output
+    line_open = False
+    # Whether any text has been output
+    started = False
+
+    def line_start(content: str) -> str:
+        """Return the output for the start of a line with the given content.
+
+        Before any text is output, leading whitespace is removed, so blank
+        lines produce no output.
+        """
+        if started:
+            return f"\n{indent}{content}"
+        return (indent + content).lstrip()
+
+    for chunk in chunks:
+        lines = (pending + chunk).splitlines(keepends=True)
+        if not lines:
+            continue
+        # The last line may continue in the next chunk
+        last = lines.pop()
+        for line in lines:
+            content = line.rstrip()
+            if line_open:
+                if content:
+                    yield content
+            elif output := line_start(content):
+                yield output
+                started = True
+            line_open = False
+
+        content = last.rstrip()
+        if content and last[len(content) - 1] != "\r":
+            if line_open:
+                yield content
+            elif output := line_start(content):
+                yield output
+                started = line_open = True
+            pending = last[len(content) :]
+        else:
+            pending = last
+
+    if not line_open and pending and (output := line_start(pending.rstrip())):
+        yield output
+
+
+class StringBuilder(TextIOBase):
+    """Text output which collects written strings, joining them only once.
+
+    Unlike `StringIO`, written strings are not copied into a buffer, so
+    building a large output costs a single copy when `getvalue` is called.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty `StringBuilder`."""
+        super().__init__()
+        self.__parts: list[str] = []
+
+    def writable(self) -> bool:
+        """Return `True`, as strings can be written."""
+        return True
+
+    def write(self, s: str) -> int:
+        """Add the given string to the output."""
+        self.__parts.append(s)
+        return len(s)
+
+    def getvalue(self) -> str:
+        """Return everything that has been written, as one string."""
+        if len(self.__parts) > 1:
+            self.__parts = ["".join(self.__parts)]
+        return self.__parts[0] if self.__parts else ""
+
+
 def print_error(e: Exception):
     """Utility function to print errors to `sys.stderr`."""
 
@@ -84,3 +191,28 @@ def file_is_binary(p: Path):
     with open(p, "rb") as f:
         b = f.read(1024)
     return bool(b.translate(None, __textchars))
+
+
+__rule_call_open_bytes = RULE_CALL_OPEN.encode()
+
+
+def file_may_contain_rule_calls(p: Path) -> bool:
+    """
+    Return whether the given file may contain rule calls.
+
+    This checks the raw bytes of the file for an opening `{{`, without decoding
+    it, so is much faster than reading the file as text. Files which don't
+    contain one can be copied rather than being transformed.
+
+    Parameters
+    ----------
+    p : Path
+        Path of file to check
+    """
+    with open(p, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return m.find(__rule_call_open_bytes) != -1
+        except ValueError:
+            # Empty files can't be mapped
+            return False